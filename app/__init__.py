@@ -52,74 +52,81 @@ def configure_logging(app):
     console_handler.setFormatter(formatter)
     app.logger.addHandler(console_handler)
 
-def create_app(config_class=Config):
+def start_scheduler(app):
+    """worker/all 模式：登记续租与工作队列任务并启动调度器。
+
+    这些任务启动后立即查询数据库，须在建表（db.create_all 或 flask db upgrade）之后调用。
+    """
+    if app.config['APP_MODE'] not in ('worker', 'all'):
+        return
+
+    # 主节点选举：每个进程只登记续租任务，持有数据库租约的进程从数据库恢复并执行定时任务，
+    # 避免多 worker 部署时同一任务被每个进程各执行一次
+    from app.services.leader import start_leader_election
+    from app.schedule_routes import sync_jobs, remove_task_jobs
+    start_leader_election(app, scheduler, on_elected=sync_jobs, on_demoted=remove_task_jobs)
+
+    # 定时任务到点后由主节点拆分为工作项入队，所有 worker 进程从队列领取执行
+    from app.services.work_queue import start_work_queue
+    start_work_queue(app, scheduler)
+
+    scheduler.start()
+
+def create_app(config_class=Config, mode=None):
+    """mode: web 只提供页面（不启动调度器），worker 只执行定时任务，all 两者兼有；默认取配置 APP_MODE"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    mode = mode or app.config['APP_MODE']
+    if mode not in ('web', 'worker', 'all'):
+        raise ValueError(f"Unknown APP_MODE: {mode}")
+    app.config['APP_MODE'] = mode
     
     configure_logging(app)
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    # SQLite 不支持大部分 ALTER TABLE，迁移脚本统一使用 batch 操作
+    migrate.init_app(app, db, render_as_batch=True)
     login_manager.init_app(app)
     
-    # 初始化调度器
-    scheduler.init_app(app)
-    
-    # 恢复任务：从数据库读取并重新添加到调度器
-    # 注意：这里需要放在应用上下文之后，且避免在 db migrate 等命令时执行
-    with app.app_context():
-        # 避免在非运行状态（如迁移）下查询数据库导致表不存在报错
-        try:
-            from app.models import ScheduledTask
-            from app.schedule_routes import run_scheduled_task
-            
-            # 只有当表存在时才执行
-            inspector = db.inspect(db.engine)
-            if 'scheduled_tasks' in inspector.get_table_names():
-                tasks = ScheduledTask.query.filter_by(is_active=True).all()
-                for task in tasks:
-                    try:
-                        hour, minute = task.run_time.split(':')
-                        # 检查任务是否已存在（避免热重载重复添加）
-                        if not scheduler.get_job(str(task.id)):
-                            scheduler.add_job(
-                                id=str(task.id),
-                                func=run_scheduled_task,
-                                args=[task.id],
-                                trigger='cron',
-                                hour=hour,
-                                minute=minute,
-                                replace_existing=True,
-                                misfire_grace_time=60  # 忽略错过的任务（例如宕机期间），只允许延迟60秒内的任务补执行
-                            )
-                    except Exception as e:
-                        app.logger.error(f"Failed to restore task {task.id}: {e}")
-        except Exception as e:
-            app.logger.warning(f"Skipping task restoration: {e}")
-            
-    scheduler.start()
+    # worker/all 模式：运行调度器并参与主节点选举，执行定时任务（由 start_scheduler 启动）
+    if mode in ('worker', 'all'):
+        # 初始化调度器
+        scheduler.init_app(app)
 
-    # 注册蓝图/路由
-    from app import routes, models
-    app.register_blueprint(routes.bp)
-    
-    from app.auth.routes import bp as auth_bp
-    app.register_blueprint(auth_bp, url_prefix='/auth')
+        from app.services.metrics import register_scheduler_metrics
+        register_scheduler_metrics(scheduler)
 
-    from app.system_routes import bp as system_bp
-    app.register_blueprint(system_bp)
-    
-    from app.server_routes import bp as server_bp
-    app.register_blueprint(server_bp)
-    
-    from app.user_routes import bp as user_bp
-    app.register_blueprint(user_bp)
-    
-    from app.schedule_routes import bp as schedule_bp
-    app.register_blueprint(schedule_bp)
-    
-    from app.dirpair_routes import bp as dirpair_bp
-    app.register_blueprint(dirpair_bp)
+    # web/all 模式：注册页面与接口
+    if mode in ('web', 'all'):
+        from app import routes, models
+        app.register_blueprint(routes.bp)
+
+        from app.auth.routes import bp as auth_bp
+        app.register_blueprint(auth_bp, url_prefix='/auth')
+
+        from app.system_routes import bp as system_bp
+        app.register_blueprint(system_bp)
+
+        from app.server_routes import bp as server_bp
+        app.register_blueprint(server_bp)
+
+        from app.user_routes import bp as user_bp
+        app.register_blueprint(user_bp)
+
+        from app.schedule_routes import bp as schedule_bp
+        app.register_blueprint(schedule_bp)
+
+        from app.dirpair_routes import bp as dirpair_bp
+        app.register_blueprint(dirpair_bp)
+
+        from app.metrics_routes import bp as metrics_bp
+        app.register_blueprint(metrics_bp)
+
+        from app.webhook_routes import bp as webhook_bp
+        app.register_blueprint(webhook_bp)
+
+        from app.profile_routes import bp as profile_bp
+        app.register_blueprint(profile_bp)
     
     # 用户加载回调
     from app.models import User
@@ -5,11 +5,13 @@ from app import db
 import random
 import string
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
 
 bp = Blueprint('auth', __name__)
 
 def generate_captcha():
+    # Pillow 只在生成验证码时才需要，不随应用启动导入
+    from PIL import Image, ImageDraw, ImageFont
+    
     # 生成随机字符串
     code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
     
@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
 from flask_login import login_required, current_user
 from app import db
-from app.models import DirectoryPair, Server, DirectoryDiffResult
-from app.services.diff_service import DiffService
+from app.models import DirectoryPair, Server, DirectoryDiffResult, CompareRun, NormalizationProfile, WorkItem
+from app.services.timing import slowest_phases
+from app.services.blob_store import get_blob
+from app.services.drift_stats import pair_summaries
+from app.utils import send_gzip, normalization_profile_id
 
 bp = Blueprint('dirpair', __name__)
 
@@ -20,7 +23,9 @@ def list_pairs():
         pairs = DirectoryPair.query.filter_by(user_id=current_user.id).all()
         system_ids = [sys.id for sys in current_user.authorized_systems]
         servers = Server.query.filter(Server.business_system_id.in_(system_ids)).all()
-    return render_template('dirpair/list.html', pairs=pairs, servers=servers)
+    return render_template('dirpair/list.html', pairs=pairs, servers=servers,
+                           summaries=pair_summaries([p.id for p in pairs]),
+                           profiles=NormalizationProfile.query.all())
 
 @bp.route('/dirpairs/add', methods=['POST'])
 def add_pair():
@@ -50,13 +55,24 @@ def add_pair():
         right_server_id=right_server_id,
         right_path=right_path,
         file_pattern=file_pattern,
-        user_id=current_user.id
+        user_id=current_user.id,
+        normalization_profile_id=normalization_profile_id(request.form.get('normalization_profile_id'))
     )
     db.session.add(pair)
     db.session.commit()
     flash('目录比对关系创建成功', 'success')
     return redirect(url_for('dirpair.list_pairs'))
 
+@bp.route('/dirpairs/<int:id>/profile', methods=['POST'])
+def set_pair_profile(id):
+    pair = DirectoryPair.query.get_or_404(id)
+    if not current_user.is_admin and pair.user_id != current_user.id:
+        abort(403)
+    pair.normalization_profile_id = normalization_profile_id(request.form.get('normalization_profile_id'))
+    db.session.commit()
+    flash('归一化规则已更新，下次比对时生效', 'success')
+    return redirect(url_for('dirpair.list_pairs'))
+
 @bp.route('/dirpairs/compare/batch', methods=['POST'])
 def batch_compare():
     pair_ids = request.form.getlist('pair_ids')
@@ -64,11 +80,15 @@ def batch_compare():
         flash('请至少选择一个比对关系', 'warning')
         return redirect(url_for('dirpair.list_pairs'))
         
+    # 比对服务依赖 paramiko / python-gitlab，在首次比对时才导入
+    from app.services.diff_service import DiffService
     service = DiffService()
+    profile = bool(request.form.get('profile'))
     success_count = 0
     fail_count = 0
     
     processed_ids = []
+    pairs = []
     for pid in pair_ids:
         pair = DirectoryPair.query.get(pid)
         if not pair:
@@ -77,14 +97,15 @@ def batch_compare():
         # 权限检查
         if not current_user.is_admin and pair.user_id != current_user.id:
             continue
-            
-        try:
-            service.compare_directory_pair(pair)
+        pairs.append(pair)
+    
+    for pid, outcome in service.compare_directory_pairs(pairs, profile=profile).items():
+        if isinstance(outcome, Exception):
+            current_app.logger.error(f"Error comparing pair {pid}: {outcome}")
+            fail_count += 1
+        else:
             success_count += 1
             processed_ids.append(str(pid))
-        except Exception as e:
-            current_app.logger.error(f"Error comparing pair {pid}: {e}")
-            fail_count += 1
             
     if success_count > 0:
         flash(f'成功执行 {success_count} 个比对任务', 'success')
@@ -121,16 +142,19 @@ def view_batch_results():
         if res:
             grouped_results.append((p, res))
             
-    return render_template('dirpair/batch_results.html', grouped_results=grouped_results)
+    return render_template('dirpair/batch_results.html', grouped_results=grouped_results,
+                           latest_runs=_latest_runs(pairs), slowest_phases=slowest_phases,
+                           summaries=pair_summaries([p.id for p in pairs]))
 
 @bp.route('/dirpairs/compare/<int:id>')
 def compare_pair(id):
     pair = DirectoryPair.query.get_or_404(id)
     if not current_user.is_admin and pair.user_id != current_user.id:
         abort(403)
+    from app.services.diff_service import DiffService
     service = DiffService()
     try:
-        service.compare_directory_pair(pair)
+        service.compare_directory_pair(pair, profile=request.args.get('profile') == '1')
         flash('目录比对完成', 'success')
     except Exception as e:
         flash(f'目录比对失败: {e}', 'danger')
@@ -142,7 +166,29 @@ def view_results(id):
     if not current_user.is_admin and pair.user_id != current_user.id:
         abort(403)
     results = DirectoryDiffResult.query.filter_by(pair_id=id).order_by(DirectoryDiffResult.created_at.desc()).all()
-    return render_template('dirpair/results.html', pair=pair, results=results)
+    return render_template('dirpair/results.html', pair=pair, results=results,
+                           latest_runs=_latest_runs([pair]), slowest_phases=slowest_phases,
+                           summaries=pair_summaries([pair.id]))
+
+@bp.route('/dirpairs/results/diff/<int:result_id>')
+def download_diff(result_id):
+    """下载被截断的 diff 的完整内容（gzip 压缩）"""
+    result = DirectoryDiffResult.query.get_or_404(result_id)
+    if not current_user.is_admin and result.pair.user_id != current_user.id:
+        abort(403)
+    content = get_blob(result.diff_hash) if result.diff_truncated else result.diff_content
+    if content is None:
+        abort(404)
+    return send_gzip(content, f'{result.file_name}.diff')
+
+def _latest_runs(pairs):
+    """取每个目录对最近一次比对的耗时记录"""
+    latest_runs = {}
+    for p in pairs:
+        run = p.compare_runs.order_by(CompareRun.started_at.desc()).first()
+        if run:
+            latest_runs[p.id] = run
+    return latest_runs
 
 @bp.route('/dirpairs/delete/<int:id>', methods=['POST'])
 def delete_pair(id):
@@ -150,7 +196,15 @@ def delete_pair(id):
     if not current_user.is_admin and pair.user_id != current_user.id:
         abort(403)
     DirectoryDiffResult.query.filter_by(pair_id=id).delete()
+    CompareRun.query.filter_by(pair_id=id).delete()
+    # 定时任务中引用该目录对的工作项一并删除，所在执行若因此没有剩余工作项则随之完成
+    run_ids = {item.run_id for item in WorkItem.query.filter_by(pair_id=id)}
+    WorkItem.query.filter_by(pair_id=id).delete()
     db.session.delete(pair)
     db.session.commit()
+    if run_ids:
+        from app.services.work_queue import finalize_run
+        for run_id in run_ids:
+            finalize_run(run_id)
     flash('目录比对关系已删除', 'success')
     return redirect(url_for('dirpair.list_pairs'))
@@ -0,0 +1,23 @@
+import hmac
+from flask import Blueprint, Response, request, abort, current_app
+from flask_login import current_user
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+bp = Blueprint('metrics', __name__)
+
+# 本机地址；经本机反向代理转发的外部请求也来自这些地址，只有显式配置 METRICS_ALLOW_LOCAL 时才信任
+LOCAL_ADDRS = ('127.0.0.1', '::1')
+
+@bp.route('/metrics')
+def metrics():
+    # 供 Prometheus 抓取，不走登录；配置了 METRICS_TOKEN 时要求 Bearer 令牌
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            abort(401)
+    elif not current_app.config.get('METRICS_PUBLIC'):
+        local = current_app.config.get('METRICS_ALLOW_LOCAL') and request.remote_addr in LOCAL_ADDRS
+        if not local and not (current_user.is_authenticated and current_user.is_admin):
+            abort(403)
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
@@ -57,14 +57,38 @@ class Server(db.Model):
     password = db.Column(db.String(128), nullable=True) # 从 Excel 读取
     os_type = db.Column(db.String(20), default='Linux') # Windows or Linux
     ssh_key_path = db.Column(db.String(256), nullable=True) # 如果为空，使用全局默认
+    # 跳板机（堡垒机），为空表示直连
+    jump_server_id = db.Column(db.Integer, db.ForeignKey('servers.id'), nullable=True)
     
     business_system_id = db.Column(db.Integer, db.ForeignKey('business_systems.id'), nullable=True)
     
     config_maps = db.relationship('ConfigMap', backref='server', lazy='dynamic')
+    jump_server = db.relationship('Server', remote_side=[id], backref=db.backref('jump_targets', lazy='dynamic'))
 
     def __repr__(self):
         return f'<Server {self.name} ({self.ip})>'
 
+# 比对前的归一化规则：两侧内容归一化后一致即判定为 MATCH，不再生成 diff
+class NormalizationProfile(db.Model):
+    __tablename__ = 'normalization_profiles'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), index=True, unique=True, nullable=False)
+    description = db.Column(db.String(256))
+    ignore_patterns = db.Column(db.Text, nullable=True) # 每行一个正则，匹配到的部分在比较前移除（如生成时间戳）
+    trim_trailing_whitespace = db.Column(db.Boolean, default=True) # 忽略行尾空白
+    collapse_whitespace = db.Column(db.Boolean, default=False) # 行内连续空白折叠为一个空格，并忽略行首空白
+    ignore_blank_lines = db.Column(db.Boolean, default=True)
+    strip_comments = db.Column(db.Boolean, default=False) # 忽略整行注释，注释符按文件扩展名确定
+    comment_prefixes = db.Column(db.String(64), nullable=True) # 以空格分隔的注释符，填写后覆盖按扩展名的默认值
+    updated_at = db.Column(db.DateTime, default=current_time_plus_8, onupdate=current_time_plus_8)
+    
+    config_maps = db.relationship('ConfigMap', backref='normalization_profile', lazy='dynamic')
+    directory_pairs = db.relationship('DirectoryPair', backref='normalization_profile', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<NormalizationProfile {self.name}>'
+
 class ConfigMap(db.Model):
     __tablename__ = 'config_maps'
     
@@ -73,6 +97,8 @@ class ConfigMap(db.Model):
     remote_path = db.Column(db.String(256), nullable=False) # 服务器上的目录或文件路径
     gitlab_path = db.Column(db.String(256), nullable=False) # GitLab 仓库中的路径
     file_pattern = db.Column(db.String(256), default='*') # 例如 *.conf
+    normalization_profile_id = db.Column(db.Integer, db.ForeignKey('normalization_profiles.id'), nullable=True)
+    expected_ms = db.Column(db.Integer, nullable=True) # 成功比对耗时的指数加权平均（毫秒），用于排序与估算完成时间
     
     diff_results = db.relationship('DiffResult', backref='config_map', lazy='dynamic')
 
@@ -81,13 +107,25 @@ class ConfigMap(db.Model):
 
 class DiffResult(db.Model):
     __tablename__ = 'diff_results'
+    __table_args__ = (
+        # 列表/批量页按配置项、状态分组汇总数量与增删行数，无需读取 diff_content
+        db.Index('ix_diff_results_config_map_status', 'config_map_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     config_map_id = db.Column(db.Integer, db.ForeignKey('config_maps.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=current_time_plus_8)
     file_name = db.Column(db.String(128), nullable=False)
-    status = db.Column(db.String(20), nullable=False) # MATCH, DIFF, MISSING_LOCAL, MISSING_REMOTE
-    diff_content = db.Column(db.Text, nullable=True) # 具体的 diff 文本
+    status = db.Column(db.String(20), nullable=False, index=True) # MATCH, DIFF, MISSING_LOCAL, MISSING_REMOTE
+    diff_content = db.Column(db.Text, nullable=True) # 具体的 diff 文本，超过 DIFF_MAX_STORED_BYTES 时只保留开头部分
+    # 服务器内容的 sha256（服务器上不存在时为空）；DIFF、MISSING_LOCAL 时内容同时存为 ContentBlob 快照，供同步使用
+    remote_hash = db.Column(db.String(64), nullable=True, index=True)
+    lines_added = db.Column(db.Integer, default=0) # diff 中新增/删除的行数
+    lines_removed = db.Column(db.Integer, default=0)
+    diff_truncated = db.Column(db.Boolean, default=False) # diff_content 是否被截断
+    diff_hash = db.Column(db.String(64), nullable=True) # 截断时完整 diff 的快照，指向 ContentBlob
+    hunk_count = db.Column(db.Integer, default=0) # diff 中的改动块（@@）数量
+    gitlab_sha256 = db.Column(db.String(64), nullable=True, index=True) # GitLab 内容的 sha256，不存在时为空
 
     def __repr__(self):
         return f'<DiffResult {self.file_name} - {self.status}>'
@@ -98,26 +136,40 @@ task_config_maps = db.Table('task_config_maps',
     db.Column('config_map_id', db.Integer, db.ForeignKey('config_maps.id'), primary_key=True)
 )
 
+# 关联表：定时任务与目录比对
+task_directory_pairs = db.Table('task_directory_pairs',
+    db.Column('task_id', db.Integer, db.ForeignKey('scheduled_tasks.id'), primary_key=True),
+    db.Column('pair_id', db.Integer, db.ForeignKey('directory_pairs.id'), primary_key=True)
+)
+
 class ScheduledTask(db.Model):
     __tablename__ = 'scheduled_tasks'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
-    # 使用 cron 风格的时间设置，这里为了简化，我们只存储 hour 和 minute
-    # 如果需要更复杂，可以存储 cron 表达式
-    run_time = db.Column(db.String(10), nullable=False) # 格式 "HH:MM"
+    # 每天执行的任务只填 run_time；填写 cron_expr 时按 cron 表达式触发，run_time 为空
+    run_time = db.Column(db.String(10), nullable=True) # 格式 "HH:MM"
+    cron_expr = db.Column(db.String(64), nullable=True) # 5 段 cron 表达式：分 时 日 月 周，如 "*/15 * * * *"
     is_active = db.Column(db.Boolean, default=True)
     last_run_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=current_time_plus_8)
+    profile = db.Column(db.Boolean, default=False) # 是否在 cProfile 下执行每个配置项的比对
     
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     user = db.relationship('User', backref='scheduled_tasks')
     
     config_maps = db.relationship('ConfigMap', secondary=task_config_maps, lazy='subquery',
         backref=db.backref('scheduled_tasks', lazy=True))
+    directory_pairs = db.relationship('DirectoryPair', secondary=task_directory_pairs, lazy='subquery',
+        backref=db.backref('scheduled_tasks', lazy=True))
+
+    @property
+    def schedule(self):
+        """页面显示的执行时间"""
+        return self.cron_expr or self.run_time
 
     def __repr__(self):
-        return f'<ScheduledTask {self.name} at {self.run_time}>'
+        return f'<ScheduledTask {self.name} at {self.schedule}>'
 
 class DirectoryPair(db.Model):
     __tablename__ = 'directory_pairs'
@@ -131,6 +183,8 @@ class DirectoryPair(db.Model):
     file_pattern = db.Column(db.String(64), default='*')
     created_at = db.Column(db.DateTime, default=current_time_plus_8)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    normalization_profile_id = db.Column(db.Integer, db.ForeignKey('normalization_profiles.id'), nullable=True)
+    expected_ms = db.Column(db.Integer, nullable=True) # 成功比对耗时的指数加权平均（毫秒）
     
     left_server = db.relationship('Server', foreign_keys=[left_server_id])
     right_server = db.relationship('Server', foreign_keys=[right_server_id])
@@ -140,19 +194,171 @@ class DirectoryPair(db.Model):
     def __repr__(self):
         return f'<DirectoryPair {self.name}>'
 
-from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy.dialects.mysql import LONGTEXT, LONGBLOB
+
+# MySQL 上使用 LONGTEXT，其他数据库（如基准测试使用的 SQLite）退化为普通 Text
+LongText = db.Text().with_variant(LONGTEXT, 'mysql')
 
 class DirectoryDiffResult(db.Model):
     __tablename__ = 'directory_diff_results'
+    __table_args__ = (
+        db.Index('ix_directory_diff_results_pair_status', 'pair_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     pair_id = db.Column(db.Integer, db.ForeignKey('directory_pairs.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=current_time_plus_8)
     file_name = db.Column(db.String(256), nullable=False)
-    status = db.Column(db.String(20), nullable=False)
-    diff_content = db.Column(LONGTEXT, nullable=True)
-    left_content = db.Column(LONGTEXT, nullable=True) # 保存左侧文件原始内容
-    right_content = db.Column(LONGTEXT, nullable=True) # 保存右侧文件原始内容
+    status = db.Column(db.String(20), nullable=False, index=True)
+    diff_content = db.Column(LongText, nullable=True) # 超过 DIFF_MAX_STORED_BYTES 时只保留开头部分
+    left_content = db.Column(LongText, nullable=True) # 保存左侧文件原始内容，超过 CONTENT_MAX_BYTES 时不保存
+    right_content = db.Column(LongText, nullable=True) # 保存右侧文件原始内容，超过 CONTENT_MAX_BYTES 时不保存
+    lines_added = db.Column(db.Integer, default=0)
+    lines_removed = db.Column(db.Integer, default=0)
+    diff_truncated = db.Column(db.Boolean, default=False)
+    diff_hash = db.Column(db.String(64), nullable=True) # 截断时完整 diff 的快照，指向 ContentBlob
+    hunk_count = db.Column(db.Integer, default=0)
+    left_sha256 = db.Column(db.String(64), nullable=True, index=True) # 两侧内容的 sha256，缺失一侧为空
+    right_sha256 = db.Column(db.String(64), nullable=True, index=True)
     
     def __repr__(self):
         return f'<DirectoryDiffResult {self.file_name} - {self.status}>'
+
+# 按内容 sha256 去重存储的文件快照（zlib 压缩）
+class ContentBlob(db.Model):
+    __tablename__ = 'content_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False) # 原始内容字节数
+    data = db.Column(db.LargeBinary().with_variant(LONGBLOB, 'mysql'), nullable=False)
+    created_at = db.Column(db.DateTime, default=current_time_plus_8)
+    
+    def __repr__(self):
+        return f'<ContentBlob {self.hash[:12]} ({self.size} bytes)>'
+
+# 每次比对运行（单个配置项或目录对）的耗时记录，phase_stats 为各阶段耗时/字节数的 JSON
+class CompareRun(db.Model):
+    __tablename__ = 'compare_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    config_map_id = db.Column(db.Integer, db.ForeignKey('config_maps.id'), nullable=True, index=True)
+    pair_id = db.Column(db.Integer, db.ForeignKey('directory_pairs.id'), nullable=True, index=True)
+    started_at = db.Column(db.DateTime, default=current_time_plus_8, index=True)
+    duration_ms = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='OK') # OK, ERROR, UNREACHABLE
+    file_count = db.Column(db.Integer, nullable=False, default=0)
+    phase_stats = db.Column(db.Text, nullable=True)
+    profile_file = db.Column(db.String(128), nullable=True) # 开启性能分析时保存的 cProfile 统计文件名
+    
+    config_map = db.relationship('ConfigMap', backref=db.backref('compare_runs', lazy='dynamic'))
+    pair = db.relationship('DirectoryPair', backref=db.backref('compare_runs', lazy='dynamic'))
+    
+    def __repr__(self):
+        return f'<CompareRun {self.id} {self.duration_ms}ms>'
+
+# 数据库租约锁：多进程/多节点部署时只有持有 scheduler 锁的进程执行定时任务，租约过期后由其他进程接管
+class SchedulerLock(db.Model):
+    __tablename__ = 'scheduler_locks'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False) # 主机名:进程号:随机串
+    expires_at = db.Column(db.DateTime, nullable=False)
+    acquired_at = db.Column(db.DateTime, default=current_time_plus_8) # 当前持有者获得锁的时间
+    
+    def __repr__(self):
+        return f'<SchedulerLock {self.name} held by {self.holder}>'
+
+# 定时任务的一次执行：主节点按任务的配置项拆分为 WorkItem 写入队列，各 worker 领取执行，
+# 全部工作项结束（成功或重试耗尽）后才标记完成并更新任务的 last_run_at。
+# GitLab 推送触发的重新比对也作为一次执行入队，task_id 为空
+class TaskRun(db.Model):
+    __tablename__ = 'task_runs'
+    __table_args__ = (
+        # 按任务查询最近的执行记录
+        db.Index('ix_task_runs_task_created', 'task_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('scheduled_tasks.id'), nullable=True)
+    trigger = db.Column(db.String(20), nullable=False, default='schedule') # schedule, webhook
+    commit_sha = db.Column(db.String(40), nullable=True) # webhook 执行对应的推送后提交
+    status = db.Column(db.String(20), nullable=False, default='RUNNING', index=True) # RUNNING, DONE, FAILED（有工作项重试耗尽）
+    created_at = db.Column(db.DateTime, default=current_time_plus_8, index=True) # 入队时间
+    started_at = db.Column(db.DateTime, nullable=True) # 第一个工作项被领取的时间
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True) # 入队到全部工作项结束的耗时
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    done_count = db.Column(db.Integer, nullable=False, default=0) # 结束时成功/失败的工作项数
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    retry_count = db.Column(db.Integer, nullable=False, default=0) # 各工作项重试次数之和
+    expected_ms = db.Column(db.Integer, nullable=False, default=0) # 入队时各工作项估计耗时之和
+    
+    task = db.relationship('ScheduledTask', backref=db.backref('runs', lazy='dynamic'))
+    items = db.relationship('WorkItem', backref='run', lazy='dynamic')
+    
+    @property
+    def label(self):
+        """日志中的执行描述"""
+        if self.task_id is None:
+            return f'{self.trigger} run {self.id}'
+        return f'task {self.task_id} run {self.id}'
+    
+    def __repr__(self):
+        return f'<TaskRun {self.id} of task {self.task_id} {self.status}>'
+
+# 工作队列中的一项：一次执行中的一个配置项或目录对。worker 以租约领取（lease_holder / lease_expires_at），
+# 租约过期（worker 宕机）后可被其他 worker 重新领取；失败后延迟重试，超过最大次数记为 FAILED
+class WorkItem(db.Model):
+    __tablename__ = 'work_items'
+    __table_args__ = (
+        # worker 按状态与可执行时间领取工作项
+        db.Index('ix_work_items_status_available', 'status', 'available_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('task_runs.id'), nullable=False, index=True)
+    config_map_id = db.Column(db.Integer, db.ForeignKey('config_maps.id'), nullable=True) # 与 pair_id 二选一
+    pair_id = db.Column(db.Integer, db.ForeignKey('directory_pairs.id'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='PENDING') # PENDING, RUNNING, DONE, FAILED
+    attempts = db.Column(db.Integer, nullable=False, default=0) # 已领取次数
+    available_at = db.Column(db.DateTime, default=current_time_plus_8) # 最早可领取时间（重试时延后）
+    lease_holder = db.Column(db.String(128), nullable=True) # 主机名:进程号:随机串
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True) # 最近一次领取的时间
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True) # 最近一次执行的耗时
+    last_error = db.Column(db.String(512), nullable=True)
+    expected_ms = db.Column(db.Integer, nullable=False, default=0) # 入队时的估计耗时，估计耗时长的优先领取
+    
+    config_map = db.relationship('ConfigMap')
+    pair = db.relationship('DirectoryPair')
+    
+    @property
+    def target(self):
+        return self.config_map if self.config_map_id is not None else self.pair
+    
+    def __repr__(self):
+        target = f'config {self.config_map_id}' if self.config_map_id is not None else f'pair {self.pair_id}'
+        return f'<WorkItem {self.id} {target} {self.status}>'
+
+# 预热的 GitLab 文件缓存：commit_sha 为确认该目录列表与内容有效的提交，与分支当前提交一致时比对直接使用，
+# 不再请求 GitLab；内容存放在 ContentBlob 中
+class GitlabFileCache(db.Model):
+    __tablename__ = 'gitlab_file_cache'
+    __table_args__ = (
+        db.UniqueConstraint('ref', 'path', name='uq_gitlab_file_cache_ref_path'),
+        # 比对按目录查找缓存
+        db.Index('ix_gitlab_file_cache_ref_directory', 'ref', 'directory'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ref = db.Column(db.String(128), nullable=False, default='main') # 分支名
+    directory = db.Column(db.String(256), nullable=False) # 所在目录（与 ConfigMap.gitlab_path 去掉首尾 / 后一致）
+    path = db.Column(db.String(512), nullable=False) # 仓库中的完整路径
+    blob_id = db.Column(db.String(40), nullable=False) # git blob sha1，未变化的文件预热时不再下载
+    content_hash = db.Column(db.String(64), nullable=False) # ContentBlob.hash
+    commit_sha = db.Column(db.String(40), nullable=False)
+    fetched_at = db.Column(db.DateTime, default=current_time_plus_8)
+    
+    def __repr__(self):
+        return f'<GitlabFileCache {self.ref}:{self.path} @ {self.commit_sha[:8]}>'
@@ -0,0 +1,80 @@
+import re
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask_login import login_required, current_user
+from app.models import NormalizationProfile
+from app.services.normalizer import compile_patterns
+from app import db
+
+bp = Blueprint('profile', __name__)
+
+@bp.before_request
+@login_required
+def require_login():
+    if not current_user.is_admin:
+        abort(403)
+
+def _apply_form(profile):
+    """将表单内容写入 profile，正则有误时返回错误信息"""
+    ignore_patterns = request.form.get('ignore_patterns', '').strip()
+    try:
+        compile_patterns(ignore_patterns)
+    except re.error as e:
+        return f'忽略规则中的正则有误: {e}'
+    profile.name = request.form.get('name')
+    profile.description = request.form.get('description')
+    profile.ignore_patterns = ignore_patterns
+    profile.trim_trailing_whitespace = bool(request.form.get('trim_trailing_whitespace'))
+    profile.collapse_whitespace = bool(request.form.get('collapse_whitespace'))
+    profile.ignore_blank_lines = bool(request.form.get('ignore_blank_lines'))
+    profile.strip_comments = bool(request.form.get('strip_comments'))
+    profile.comment_prefixes = request.form.get('comment_prefixes', '').strip()
+    return None
+
+@bp.route('/profiles')
+def list_profiles():
+    profiles = NormalizationProfile.query.all()
+    return render_template('profile/list.html', profiles=profiles)
+
+@bp.route('/profiles/add', methods=['POST'])
+def add_profile():
+    if NormalizationProfile.query.filter_by(name=request.form.get('name')).first():
+        flash('规则名称已存在', 'danger')
+        return redirect(url_for('profile.list_profiles'))
+
+    profile = NormalizationProfile()
+    error = _apply_form(profile)
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('profile.list_profiles'))
+    db.session.add(profile)
+    db.session.commit()
+    flash('归一化规则添加成功', 'success')
+    return redirect(url_for('profile.list_profiles'))
+
+@bp.route('/profiles/edit/<int:id>', methods=['POST'])
+def edit_profile(id):
+    profile = NormalizationProfile.query.get_or_404(id)
+    if NormalizationProfile.query.filter(NormalizationProfile.name == request.form.get('name'),
+                                         NormalizationProfile.id != profile.id).first():
+        flash('规则名称已存在', 'danger')
+        return redirect(url_for('profile.list_profiles'))
+
+    error = _apply_form(profile)
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('profile.list_profiles'))
+    db.session.commit()
+    flash('归一化规则更新成功，下次比对时生效', 'success')
+    return redirect(url_for('profile.list_profiles'))
+
+@bp.route('/profiles/delete/<int:id>')
+def delete_profile(id):
+    profile = NormalizationProfile.query.get_or_404(id)
+    if profile.config_maps.count() > 0 or profile.directory_pairs.count() > 0:
+        flash('无法删除：仍有配置项或目录比对使用该规则', 'danger')
+        return redirect(url_for('profile.list_profiles'))
+
+    db.session.delete(profile)
+    db.session.commit()
+    flash('归一化规则删除成功', 'success')
+    return redirect(url_for('profile.list_profiles'))
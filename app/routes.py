@@ -1,7 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, send_from_directory
 from app import db
-from app.models import Server, ConfigMap, DiffResult
-from app.services.diff_service import DiffService
+from app.models import Server, ConfigMap, DiffResult, CompareRun, DirectoryPair, NormalizationProfile
+from app.services.timing import summarize_runs, slowest_phases
+from app.services.blob_store import get_blob
+from app.services.drift_stats import config_map_summaries, pair_summaries, totals
+from app.utils import send_gzip, normalization_profile_id
 from flask_login import login_required, current_user
 
 bp = Blueprint('main', __name__)
@@ -13,7 +16,19 @@ def require_login():
 
 @bp.route('/')
 def index():
-    return render_template('index.html')
+    # 首页概览：按结果表的统计列汇总当前用户可见的配置项与目录对的漂移情况
+    if current_user.is_admin:
+        config_ids = [c.id for c in ConfigMap.query.with_entities(ConfigMap.id)]
+        pair_ids = [p.id for p in DirectoryPair.query.with_entities(DirectoryPair.id)]
+    else:
+        system_ids = [sys.id for sys in current_user.authorized_systems]
+        config_ids = [c.id for c in ConfigMap.query.join(Server).filter(
+            Server.business_system_id.in_(system_ids)).with_entities(ConfigMap.id)]
+        pair_ids = [p.id for p in DirectoryPair.query.filter_by(
+            user_id=current_user.id).with_entities(DirectoryPair.id)]
+    return render_template('index.html',
+                           config_total=totals(config_map_summaries(config_ids)), config_count=len(config_ids),
+                           pair_total=totals(pair_summaries(pair_ids)), pair_count=len(pair_ids))
 
 @bp.route('/configs')
 def list_configs():
@@ -23,7 +38,9 @@ def list_configs():
         system_ids = [sys.id for sys in current_user.authorized_systems]
         servers = Server.query.filter(Server.business_system_id.in_(system_ids)).all()
         
-    return render_template('config/list.html', servers=servers)
+    summaries = config_map_summaries([c.id for server in servers for c in server.config_maps])
+    return render_template('config/list.html', servers=servers, summaries=summaries,
+                           profiles=NormalizationProfile.query.all())
 
 @bp.route('/server/add', methods=['POST'])
 def add_server():
@@ -43,13 +60,29 @@ def add_config():
     remote_path = request.form.get('remote_path')
     gitlab_path = request.form.get('gitlab_path')
     file_pattern = request.form.get('file_pattern', '*')
+    profile_id = normalization_profile_id(request.form.get('normalization_profile_id'))
     
-    config = ConfigMap(server_id=server_id, remote_path=remote_path, gitlab_path=gitlab_path, file_pattern=file_pattern)
+    config = ConfigMap(server_id=server_id, remote_path=remote_path, gitlab_path=gitlab_path, file_pattern=file_pattern,
+                       normalization_profile_id=profile_id)
     db.session.add(config)
     db.session.commit()
     flash('Config map added successfully!', 'success')
     return redirect(url_for('main.list_configs'))
 
+@bp.route('/config/<int:config_id>/profile', methods=['POST'])
+def set_config_profile(config_id):
+    config = ConfigMap.query.get_or_404(config_id)
+    
+    # 权限检查
+    if not current_user.is_admin:
+        if config.server.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
+            abort(403)
+    
+    config.normalization_profile_id = normalization_profile_id(request.form.get('normalization_profile_id'))
+    db.session.commit()
+    flash('归一化规则已更新，下次比对时生效', 'success')
+    return redirect(url_for('main.list_configs'))
+
 @bp.route('/compare/<int:config_id>')
 def compare(config_id):
     config = ConfigMap.query.get_or_404(config_id)
@@ -59,20 +92,17 @@ def compare(config_id):
         if config.server.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
             abort(403)
             
+    # 比对服务依赖 paramiko / python-gitlab，在首次比对时才导入
+    from app.services.diff_service import DiffService
     service = DiffService()
     try:
-        service.compare_config_map(config)
+        service.compare_config_map(config, profile=request.args.get('profile') == '1')
         flash('Comparison completed successfully!', 'success')
     except Exception as e:
         flash(f'Error during comparison: {str(e)}', 'danger')
         
     return redirect(url_for('main.view_results', config_id=config_id))
 
-from app.services.ssh_service import SSHService
-from app.services.gitlab_service import GitLabService
-import posixpath
-from flask_login import current_user
-
 @bp.route('/sync', methods=['POST'])
 def sync_to_gitlab():
     result_ids = request.form.getlist('result_ids')
@@ -80,61 +110,20 @@ def sync_to_gitlab():
         flash('No files selected for sync.', 'warning')
         return redirect(request.referrer)
         
-    gitlab_service = GitLabService()
-    success_count = 0
-    fail_count = 0
+    results = DiffResult.query.filter(DiffResult.id.in_(result_ids)).all()
     
-    for rid in result_ids:
-        result = DiffResult.query.get(rid)
-        if not result:
-            continue
-            
-        config = result.config_map
-        server = config.server
-        
-        # 权限检查
-        if not current_user.is_admin:
-            if server.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
-                # Skip unauthorized
-                continue
-        
-        # 1. 读取服务器上的最新内容
-        ssh = SSHService(server.ip, server.username, password=server.password, key_path=server.ssh_key_path, port=server.port, os_type=server.os_type)
-        try:
-            remote_full_path = posixpath.join(config.remote_path, result.file_name)
-            content = ssh.read_file(remote_full_path)
-            
-            if content is None:
-                flash(f'Failed to read {result.file_name} from server.', 'danger')
-                fail_count += 1
-                continue
-                
-            # 2. 提交到 GitLab
-            # 假设 gitlab_path 是目录，我们需要拼接文件名
-            # 但 DiffService 中我们建立了一个 map，这里简单起见，假设 gitlab_path 就是目录
-            # 如果 gitlab_path 是 'configs/nginx'，filename 是 'site.conf'
-            # 那么目标路径是 'configs/nginx/site.conf'
-            target_gitlab_path = posixpath.join(config.gitlab_path, result.file_name)
-            
-            ok, msg = gitlab_service.update_file(
-                file_path=target_gitlab_path,
-                content=content,
-                commit_message=f"Sync {result.file_name} from {server.name}"
-            )
-            
-            if ok:
-                success_count += 1
-                # 更新 DiffResult 状态? 
-                # 也许不需要，下次对比自然就 MATCH 了
-            else:
-                flash(f'Failed to sync {result.file_name}: {msg}', 'danger')
-                fail_count += 1
-                
-        except Exception as e:
-            flash(f'Error processing {result.file_name}: {str(e)}', 'danger')
-            fail_count += 1
-        finally:
-            ssh.close()
+    # 权限检查
+    if not current_user.is_admin:
+        system_ids = [sys.id for sys in current_user.authorized_systems]
+        # Skip unauthorized
+        results = [r for r in results if r.config_map.server.business_system_id in system_ids]
+    
+    # 按服务器分组读取，所有文件在一次 GitLab 提交中推送
+    from app.services.sync_service import SyncService
+    success_count, failures = SyncService().sync_results(results)
+    
+    for file_name, msg in failures:
+        flash(f'Failed to sync {file_name}: {msg}', 'danger')
             
     if success_count > 0:
         flash(f'Successfully synced {success_count} files.', 'success')
@@ -158,10 +147,13 @@ def batch_compare():
         flash('请至少选择一个配置项进行比对', 'warning')
         return redirect(url_for('main.list_configs'))
         
+    from app.services.diff_service import DiffService
     service = DiffService()
+    profile = bool(request.form.get('profile'))
     success_count = 0
     error_count = 0
     
+    configs = []
     for cid in config_ids:
         config = ConfigMap.query.get(cid)
         if config:
@@ -169,13 +161,15 @@ def batch_compare():
             if not current_user.is_admin:
                 if config.server.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
                     continue
-                    
-            try:
-                service.compare_config_map(config)
-                success_count += 1
-            except Exception as e:
-                current_app.logger.error(f"Error comparing config {cid}: {e}")
-                error_count += 1
+            configs.append(config)
+    
+    # 异步引擎下所有配置项并发拉取，同步引擎下逐个比对
+    for cid, outcome in service.compare_config_maps(configs, profile=profile).items():
+        if isinstance(outcome, Exception):
+            current_app.logger.error(f"Error comparing config {cid}: {outcome}")
+            error_count += 1
+        else:
+            success_count += 1
     
     if success_count > 0:
         flash(f'成功比对 {success_count} 个配置项', 'success')
@@ -207,7 +201,7 @@ def view_batch_results():
         if res:
             grouped_results.append((c, res))
             
-    return render_template('results.html', grouped_results=grouped_results)
+    return render_template('results.html', grouped_results=grouped_results, **_run_timings(configs))
 
 @bp.route('/results/<int:config_id>')
 def view_results(config_id):
@@ -221,4 +215,47 @@ def view_results(config_id):
     # 获取最新的结果，按时间倒序
     results = config.diff_results.order_by(DiffResult.created_at.desc()).limit(50).all()
     # 包装成 grouped_results 格式以便复用模板
-    return render_template('results.html', grouped_results=[(config, results)])
+    return render_template('results.html', grouped_results=[(config, results)], **_run_timings([config]))
+
+def _run_timings(configs):
+    """取每个配置项最近一次比对的耗时记录与结果汇总，并汇总最慢的配置项与阶段"""
+    latest_runs = {}
+    for c in configs:
+        run = c.compare_runs.order_by(CompareRun.started_at.desc()).first()
+        if run:
+            latest_runs[c.id] = run
+    return {
+        'latest_runs': latest_runs,
+        'run_summary': summarize_runs(latest_runs.values()),
+        'slowest_phases': slowest_phases,
+        'summaries': config_map_summaries([c.id for c in configs]),
+    }
+
+@bp.route('/results/diff/<int:result_id>')
+def download_diff(result_id):
+    """下载被截断的 diff 的完整内容（gzip 压缩）"""
+    result = DiffResult.query.get_or_404(result_id)
+    if not current_user.is_admin:
+        if result.config_map.server.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
+            abort(403)
+    content = get_blob(result.diff_hash) if result.diff_truncated else result.diff_content
+    if content is None:
+        abort(404)
+    return send_gzip(content, f'{result.file_name}.diff')
+
+@bp.route('/runs/<int:run_id>/profile')
+def download_run_profile(run_id):
+    """下载某次比对的 cProfile 统计文件，可用 python -m pstats 或 snakeviz 查看"""
+    run = CompareRun.query.get_or_404(run_id)
+    if not run.profile_file:
+        abort(404)
+    
+    # 权限检查：配置项按业务系统，目录对按创建人
+    if not current_user.is_admin:
+        if run.config_map is not None:
+            if run.config_map.server.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
+                abort(403)
+        elif run.pair is None or run.pair.user_id != current_user.id:
+            abort(403)
+    
+    return send_from_directory(current_app.config['PROFILE_DIR'], run.profile_file, as_attachment=True)
@@ -1,33 +1,231 @@
+import zlib
+from apscheduler.triggers.cron import CronTrigger
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from app.models import ScheduledTask, ConfigMap, BusinessSystem, Server, current_time_plus_8
+from app.models import ScheduledTask, ConfigMap, DirectoryPair, BusinessSystem, Server, TaskRun, WorkItem, current_time_plus_8
 from app import db, scheduler
-from datetime import datetime
+from datetime import datetime, timedelta
 
 bp = Blueprint('schedule', __name__)
 
 def run_scheduled_task(task_id):
-    """定时任务执行逻辑"""
+    """定时任务触发：按配置项/目录对拆分为工作项写入队列，由各 worker 进程领取执行（见 work_queue）"""
+    from app.services.leader import lease
     with scheduler.app.app_context():
+        # 任务触发前本进程可能已失去主节点租约，由新的主节点执行
+        if not lease.is_leader:
+            current_app.logger.warning(f"Skipping scheduled task {task_id}: this process no longer holds the scheduler lease")
+            return
         task = ScheduledTask.query.get(task_id)
         if not task or not task.is_active:
             return
 
-        current_app.logger.info(f"Running Scheduled Task: {task.name} (ID: {task.id})")
-        from app.services.diff_service import DiffService
-        
-        diff_service = DiffService()
-        for config_map in task.config_maps:
+        from app.services.work_queue import enqueue_task
+        run = enqueue_task(task)
+        if run is None:
+            current_app.logger.warning(f"Skipping scheduled task {task.name} (ID: {task.id}): previous run is still in progress")
+            return
+        from app.services.work_queue import estimate_completion
+        eta = estimate_completion(run)
+        current_app.logger.info(f"Queued Scheduled Task: {task.name} (ID: {task.id}), run {run.id} with {run.item_count} items"
+                                + (f", estimated completion {eta:%H:%M:%S}" if eta else ""))
+
+# 已登记任务的触发器描述 {job_id: str(trigger)}，用于判断任务是否需要重新登记
+_job_run_times = {}
+
+# crontab 的星期 0/7 为周日，APScheduler 的数字星期从周一开始，统一换成英文缩写
+_WEEKDAYS = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+def _weekday_number(token, end=False):
+    if token.isdigit() and int(token) <= 7:
+        return int(token)
+    if token[:3] in _WEEKDAYS:
+        # 作为范围结尾时 sun 为 7，如 fri-sun
+        return 7 if end and token[:3] == 'sun' else _WEEKDAYS.index(token[:3])
+    raise ValueError(f'星期有误: {token}')
+
+def _cron_weekdays(field):
+    """按 crontab 的含义展开星期字段（支持 , - / 与英文缩写），返回英文缩写列表；
+    步长与跨周日的范围在 APScheduler 中含义不同，不能逐个数字替换"""
+    if field == '*':
+        return field
+    days = set()
+    for part in field.lower().split(','):
+        base, _, step = part.partition('/')
+        if step and not (step.isdigit() and int(step) > 0):
+            raise ValueError(f'步长有误: {part}')
+        if base == '*':
+            first, last = 0, 7
+        else:
+            start, _, end = base.partition('-')
+            first = _weekday_number(start)
+            # N/步长 表示从 N 到周日（7）
+            last = _weekday_number(end, end=True) if end else (7 if step else first)
+        if first > last:
+            raise ValueError(f'星期范围有误: {part}')
+        days.update(d % 7 for d in range(first, last + 1, int(step or 1)))
+    return ','.join(_WEEKDAYS[d] for d in sorted(days))
+
+def parse_cron(expr):
+    """校验 5 段 cron 表达式（分 时 日 月 周），返回 CronTrigger 的参数；格式有误时抛出 ValueError"""
+    fields = (expr or '').split()
+    if len(fields) != 5:
+        raise ValueError('cron 表达式需为 5 段：分 时 日 月 周')
+    minute, hour, day, month, day_of_week = fields
+    # crontab 中日与星期都有限定时满足其一即触发，CronTrigger 要求同时满足，含义不同，不支持
+    if not day.startswith('*') and not day_of_week.startswith('*'):
+        raise ValueError('日与星期不能同时限定，请将其中一个设为 *')
+    day_of_week = _cron_weekdays(day_of_week)
+    fields = {'minute': minute, 'hour': hour, 'day': day, 'month': month, 'day_of_week': day_of_week}
+    CronTrigger(**fields)
+    return fields
+
+def _offset(task, window):
+    return zlib.crc32(str(task.id).encode()) % window if window > 0 else 0
+
+def build_trigger(task):
+    """任务的触发器。每天执行的任务在 run_time 之后 SCHEDULER_JITTER_WINDOW 秒内按任务 id 固定错开，
+    避免设在同一整点的任务同时触发；cron 表达式的任务在触发的那一分钟内错开秒数"""
+    window = current_app.config['SCHEDULER_JITTER_WINDOW']
+    if task.cron_expr:
+        return CronTrigger(second=_offset(task, min(window, 60)), **parse_cron(task.cron_expr))
+    hour, minute = (int(v) for v in task.run_time.split(':'))
+    seconds = (hour * 3600 + minute * 60 + _offset(task, window)) % 86400
+    return CronTrigger(hour=seconds // 3600, minute=seconds % 3600 // 60, second=seconds % 60)
+
+def _add_job(task):
+    trigger = build_trigger(task)
+    scheduler.add_job(
+        id=str(task.id),
+        func=run_scheduled_task,
+        args=[task.id],
+        trigger=trigger,
+        replace_existing=True,
+        coalesce=True,
+        # 调度线程繁忙等原因延迟触发的任务在宽限期内仍会执行（多次错过只执行一次）
+        misfire_grace_time=current_app.config['SCHEDULER_MISFIRE_GRACE'] or None
+    )
+    _job_run_times[str(task.id)] = str(trigger)
+
+def _previous_fire_time(trigger, now, lookback):
+    """now 之前（lookback 之内）最近一次应触发的时间，没有时返回 None"""
+    previous = None
+    fire = trigger.get_next_fire_time(None, now - lookback)
+    while fire is not None and fire <= now:
+        previous = fire
+        fire = trigger.get_next_fire_time(fire, fire + timedelta(seconds=1))
+    return previous
+
+def _catch_up(task):
+    """主节点接管（或重启）时，补执行宽限期内错过的触发（例如宕机或主节点切换期间）"""
+    trigger = build_trigger(task)
+    now = datetime.now(trigger.timezone)
+    grace = current_app.config['SCHEDULER_MISFIRE_GRACE']
+    previous = _previous_fire_time(trigger, now, timedelta(seconds=grace or 7 * 86400))
+    if previous is None:
+        return
+    # 数据库中的时间为 UTC+8，换算为同一时间点后比较
+    previous_at = current_time_plus_8() - (now - previous)
+    if task.created_at and task.created_at > previous_at:
+        return  # 任务在上次触发时间之后才创建
+    latest = task.runs.order_by(TaskRun.created_at.desc()).first()
+    if latest and latest.created_at >= previous_at:
+        return
+    from app.services.work_queue import enqueue_task
+    run = enqueue_task(task)
+    if run is not None:
+        current_app.logger.warning(f"Re-queued missed run of task {task.name} (ID: {task.id}) scheduled at {previous:%Y-%m-%d %H:%M:%S}, run {run.id}")
+
+# 本进程成为主节点后是否已完成首次同步；只在首次同步（启动或接管）时补执行错过的触发，
+# 之后新登记的任务（新建、重新启用）不补执行
+_synced = False
+
+# GitLab 缓存预热任务的 id 与检查间隔（秒）；{task_id: 已预热的下次触发时间}，每次触发只预热一次
+PREWARM_JOB_ID = 'gitlab-prewarm'
+PREWARM_INTERVAL = 60
+_prewarmed = {}
+
+def prewarm_due_tasks():
+    """下次触发在 GITLAB_PREWARM_LEAD 秒之内的任务，预热其配置项所在 GitLab 目录的缓存"""
+    from app.services.leader import lease
+    with scheduler.app.app_context():
+        if not lease.is_leader:
+            return
+        lead = timedelta(seconds=current_app.config['GITLAB_PREWARM_LEAD'])
+        due = {}
+        paths = set()
+        for task in ScheduledTask.query.filter_by(is_active=True).all():
+            if not task.config_maps:
+                continue
             try:
-                # 复用 DiffService 的比对逻辑
-                # 注意：这里我们只执行比对并保存结果，不直接返回给前端
-                # DiffService.compare_config_map 会将结果存入 DiffResult 表
-                diff_service.compare_config_map(config_map)
-            except Exception as e:
-                current_app.logger.error(f"Error comparing config {config_map.id} in task {task.id}: {e}")
-        
-        task.last_run_at = current_time_plus_8()
-        db.session.commit()
+                trigger = build_trigger(task)
+            except Exception:
+                continue  # 触发器无效的任务由 sync_jobs 记录错误
+            now = datetime.now(trigger.timezone)
+            fire = trigger.get_next_fire_time(None, now)
+            if fire is None or fire - now > lead or _prewarmed.get(task.id) == fire:
+                continue
+            due[task.id] = fire
+            paths.update(c.gitlab_path for c in task.config_maps)
+        if not paths:
+            return
+        from app.services.gitlab_cache import prewarm_paths
+        from app.services.gitlab_service import GitLabService
+        fetched, reused = prewarm_paths(GitLabService(), paths)
+        _prewarmed.update(due)
+        current_app.logger.info(f"Prewarmed GitLab cache for tasks {sorted(due)}: {len(paths)} directories, "
+                                f"{fetched} files fetched, {reused} unchanged")
+
+def _add_prewarm_job():
+    if not current_app.config['GITLAB_PREWARM_LEAD'] or scheduler.get_job(PREWARM_JOB_ID) is not None:
+        return
+    scheduler.add_job(
+        id=PREWARM_JOB_ID,
+        func=prewarm_due_tasks,
+        trigger='interval',
+        seconds=min(PREWARM_INTERVAL, current_app.config['GITLAB_PREWARM_LEAD']),
+        next_run_time=datetime.now(),
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+def sync_jobs():
+    """主节点按数据库中的启用任务登记/更新/移除调度器中的任务（每次续租时执行，其他进程的修改也随之生效）"""
+    global _synced
+    expected = {str(t.id): t for t in ScheduledTask.query.filter_by(is_active=True).all()}
+    for job in scheduler.get_jobs():
+        if job.id.isdigit() and job.id not in expected:
+            scheduler.remove_job(job.id)
+            _job_run_times.pop(job.id, None)
+    for job_id, task in expected.items():
+        # 触发时间未变的任务保持原样，避免重复登记
+        try:
+            registered = scheduler.get_job(job_id) is not None
+            if not registered or _job_run_times.get(job_id) != str(build_trigger(task)):
+                _add_job(task)
+                if not registered and not _synced:
+                    _catch_up(task)
+        except Exception as e:
+            current_app.logger.error(f"Failed to schedule task {task.id}: {e}")
+    _synced = True
+    _add_prewarm_job()
+
+def remove_task_jobs():
+    """失去主节点租约时移除所有定时任务，只保留续租任务"""
+    global _synced
+    _synced = False
+    for job in scheduler.get_jobs():
+        if job.id.isdigit() or job.id == PREWARM_JOB_ID:
+            scheduler.remove_job(job.id)
+    _job_run_times.clear()
+    _prewarmed.clear()
+
+def _refresh_jobs():
+    """任务变更后，若本进程为主节点则立即同步；否则由主节点在下次续租时同步"""
+    from app.services.leader import lease
+    if lease.is_leader:
+        sync_jobs()
 
 @bp.before_request
 @login_required
@@ -41,57 +239,90 @@ def list_schedules():
         tasks = ScheduledTask.query.all()
     else:
         tasks = ScheduledTask.query.filter_by(user_id=current_user.id).all()
-    return render_template('schedule/list.html', tasks=tasks)
+    next_fires = {}
+    for task in tasks:
+        try:
+            trigger = build_trigger(task)
+        except ValueError:
+            continue  # 早先保存、现已不支持的 cron 表达式，编辑任务后恢复
+        next_fires[task.id] = trigger.get_next_fire_time(None, datetime.now(trigger.timezone))
+    # 正在执行的任务显示进度与预计完成时间
+    from app.services.work_queue import estimate_completion
+    active_runs = {}
+    for run in TaskRun.query.filter(TaskRun.task_id.in_([t.id for t in tasks]), TaskRun.status == 'RUNNING'):
+        done = run.items.filter(WorkItem.status.in_(('DONE', 'FAILED'))).count()
+        active_runs[run.task_id] = {'done': done, 'total': run.item_count, 'eta': estimate_completion(run)}
+    return render_template('schedule/list.html', tasks=tasks, next_fires=next_fires, active_runs=active_runs)
 
-@bp.route('/schedules/add', methods=['GET', 'POST'])
-def add_schedule():
-    if request.method == 'POST':
-        name = request.form.get('name')
+def _apply_form(task):
+    """将表单中的名称、执行时间与比对对象写入 task，有误时返回错误信息"""
+    name = request.form.get('name')
+    if request.form.get('schedule_type') == 'cron':
+        cron_expr = ' '.join(request.form.get('cron_expr', '').split())
+        try:
+            parse_cron(cron_expr)
+        except ValueError as e:
+            return f'cron 表达式有误: {e}'
+        run_time = None
+    else:
+        cron_expr = None
         run_time = request.form.get('run_time') # HH:MM
-        config_map_ids = request.form.getlist('config_map_ids')
-        
-        if not name or not run_time:
-            flash('名称和时间为必填项', 'danger')
-            return redirect(url_for('schedule.add_schedule'))
-            
-        task = ScheduledTask(
-            name=name,
-            run_time=run_time,
-            user_id=current_user.id
-        )
-        
-        # 处理选中的配置项
-        for cm_id in config_map_ids:
+        if not run_time:
+            return '名称和时间为必填项'
+    if not name:
+        return '名称和时间为必填项'
+
+    task.name = name
+    task.run_time = run_time
+    task.cron_expr = cron_expr
+    task.profile = bool(request.form.get('profile'))
+
+    # 处理选中的配置项与目录比对；新建的 task 尚未加入会话，查询时不自动 flush
+    with db.session.no_autoflush:
+        task.config_maps.clear()
+        for cm_id in request.form.getlist('config_map_ids'):
             cm = ConfigMap.query.get(int(cm_id))
             if cm:
                 task.config_maps.append(cm)
+        task.directory_pairs.clear()
+        for pair_id in request.form.getlist('pair_ids'):
+            pair = DirectoryPair.query.get(int(pair_id))
+            if pair and (current_user.is_admin or pair.user_id == current_user.id):
+                task.directory_pairs.append(pair)
+    return None
+
+def _form_choices():
+    """表单中可选择的服务器（及其配置项）与目录比对"""
+    if current_user.is_admin:
+        servers = Server.query.all()
+        pairs = DirectoryPair.query.all()
+    else:
+        system_ids = [sys.id for sys in current_user.authorized_systems]
+        servers = Server.query.filter(Server.business_system_id.in_(system_ids)).all()
+        pairs = DirectoryPair.query.filter_by(user_id=current_user.id).all()
+    return servers, pairs
+
+@bp.route('/schedules/add', methods=['GET', 'POST'])
+def add_schedule():
+    if request.method == 'POST':
+        task = ScheduledTask(user_id=current_user.id)
+        error = _apply_form(task)
+        if error:
+            flash(error, 'danger')
+            return redirect(url_for('schedule.add_schedule'))
         
         db.session.add(task)
         db.session.commit()
         
-        # 添加任务到 APScheduler
-        hour, minute = run_time.split(':')
-        scheduler.add_job(
-            id=str(task.id),
-            func=run_scheduled_task,
-            args=[task.id],
-            trigger='cron',
-            hour=hour,
-            minute=minute,
-            misfire_grace_time=60  # 忽略错过的任务（例如宕机期间），只允许延迟60秒内的任务补执行
-        )
+        # 添加任务到 APScheduler（仅主节点登记）
+        _refresh_jobs()
 
         flash('定时任务创建成功', 'success')
         return redirect(url_for('schedule.list_schedules'))
     
-    # GET 请求：准备配置项数据供选择
-    if current_user.is_admin:
-        servers = Server.query.all()
-    else:
-        system_ids = [sys.id for sys in current_user.authorized_systems]
-        servers = Server.query.filter(Server.business_system_id.in_(system_ids)).all()
-        
-    return render_template('schedule/form.html', servers=servers)
+    # GET 请求：准备配置项与目录比对供选择
+    servers, pairs = _form_choices()
+    return render_template('schedule/form.html', servers=servers, pairs=pairs)
 
 @bp.route('/schedules/edit/<int:id>', methods=['GET', 'POST'])
 def edit_schedule(id):
@@ -103,54 +334,53 @@ def edit_schedule(id):
         return redirect(url_for('schedule.list_schedules'))
         
     if request.method == 'POST':
-        task.name = request.form.get('name')
-        new_run_time = request.form.get('run_time')
-        config_map_ids = request.form.getlist('config_map_ids')
-        
-        # 更新配置项
-        task.config_maps.clear()
-        for cm_id in config_map_ids:
-            cm = ConfigMap.query.get(int(cm_id))
-            if cm:
-                task.config_maps.append(cm)
-        
-        # 如果时间变了，需要更新调度器
-        if task.run_time != new_run_time:
-            task.run_time = new_run_time
-            hour, minute = new_run_time.split(':')
-            try:
-                # 重新调度任务
-                # 注意：Flask-APScheduler 没有直接暴露 reschedule_job，但可以通过 scheduler.scheduler 访问底层的 APScheduler 实例
-                # 或者更简单地，先删除再添加
-                try:
-                    scheduler.remove_job(str(task.id))
-                except:
-                    pass
-                    
-                scheduler.add_job(
-                    id=str(task.id),
-                    func=run_scheduled_task,
-                    args=[task.id],
-                    trigger='cron',
-                    hour=hour,
-                    minute=minute,
-                    misfire_grace_time=60  # 忽略错过的任务（例如宕机期间），只允许延迟60秒内的任务补执行
-                )
-            except Exception as e:
-                current_app.logger.error(f"Error rescheduling job {task.id}: {e}")
-
+        error = _apply_form(task)
+        if error:
+            db.session.rollback()
+            flash(error, 'danger')
+            return redirect(url_for('schedule.edit_schedule', id=id))
         db.session.commit()
+        # 如果时间变了，需要更新调度器
+        _refresh_jobs()
         flash('任务更新成功', 'success')
         return redirect(url_for('schedule.list_schedules'))
 
     # GET 请求
-    if current_user.is_admin:
-        servers = Server.query.all()
-    else:
-        system_ids = [sys.id for sys in current_user.authorized_systems]
-        servers = Server.query.filter(Server.business_system_id.in_(system_ids)).all()
-        
-    return render_template('schedule/form.html', task=task, servers=servers)
+    servers, pairs = _form_choices()
+    return render_template('schedule/form.html', task=task, servers=servers, pairs=pairs)
+
+@bp.route('/schedules/<int:id>/runs')
+def list_runs(id):
+    """任务最近的执行记录，便于发现耗时变长或失败的执行"""
+    task = ScheduledTask.query.get_or_404(id)
+    if not current_user.is_admin and task.user_id != current_user.id:
+        flash('无权查看此任务', 'danger')
+        return redirect(url_for('schedule.list_schedules'))
+
+    runs = task.runs.order_by(TaskRun.created_at.desc()).limit(50).all()
+    # 正在执行的记录尚未汇总，按工作项当前状态统计
+    from app.services.work_queue import estimate_completion
+    progress = {}
+    for run in runs:
+        if run.status == 'RUNNING':
+            counts = dict(db.session.query(WorkItem.status, db.func.count(WorkItem.id))
+                          .filter(WorkItem.run_id == run.id).group_by(WorkItem.status).all())
+            progress[run.id] = {'counts': counts, 'eta': estimate_completion(run)}
+    return render_template('schedule/runs.html', task=task, runs=runs, progress=progress)
+
+@bp.route('/schedules/runs/<int:run_id>')
+def run_detail(run_id):
+    """一次执行中每个配置项/目录对的结果、耗时与错误"""
+    run = TaskRun.query.get_or_404(run_id)
+    # GitLab 推送触发的执行不属于任何任务，只有管理员可查看
+    if not current_user.is_admin and (run.task is None or run.task.user_id != current_user.id):
+        flash('无权查看此任务', 'danger')
+        return redirect(url_for('schedule.list_schedules'))
+
+    # 耗时最长的排在前面
+    items = run.items.order_by(WorkItem.duration_ms.desc(), WorkItem.id).all()
+    from app.services.work_queue import estimate_completion
+    return render_template('schedule/run_detail.html', run=run, items=items, eta=estimate_completion(run))
 
 @bp.route('/schedules/delete/<int:id>', methods=['POST'])
 def delete_schedule(id):
@@ -160,13 +390,14 @@ def delete_schedule(id):
         flash('无权删除此任务', 'danger')
         return redirect(url_for('schedule.list_schedules'))
         
-    try:
-        scheduler.remove_job(str(task.id))
-    except:
-        pass # 任务可能不在调度器中
-        
+    # 删除任务的执行记录与未完成的工作项，正在执行的工作项完成后不再记录结果
+    run_ids = [run.id for run in task.runs]
+    if run_ids:
+        WorkItem.query.filter(WorkItem.run_id.in_(run_ids)).delete(synchronize_session=False)
+        TaskRun.query.filter_by(task_id=id).delete()
     db.session.delete(task)
     db.session.commit()
+    _refresh_jobs()
     flash('任务已删除', 'success')
     return redirect(url_for('schedule.list_schedules'))
 
@@ -180,27 +411,6 @@ def toggle_schedule(id):
         return redirect(url_for('schedule.list_schedules'))
         
     task.is_active = not task.is_active
-    
-    if task.is_active:
-        try:
-            scheduler.resume_job(str(task.id))
-        except:
-             # 如果任务不存在（比如重启后），则重新添加
-            hour, minute = task.run_time.split(':')
-            scheduler.add_job(
-                id=str(task.id),
-                func=run_scheduled_task,
-                args=[task.id],
-                trigger='cron',
-                hour=hour,
-                minute=minute,
-                misfire_grace_time=60  # 忽略错过的任务（例如宕机期间），只允许延迟60秒内的任务补执行
-            )
-    else:
-        try:
-            scheduler.pause_job(str(task.id))
-        except:
-            pass
-            
     db.session.commit()
+    _refresh_jobs()
     return redirect(url_for('schedule.list_schedules'))
@@ -24,6 +24,30 @@ def list_servers():
         
     return render_template('server/list.html', servers=servers, systems=systems)
 
+def _jump_server_id(server=None):
+    """读取表单中的跳板机，不能选择自身或形成循环，普通用户只能选择授权业务系统的服务器；无效时返回 False"""
+    jump_id = request.form.get('jump_server_id')
+    if not jump_id:
+        return None
+    if not jump_id.isdigit():
+        return False
+    jump = Server.query.get(int(jump_id))
+    if jump is None:
+        return False
+    # 跳板机的登录凭据同样受业务系统授权限制（保留管理员已设置的跳板机除外）
+    unchanged = server is not None and jump.id == server.jump_server_id
+    if not current_user.is_admin and not unchanged and \
+            jump.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
+        return False
+    # 沿跳板机链检查，避免经由自身中转
+    node = jump
+    while node is not None:
+        if server is not None and node.id == server.id:
+            return False
+        node = node.jump_server
+    return jump.id
+
+
 @bp.route('/servers/add', methods=['POST'])
 def add_server():
     name = request.form.get('name')
@@ -33,16 +57,21 @@ def add_server():
     port = request.form.get('port', 22)
     os_type = request.form.get('os_type', 'Linux')
     business_system_id = request.form.get('business_system_id')
+    jump_server_id = _jump_server_id()
     
     # 权限检查
     if not current_user.is_admin:
         if not business_system_id or int(business_system_id) not in [sys.id for sys in current_user.authorized_systems]:
              flash('无权在该业务系统下添加服务器', 'danger')
              return redirect(url_for('server.list_servers'))
+    
+    if jump_server_id is False:
+        flash('无效的跳板机：不存在或无权使用', 'danger')
+        return redirect(url_for('server.list_servers'))
              
     server = Server(
         name=name, ip=ip, username=username, password=encrypt_password(password), 
-        port=port, os_type=os_type, business_system_id=business_system_id
+        port=port, os_type=os_type, business_system_id=business_system_id, jump_server_id=jump_server_id
     )
     db.session.add(server)
     db.session.commit()
@@ -75,8 +104,14 @@ def edit_server(id):
          if int(new_sys_id) not in [sys.id for sys in current_user.authorized_systems]:
              flash('无权转移到该业务系统', 'danger')
              return redirect(url_for('server.list_servers'))
+    
+    jump_server_id = _jump_server_id(server)
+    if jump_server_id is False:
+        flash('无效的跳板机：不能选择自身、形成循环或使用无权的服务器', 'danger')
+        return redirect(url_for('server.list_servers'))
              
     server.business_system_id = new_sys_id
+    server.jump_server_id = jump_server_id
     
     db.session.commit()
     flash('服务器更新成功', 'success')
@@ -89,6 +124,10 @@ def delete_server(id):
     if not current_user.is_admin:
         if server.business_system_id not in [sys.id for sys in current_user.authorized_systems]:
             abort(403)
+    
+    if server.jump_targets.count():
+        flash('该服务器仍被其他服务器用作跳板机，无法删除', 'danger')
+        return redirect(url_for('server.list_servers'))
             
     db.session.delete(server)
     db.session.commit()
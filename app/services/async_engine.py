@@ -0,0 +1,426 @@
+import asyncio
+import base64
+import json
+import os
+import posixpath
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from flask import current_app
+from app.utils import decrypt_password, decode_content
+from app.services.ssh_service import build_list_commands
+from app.services.metrics import SSH_CONNECTIONS_OPEN, GITLAB_IN_FLIGHT
+from app.services.circuit_breaker import breaker, HostUnreachableError
+from app.services.timing import NULL_TIMER
+
+# 基于 asyncio 的比对引擎（COMPARE_ENGINE=async），使用 asyncssh 与 aiohttp，一个进程内可同时处理数百台服务器
+# 这里只负责并发拉取文件列表与内容；生成 DiffResult 与入库沿用 DiffService 的同一套逻辑，结果与同步引擎一致
+
+# 一台服务器的连接参数，password 为解密后的明文，key_path 为实际使用的私钥文件（不存在时为 None），
+# jump 为跳板机的 HostSpec（直连时为 None）
+HostSpec = namedtuple('HostSpec', 'host port username password key_path os_type jump')
+# 配置项任务：服务器目录 + GitLab 目录，gitlab_files 为预热缓存中的 {仓库路径: 内容}（没有可用缓存时为 None）
+ConfigMapJob = namedtuple('ConfigMapJob', 'id host remote_path file_pattern gitlab_path timer gitlab_files', defaults=(None,))
+# 目录对任务：左右两台服务器的目录
+PairJob = namedtuple('PairJob', 'id left left_path right right_path file_pattern timer')
+
+# 与 GitLabService 的 requests 重试策略一致的可重试状态码
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def available():
+    """是否已安装异步引擎依赖"""
+    try:
+        import asyncssh  # noqa: F401
+        import aiohttp  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def host_spec(server):
+    """在应用上下文中解析服务器连接参数，供事件循环使用"""
+    password = decrypt_password(server.password) if server.password else None
+    key_path = None
+    if not password:
+        key_file = server.ssh_key_path or current_app.config.get('SSH_KEY_PATH')
+        if key_file and os.path.exists(key_file):
+            key_path = key_file
+    jump = host_spec(server.jump_server) if server.jump_server else None
+    return HostSpec(server.ip, server.port or 22, server.username, password, key_path, server.os_type, jump)
+
+
+def fetch_config_maps(jobs, on_fetched, config, logger):
+    """并发拉取配置项内容，每个任务完成后在入库线程中调用 on_fetched(job, (服务器内容, GitLab 内容) 或异常)
+
+    入库线程各自推入应用上下文，使用独立的数据库会话，on_fetched 需按 id 重新加载所需对象。
+    返回 {job.id: on_fetched 的返回值}。
+    """
+    return _fetch(jobs, lambda fetcher, job: fetcher._run_job(job, on_fetched), config, logger)
+
+
+def fetch_directory_pairs(jobs, saver, config, logger):
+    """并发比对目录对，两侧按 COMPARE_CHUNK_SIZE 分块读取后交给 saver 入库
+
+    每个目录对占用一个入库线程，在其中依次调用 saver.start(job)、每块一次 saver.chunk(job, 左侧内容, 右侧内容)，
+    最后 saver.finish(job, 异常或 None)。返回 {job.id: saver.finish 的返回值}。
+    """
+    return _fetch(jobs, lambda fetcher, job: fetcher._run_pair(job, saver), config, logger)
+
+
+def _fetch(jobs, runner, config, logger):
+    writers = _Writers(current_app._get_current_object(), _writer_count(config))
+    try:
+        return asyncio.run(_AsyncFetcher(config, logger, writers).run(jobs, runner))
+    finally:
+        writers.close()
+
+
+def _writer_count(config):
+    from app import db
+    # SQLite 同一时刻只允许一个写事务
+    if db.engine.dialect.name == 'sqlite':
+        return 1
+    return config['ASYNC_DB_WRITERS']
+
+
+_writer_local = threading.local()
+
+
+def _enter_context(app):
+    _writer_local.context = app.app_context()
+    _writer_local.context.push()
+
+
+def _exit_context():
+    context = getattr(_writer_local, 'context', None)
+    if context is not None:
+        # 弹出应用上下文时 Flask-SQLAlchemy 关闭该线程的会话
+        context.pop()
+        _writer_local.context = None
+
+
+class _Writers:
+    """入库线程：SQLAlchemy 写入在线程中执行，不阻塞事件循环中其他任务的 SSH/GitLab 读取"""
+
+    def __init__(self, app, size):
+        self._executors = [ThreadPoolExecutor(1, initializer=_enter_context, initargs=(app,)) for _ in range(size)]
+        self._free = None
+
+    async def acquire(self):
+        if self._free is None:
+            self._free = asyncio.Queue()
+            for executor in self._executors:
+                self._free.put_nowait(executor)
+        return await self._free.get()
+
+    def release(self, executor):
+        self._free.put_nowait(executor)
+
+    async def call(self, func, *args):
+        """在空闲的入库线程中执行 func(*args)，返回其结果"""
+        executor = await self.acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            self.release(executor)
+
+    def hold(self):
+        """占用一个入库线程执行多次调用（同一会话、同一事务），第一次调用时才占用"""
+        return _HeldWriter(self)
+
+    def close(self):
+        for executor in self._executors:
+            executor.submit(_exit_context)
+            executor.shutdown(wait=True)
+
+
+class _HeldWriter:
+    def __init__(self, writers):
+        self._writers = writers
+        self._executor = None
+
+    async def call(self, func, *args):
+        if self._executor is None:
+            self._executor = await self._writers.acquire()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def release(self):
+        if self._executor is not None:
+            self._writers.release(self._executor)
+            self._executor = None
+
+
+class _AsyncFetcher:
+    def __init__(self, config, logger, writers):
+        self.config = config
+        self.logger = logger
+        self._writers = writers
+        self._session = None
+        self._jobs = None
+        self._gitlab = None
+        self._tunnels = {}
+        self._base = f"{(config.get('GITLAB_URL') or '').rstrip('/')}/api/v4/projects/{quote(str(config.get('GITLAB_PROJECT_ID')), safe='')}"
+
+    async def run(self, jobs, runner):
+        import aiohttp
+        self._jobs = asyncio.Semaphore(self.config['ASYNC_MAX_JOBS'])
+        self._gitlab = asyncio.Semaphore(self.config['GITLAB_MAX_CONCURRENCY'])
+        timeout = aiohttp.ClientTimeout(total=self.config['GITLAB_TIMEOUT'])
+        connector = aiohttp.TCPConnector(limit=self.config['GITLAB_POOL_SIZE'])
+        headers = {'PRIVATE-TOKEN': self.config.get('GITLAB_TOKEN') or ''}
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector, headers=headers) as session:
+            self._session = session
+            try:
+                outcomes = await asyncio.gather(*(runner(self, job) for job in jobs))
+            finally:
+                await self._close_tunnels()
+        return {job.id: outcome for job, outcome in zip(jobs, outcomes)}
+
+    async def _run_job(self, job, on_fetched):
+        async with self._jobs:
+            # 耗时从真正开始执行时算起，不包括排队等待
+            job.timer.started = time.perf_counter()
+            try:
+                fetched = await self._fetch_config_map(job)
+            except Exception as e:
+                fetched = e
+            # 入库交给入库线程，处理完即释放内容，内存只与同时进行的任务数有关
+            try:
+                return await self._writers.call(on_fetched, job, fetched)
+            except Exception as e:
+                return e
+
+    async def _fetch_config_map(self, job):
+        conn = await self._connect(job.host, job.timer)
+        try:
+            remote_files = await self._list(conn, job.host, job.remote_path, job.file_pattern, job.timer)
+            cached = job.gitlab_files
+            gitlab_files = list(cached) if cached is not None else await self._gitlab_list(job.gitlab_path, job.timer)
+            # 与同步引擎一致：按文件名匹配，服务器文件以 remote_path 拼接文件名读取
+            remote_paths = {os.path.basename(f): posixpath.join(job.remote_path, os.path.basename(f)) for f in remote_files}
+            gitlab_paths = {os.path.basename(f): f for f in gitlab_files}
+            if cached is not None:
+                return await self._read_all(conn, remote_paths, job.timer), {name: cached[p] for name, p in gitlab_paths.items()}
+            remote, gitlab = await asyncio.gather(
+                self._read_all(conn, remote_paths, job.timer),
+                self._gitlab_read_all(gitlab_paths, job.timer),
+            )
+            return remote, gitlab
+        finally:
+            await self._close(conn)
+
+    async def _run_pair(self, job, saver):
+        async with self._jobs:
+            job.timer.started = time.perf_counter()
+            writer = self._writers.hold()
+            try:
+                try:
+                    await self._stream_pair(job, saver, writer)
+                    error = None
+                except Exception as e:
+                    error = e
+                try:
+                    return await writer.call(saver.finish, job, error)
+                except Exception as e:
+                    return e
+            finally:
+                writer.release()
+
+    async def _stream_pair(self, job, saver, writer):
+        """与同步引擎一致：两侧按文件名顺序每 COMPARE_CHUNK_SIZE 个读取一块，上一块入库时读取下一块，
+        内存只与分块大小有关，与目录大小无关"""
+        left_conn = await self._connect(job.left, job.timer)
+        try:
+            right_conn = await self._connect(job.right, job.timer)
+            try:
+                left_files, right_files = await asyncio.gather(
+                    self._list(left_conn, job.left, job.left_path, job.file_pattern, job.timer),
+                    self._list(right_conn, job.right, job.right_path, job.file_pattern, job.timer),
+                )
+                left_paths = {os.path.basename(p): p for p in left_files}
+                right_paths = {os.path.basename(p): p for p in right_files}
+                names = sorted(set(left_paths) | set(right_paths))
+                size = self.config['COMPARE_CHUNK_SIZE']
+                saving = asyncio.ensure_future(writer.call(saver.start, job))
+                try:
+                    for i in range(0, len(names), size):
+                        chunk = names[i:i + size]
+                        left, right = await asyncio.gather(
+                            self._read_all(left_conn, {n: left_paths[n] for n in chunk if n in left_paths}, job.timer),
+                            self._read_all(right_conn, {n: right_paths[n] for n in chunk if n in right_paths}, job.timer),
+                        )
+                        await saving
+                        saving = asyncio.ensure_future(writer.call(saver.chunk, job, left, right))
+                    await saving
+                except BaseException:
+                    # 等进行中的入库结束后再回滚
+                    await asyncio.wait([saving])
+                    if not saving.cancelled():
+                        saving.exception()
+                    raise
+            finally:
+                await self._close(right_conn)
+        finally:
+            await self._close(left_conn)
+
+    async def _connect(self, spec, timer):
+        import asyncssh
+        config = self.config
+        breaker.check(spec.host, spec.port)
+        options = {'port': spec.port, 'username': spec.username, 'known_hosts': None,
+                   'connect_timeout': config['SSH_CONNECT_TIMEOUT'],
+                   'login_timeout': config['SSH_BANNER_TIMEOUT'] + config['SSH_AUTH_TIMEOUT']}
+        if spec.password:
+            options['password'] = spec.password
+        elif spec.key_path:
+            options['client_keys'] = [spec.key_path]
+        with timer.span('ssh_connect'):
+            if spec.jump:
+                # 跳板机不可达时直接抛出其 HostUnreachableError，不计入目标机的熔断
+                options['tunnel'] = await self._tunnel(spec.jump)
+            try:
+                conn = await asyncssh.connect(spec.host, **options)
+            except Exception as e:
+                self.logger.error(f"Failed to connect to {spec.host}: {e}")
+                # 认证失败（PermissionDenied 等）不计入熔断；经跳板机转发被拒绝视为目标机不可达
+                if not isinstance(e, (OSError, asyncssh.ConnectionLost, asyncssh.ChannelOpenError)):
+                    raise
+                if breaker.record_failure(spec.host, spec.port, e, config['SSH_BREAKER_THRESHOLD'], config['SSH_BREAKER_COOLDOWN']):
+                    self.logger.warning(f"Circuit opened for {spec.host}:{spec.port} for {config['SSH_BREAKER_COOLDOWN']}s: {e}")
+                raise HostUnreachableError(spec.host, spec.port, e) from e
+        breaker.record_success(spec.host, spec.port)
+        SSH_CONNECTIONS_OPEN.inc()
+        return conn
+
+    async def _tunnel(self, spec):
+        """同一次运行中每个跳板机只连接认证一次，各目标机经其 direct-tcpip 通道连接"""
+        key = (spec.host, spec.port, spec.username)
+        task = self._tunnels.get(key)
+        if task is None:
+            task = self._tunnels[key] = asyncio.ensure_future(self._connect(spec, NULL_TIMER))
+        return await asyncio.shield(task)
+
+    async def _close_tunnels(self):
+        for task in self._tunnels.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None:
+                await self._close(task.result())
+        self._tunnels = {}
+
+    async def _close(self, conn):
+        conn.close()
+        try:
+            await conn.wait_closed()
+        finally:
+            SSH_CONNECTIONS_OPEN.dec()
+
+    async def _list(self, conn, spec, remote_path, pattern, timer):
+        with timer.span('ssh_list') as span:
+            files = []
+            for target, cmd in build_list_commands(remote_path, pattern, spec.os_type):
+                if spec.os_type == 'Windows':
+                    try:
+                        result = await conn.run(cmd, encoding=None, timeout=self.config['SSH_COMMAND_TIMEOUT'])
+                        try:
+                            output = result.stdout.decode('gbk')
+                        except UnicodeDecodeError:
+                            output = result.stdout.decode('utf-8', errors='replace')
+                        files.extend(line.strip() for line in output.splitlines() if line.strip())
+                    except Exception as e:
+                        self.logger.error(f"Error executing dir command for {target}: {e}")
+                else:
+                    result = await conn.run(cmd, encoding=None, timeout=self.config['SSH_COMMAND_TIMEOUT'])
+                    error = result.stderr.decode('utf-8')
+                    if error:
+                        self.logger.error(f"Error listing files: {error}")
+                    lines = result.stdout.decode('utf-8').split('\n')
+                    if lines and lines[-1] == '':
+                        lines.pop()
+                    files.extend(line.strip() for line in lines)
+            if spec.os_type == 'Windows':
+                files = list(set(files))
+            span.bytes = sum(len(f) for f in files)
+        return files
+
+    async def _read_all(self, conn, paths, timer):
+        """在同一连接的一个 SFTP 会话上并发读取 {文件名: 路径}，读取失败的文件内容为 None"""
+        if not paths:
+            return {}
+        limit = asyncio.Semaphore(self.config['ASYNC_READS_PER_HOST'])
+        async with conn.start_sftp_client() as sftp:
+            async def read(path):
+                async with limit:
+                    try:
+                        with timer.span('ssh_read') as span:
+                            async with sftp.open(path, 'rb') as f:
+                                data = await asyncio.wait_for(f.read(), self.config['SSH_COMMAND_TIMEOUT'])
+                            span.bytes = len(data)
+                    except Exception as e:
+                        self.logger.error(f"Error reading file {path}: {e}")
+                        return None
+                with timer.span('decode'):
+                    return decode_content(data)
+            contents = await asyncio.gather(*(read(p) for p in paths.values()))
+        return dict(zip(paths, contents))
+
+    async def _gitlab_get(self, path, params):
+        """GET 请求，429/5xx 与连接错误按 GITLAB_BACKOFF_FACTOR 指数退避重试，返回 (状态码, 响应头, 正文)"""
+        import aiohttp
+        retries = self.config['GITLAB_MAX_RETRIES']
+        for attempt in range(retries + 1):
+            delay = self.config['GITLAB_BACKOFF_FACTOR'] * (2 ** attempt)
+            async with self._gitlab:
+                GITLAB_IN_FLIGHT.inc()
+                try:
+                    async with self._session.get(self._base + path, params=params) as resp:
+                        if resp.status not in _RETRY_STATUS or attempt == retries:
+                            return resp.status, resp.headers, await resp.read()
+                        retry_after = resp.headers.get('Retry-After')
+                        if retry_after and retry_after.isdigit():
+                            delay = int(retry_after)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt == retries:
+                        raise
+                finally:
+                    GITLAB_IN_FLIGHT.dec()
+            await asyncio.sleep(delay)
+
+    async def _gitlab_list(self, path, timer):
+        """列出 GitLab 目录下的文件，失败时与 GitLabService.list_files 一样返回空列表"""
+        files = []
+        try:
+            with timer.span('gitlab_list'):
+                page = '1'
+                while page:
+                    status, headers, body = await self._gitlab_get('/repository/tree', {'path': path, 'ref': 'main', 'per_page': '100', 'page': page})
+                    if status != 200:
+                        raise RuntimeError(f"{status}: {body[:200]!r}")
+                    files.extend(item['path'] for item in json.loads(body) if item['type'] == 'blob')
+                    page = headers.get('X-Next-Page')
+        except Exception as e:
+            self.logger.error(f"Error listing files from GitLab: {e}")
+            return []
+        return files
+
+    async def _gitlab_read(self, file_path, timer):
+        try:
+            with timer.span('gitlab_fetch') as span:
+                status, _, body = await self._gitlab_get(f"/repository/files/{quote(file_path, safe='')}", {'ref': 'main'})
+                if status != 200:
+                    # 与 GitLabService 一致，文件不存在等请求错误视为 GitLab 中没有该文件
+                    return None
+                data = base64.b64decode(json.loads(body)['content'])
+                span.bytes = len(data)
+        except Exception as e:
+            self.logger.error(f"Error getting file from GitLab: {e}")
+            return None
+        with timer.span('decode'):
+            return decode_content(data)
+
+    async def _gitlab_read_all(self, paths, timer):
+        contents = await asyncio.gather(*(self._gitlab_read(p, timer) for p in paths.values()))
+        return dict(zip(paths, contents))
@@ -0,0 +1,48 @@
+import hashlib
+import zlib
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import ContentBlob, DiffResult, DirectoryDiffResult, GitlabFileCache
+
+
+def content_hash(content):
+    """计算文本内容的 sha256（按 utf-8 编码）"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def put_blob(content):
+    """保存内容快照并返回其 hash，已存在则直接复用；由调用方负责 commit"""
+    h = content_hash(content)
+    if db.session.get(ContentBlob, h) is not None:
+        return h
+
+    raw = content.encode('utf-8')
+    try:
+        # 使用 savepoint，并发写入同一内容时忽略主键冲突
+        with db.session.begin_nested():
+            db.session.add(ContentBlob(hash=h, size=len(raw), data=zlib.compress(raw)))
+    except IntegrityError:
+        pass
+    return h
+
+
+def get_blob(h):
+    """按 hash 读取内容快照，不存在时返回 None"""
+    if not h:
+        return None
+    blob = db.session.get(ContentBlob, h)
+    if blob is None:
+        return None
+    return zlib.decompress(blob.data).decode('utf-8')
+
+
+def prune_blobs():
+    """删除不再被任何比对结果或 GitLab 预热缓存引用的快照（服务器内容与截断 diff 的完整内容），返回删除数量"""
+    referenced = db.session.query(DiffResult.remote_hash).filter(DiffResult.remote_hash.isnot(None)).union(
+        db.session.query(DiffResult.diff_hash).filter(DiffResult.diff_hash.isnot(None)),
+        db.session.query(DirectoryDiffResult.diff_hash).filter(DirectoryDiffResult.diff_hash.isnot(None)),
+        db.session.query(GitlabFileCache.content_hash),
+    )
+    count = ContentBlob.query.filter(~ContentBlob.hash.in_(referenced)).delete(synchronize_session=False)
+    db.session.commit()
+    return count
@@ -0,0 +1,81 @@
+import threading
+import time
+
+# 进程级共享的主机熔断器：连接某台服务器连续失败达到阈值后，在冷却期内直接判定为不可达，
+# 避免同一台宕机/黑洞主机上的每个配置项都重复等待连接超时。冷却期结束后（半开）只放行一个试探连接，
+# 成功则恢复，失败则重新熔断；试探进行期间其他调用仍直接判定为不可达。
+
+# 试探连接未报告结果（如认证失败等不计入熔断的异常）时，超过该时间（秒）后再放行下一个试探
+PROBE_TIMEOUT = 60
+
+
+def _describe(reason):
+    # TimeoutError 等异常的 str() 为空，用类型名代替
+    return str(reason) or type(reason).__name__
+
+
+class HostUnreachableError(Exception):
+    """服务器不可达（连接超时、拒绝连接或处于熔断冷却期）"""
+
+    def __init__(self, host, port, reason):
+        reason = _describe(reason)
+        super().__init__(f"Host {host}:{port} unreachable: {reason}")
+        self.host = host
+        self.port = port
+        self.reason = reason
+
+
+class HostCircuitBreaker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (host, port) -> {'failures': n, 'open_until': monotonic 或 None, 'probe_until': monotonic 或 None, 'reason': str}
+        self._hosts = {}
+
+    def check(self, host, port):
+        """处于熔断冷却期或半开状态下已有试探连接时抛出 HostUnreachableError，否则放行"""
+        with self._lock:
+            state = self._hosts.get((host, port))
+            if not state or state['open_until'] is None:
+                return
+            now = time.monotonic()
+            remaining = state['open_until'] - now
+            reason = state['reason']
+            if remaining > 0:
+                message = f"circuit open for another {remaining:.0f}s after: {reason}"
+            elif state['probe_until'] is not None and state['probe_until'] > now:
+                message = f"circuit half-open, probe in progress after: {reason}"
+            else:
+                # 冷却期结束：只放行本次调用作为试探，结果由 record_success / record_failure 报告
+                state['probe_until'] = now + PROBE_TIMEOUT
+                return
+        raise HostUnreachableError(host, port, message)
+
+    def record_success(self, host, port):
+        with self._lock:
+            self._hosts.pop((host, port), None)
+
+    def record_failure(self, host, port, reason, threshold, cooldown):
+        """记录一次连接失败，连续失败达到 threshold 次时熔断 cooldown 秒，返回熔断器是否因此打开"""
+        with self._lock:
+            state = self._hosts.setdefault((host, port), {'failures': 0, 'open_until': None, 'probe_until': None, 'reason': ''})
+            state['failures'] += 1
+            state['reason'] = _describe(reason)
+            if state['failures'] >= threshold:
+                state['open_until'] = time.monotonic() + cooldown
+                state['probe_until'] = None
+                return True
+            return False
+
+    def open_hosts(self):
+        """当前处于冷却期的 [(host, port)]"""
+        now = time.monotonic()
+        with self._lock:
+            return [key for key, state in self._hosts.items()
+                    if state['open_until'] is not None and state['open_until'] > now]
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+breaker = HostCircuitBreaker()
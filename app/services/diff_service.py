@@ -1,8 +1,18 @@
 import difflib
 from app import db
-from app.models import DiffResult, DirectoryDiffResult
+from app.models import DiffResult, DirectoryDiffResult, CompareRun, ConfigMap, DirectoryPair
 from app.services.ssh_service import SSHService
 from app.services.gitlab_service import GitLabService
+from app.services.gitlab_cache import CacheReader
+from app.services.blob_store import put_blob, content_hash
+from app.services.normalizer import for_profile
+from app.services.timing import PhaseTimer, NULL_TIMER
+from app.services.metrics import COMPARES_IN_PROGRESS, record_compare
+from app.services.profiling import new_profile_filename, run_profiled
+from app.services.circuit_breaker import HostUnreachableError
+from app.services.estimates import longest_first, update_estimate
+from collections import Counter
+from contextlib import closing
 import os
 import posixpath # Use posixpath for remote unix paths
 from flask import current_app
@@ -10,12 +20,257 @@ from flask import current_app
 class DiffService:
     def __init__(self):
         self.gitlab_service = GitLabService()
+        # 预热的 GitLab 缓存，分支提交未变的目录不再请求 GitLab
+        self.gitlab_cache = CacheReader(self.gitlab_service)
+        # 当前正在性能分析的统计文件名，由 _record_run 写入 CompareRun
+        self._profile_file = None
 
-    def compare_config_map(self, config_map):
+    def _profiled(self, kind, target_id, func, *args):
+        """在 cProfile 下执行一次比对，统计文件名记录到本次 CompareRun"""
+        self._profile_file = new_profile_filename(kind, target_id)
+        try:
+            return run_profiled(self._profile_file, func, *args)
+        finally:
+            self._profile_file = None
+
+    def _record_run(self, timer, status, status_counts, config_map=None, pair=None):
+        """保存本次比对的阶段耗时，并在日志中输出最慢的阶段"""
+        elapsed = timer.elapsed()
+        duration_ms = int(elapsed * 1000)
+        file_count = sum(status_counts.values())
+        target = f"config map {config_map.id}" if config_map is not None else f"directory pair {pair.id}"
+        record_compare('config_map' if config_map is not None else 'dir_pair', status, elapsed, status_counts)
+        if current_app:
+            current_app.logger.info(f"Compared {target} ({status}, {file_count} files) in {duration_ms}ms; slowest phases: {timer.summary()}")
+        try:
+            db.session.add(CompareRun(
+                config_map_id=config_map.id if config_map is not None else None,
+                pair_id=pair.id if pair is not None else None,
+                duration_ms=duration_ms,
+                status=status,
+                file_count=file_count,
+                phase_stats=timer.to_json(),
+                profile_file=self._profile_file
+            ))
+            if status == 'OK':
+                update_estimate(config_map if config_map is not None else pair, duration_ms)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if current_app:
+                current_app.logger.error(f"Failed to record compare run for {target}: {e}")
+
+    def _use_async(self):
+        """COMPARE_ENGINE=async 且已安装 asyncssh/aiohttp 时使用异步引擎"""
+        if current_app.config.get('COMPARE_ENGINE') != 'async':
+            return False
+        from app.services.async_engine import available
+        if available():
+            return True
+        current_app.logger.warning("COMPARE_ENGINE=async requires asyncssh and aiohttp; falling back to the sync engine")
+        return False
+
+    def compare_config_map(self, config_map, profile=False):
+        """比对配置项，profile=True 时在 cProfile 下执行并保存统计文件"""
+        if self._use_async():
+            outcome = self.compare_config_maps([config_map], profile=profile)[config_map.id]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        if profile:
+            return self._profiled('config_map', config_map.id, self._compare_config_map, config_map)
+        return self._compare_config_map(config_map)
+
+    def compare_config_maps(self, config_maps, profile=False):
+        """批量比对配置项，返回 {config_map.id: DiffResult 列表或异常}
+
+        异步引擎下所有配置项的服务器与 GitLab 内容并发拉取，同步引擎下逐个比对。
+        按历史耗时从长到短开始，避免耗时长的配置项最后才开始而拖长整批比对。
+        """
+        config_maps = longest_first(config_maps)
+        if not self._use_async():
+            outcomes = {}
+            for config_map in config_maps:
+                try:
+                    outcomes[config_map.id] = self.compare_config_map(config_map, profile=profile)
+                except Exception as e:
+                    outcomes[config_map.id] = e
+            return outcomes
+        if profile:
+            return self._profiled('config_map', _batch_name(config_maps), self._compare_config_maps_async, config_maps)
+        return self._compare_config_maps_async(config_maps)
+
+    def compare_directory_pairs(self, pairs, profile=False):
+        """批量比对目录对，返回 {pair.id: 各状态文件数 Counter 或异常}"""
+        pairs = longest_first(pairs)
+        if not self._use_async():
+            outcomes = {}
+            for pair in pairs:
+                try:
+                    outcomes[pair.id] = self.compare_directory_pair(pair, profile=profile)
+                except Exception as e:
+                    outcomes[pair.id] = e
+            return outcomes
+        if profile:
+            return self._profiled('dir_pair', _batch_name(pairs), self._compare_directory_pairs_async, pairs)
+        return self._compare_directory_pairs_async(pairs)
+
+    def _config_map_result(self, config_map, filename, remote_content, gitlab_content, timer):
+        """根据已读取的内容生成一个文件的 DiffResult，两侧都不存在时返回 None（同步与异步引擎共用）"""
+        diff_fields = {"diff_content": ""}
+        if remote_content is None and gitlab_content is None:
+            return None
+        elif remote_content is None:
+            status = "MISSING_REMOTE"
+        elif gitlab_content is None:
+            status = "MISSING_LOCAL"
+        else:
+            with timer.span('diff'):
+                # 使用 splitlines() 预处理，忽略换行符差异 (\r\n vs \n)
+                remote_lines = remote_content.splitlines()
+                gitlab_lines = gitlab_content.splitlines()
+                
+                # 行不同但按规则归一化后一致的文件直接判定为一致，不生成 diff
+                if remote_lines != gitlab_lines and not _normalized_equal(config_map, filename, remote_content, gitlab_content):
+                    status = "DIFF"
+                    diff = difflib.unified_diff(
+                        gitlab_lines,
+                        remote_lines,
+                        fromfile=f'GitLab/{filename}',
+                        tofile=f'Server/{filename}',
+                        lineterm=''
+                    )
+                    diff_fields = _diff_fields(list(diff))
+                else:
+                    status = "MATCH"
+        
+        # 需要同步的文件保存服务器内容快照，同步时直接推送本次比对的内容，无需再次读取服务器；
+        # 快照以内容 sha256 为键，其他状态只记录 hash
+        if status in ("DIFF", "MISSING_LOCAL"):
+            remote_hash = put_blob(remote_content)
+        else:
+            remote_hash = _sha256(remote_content)
+        
+        return DiffResult(
+            config_map_id=config_map.id,
+            file_name=filename,
+            status=status,
+            remote_hash=remote_hash,
+            gitlab_sha256=_sha256(gitlab_content),
+            **diff_fields
+        )
+
+    def _pair_result(self, pair, name, left_content, right_content, timer):
+        """根据已读取的内容生成一个文件的 DirectoryDiffResult，两侧都不存在时返回 None"""
+        diff_fields = {"diff_content": ""}
+        if left_content is None and right_content is None:
+            return None
+        elif left_content is None:
+            status = "MISSING_LEFT"
+        elif right_content is None:
+            status = "MISSING_RIGHT"
+        else:
+            with timer.span('diff'):
+                left_lines = left_content.splitlines()
+                right_lines = right_content.splitlines()
+                if left_lines != right_lines and not _normalized_equal(pair, name, left_content, right_content):
+                    status = "DIFF"
+                    diff = difflib.unified_diff(
+                        left_lines,
+                        right_lines,
+                        fromfile=f'Left/{name}',
+                        tofile=f'Right/{name}',
+                        lineterm=''
+                    )
+                    diff_fields = _diff_fields(list(diff))
+                else:
+                    status = "MATCH"
+        
+        return DirectoryDiffResult(
+            pair_id=pair.id,
+            file_name=name,
+            status=status,
+            left_content=_capped(left_content),  # Save original content
+            right_content=_capped(right_content), # Save original content
+            left_sha256=_sha256(left_content),
+            right_sha256=_sha256(right_content),
+            **diff_fields
+        )
+
+    def _compare_config_maps_async(self, config_maps):
+        from app.services.async_engine import ConfigMapJob, fetch_config_maps, host_spec
+        jobs = []
+        for c in config_maps:
+            timer = PhaseTimer()
+            jobs.append(ConfigMapJob(c.id, host_spec(c.server), c.remote_path, c.file_pattern, c.gitlab_path, timer,
+                                     self.gitlab_cache.directory(c.gitlab_path, timer)))
+        
+        def save(job, fetched):
+            # 在入库线程中执行，按 id 用该线程自己的会话重新加载
+            return self._save_fetched(job.timer, fetched, db.session.get(ConfigMap, job.id))
+        
+        COMPARES_IN_PROGRESS.labels('config_map').inc(len(jobs))
+        try:
+            outcomes = fetch_config_maps(jobs, save, current_app.config, current_app.logger)
+        finally:
+            COMPARES_IN_PROGRESS.labels('config_map').dec(len(jobs))
+        # 结果由入库线程的会话写入，在当前会话中重新加载
+        db.session.expire_all()
+        return {cid: outcome if isinstance(outcome, Exception) else DiffResult.query.filter_by(config_map_id=cid).all()
+                for cid, outcome in outcomes.items()}
+
+    def _compare_directory_pairs_async(self, pairs):
+        from app.services.async_engine import PairJob, fetch_directory_pairs, host_spec
+        jobs = [PairJob(p.id, host_spec(p.left_server), p.left_path, host_spec(p.right_server), p.right_path, p.file_pattern, PhaseTimer())
+                for p in pairs]
+        
+        COMPARES_IN_PROGRESS.labels('dir_pair').inc(len(jobs))
+        try:
+            outcomes = fetch_directory_pairs(jobs, _PairSaver(self), current_app.config, current_app.logger)
+        finally:
+            COMPARES_IN_PROGRESS.labels('dir_pair').dec(len(jobs))
+        db.session.expire_all()
+        return outcomes
+
+    def _save_fetched(self, timer, fetched, config_map):
+        """异步引擎拉取完一个配置项后在入库线程中入库，fetched 为 (服务器内容, GitLab 内容) 或异常，内容为 {文件名: 文本或 None}"""
+        status_counts = Counter()
+        if isinstance(fetched, BaseException):
+            current_app.logger.info(f"Error comparing config map {config_map.id}: {fetched}")
+            self._record_run(timer, _failure_status(fetched), status_counts, config_map=config_map)
+            return fetched
+        
+        remote, gitlab = fetched
+        results = []
+        try:
+            DiffResult.query.filter_by(config_map_id=config_map.id).delete()
+            for name in sorted(set(remote) | set(gitlab)):
+                result = self._config_map_result(config_map, name, remote.get(name), gitlab.get(name), timer)
+                if result is None:
+                    continue
+                db.session.add(result)
+                status_counts[result.status] += 1
+                results.append(result)
+            with timer.span('db_commit'):
+                db.session.commit()
+        except Exception as e:
+            current_app.logger.info(f"Error comparing config map {config_map.id}: {e}")
+            db.session.rollback()
+            self._record_run(timer, 'ERROR', status_counts, config_map=config_map)
+            return e
+        
+        self._record_run(timer, 'OK', status_counts, config_map=config_map)
+        return results
+
+    def _compare_config_map(self, config_map):
         server = config_map.server
-        ssh = SSHService(server.ip, server.username, password=server.password, key_path=server.ssh_key_path, port=server.port, os_type=server.os_type)
+        timer = PhaseTimer()
+        ssh = SSHService.for_server(server, timer=timer)
+        self.gitlab_service.timer = timer
+        COMPARES_IN_PROGRESS.labels('config_map').inc()
         
         results = []
+        status_counts = Counter()
         try:
             # 1. 获取服务器文件列表
             # 确保 config_map.remote_path 是以 / 结尾的目录路径，或者处理好拼接
@@ -25,7 +280,9 @@ class DiffService:
             
             # 2. 获取 GitLab 文件列表
             # 假设 config_map.gitlab_path 是 GitLab 仓库中的目录路径
-            gitlab_files = self.gitlab_service.list_files(path=config_map.gitlab_path)
+            # 预热缓存与分支当前提交一致时直接使用，否则请求 GitLab
+            cached = self.gitlab_cache.directory(config_map.gitlab_path, timer)
+            gitlab_files = list(cached) if cached is not None else self.gitlab_service.list_files(path=config_map.gitlab_path)
             # GitLab 返回的是 repo 相对路径 (e.g., 'configs/nginx/site.conf')
             
             gitlab_filenames = []
@@ -45,79 +302,61 @@ class DiffService:
             # 清除旧的 DiffResult，只保留最新的
             DiffResult.query.filter_by(config_map_id=config_map.id).delete()
             
+            # 在同一连接的多个 SFTP 通道上并发读取服务器文件
+            # 使用 posixpath 拼接，确保是 / 分隔符
+            remote_paths = {name: posixpath.join(config_map.remote_path, name) for name in remote_filenames}
+            remote_contents = ssh.read_files(remote_paths.values())
+            
             for filename in all_files:
-                status = "MATCH"
-                diff_text = ""
-                
-                remote_content = None
                 gitlab_content = None
                 
-                # 获取远程内容
-                if filename in remote_filenames:
-                    # 使用 posixpath 拼接，确保是 / 分隔符
-                    remote_full_path = posixpath.join(config_map.remote_path, filename)
-                    remote_content = ssh.read_file(remote_full_path)
-                    # 处理可能的 None (读取失败)
-                    if remote_content is None:
-                        # 这种情况可能是权限问题或文件刚刚消失
-                        pass
+                # 获取远程内容，None 表示读取失败（可能是权限问题或文件刚刚消失）
+                remote_content = remote_contents.get(remote_paths[filename]) if filename in remote_paths else None
                 
                 # 获取 GitLab 内容
                 if filename in gitlab_filenames:
-                    gitlab_content = self.gitlab_service.get_file_content(gitlab_file_map[filename])
+                    gitlab_path = gitlab_file_map[filename]
+                    gitlab_content = cached[gitlab_path] if cached is not None else self.gitlab_service.get_file_content(gitlab_path)
                 
                 # 比较
-                if remote_content is None and gitlab_content is None:
+                result = self._config_map_result(config_map, filename, remote_content, gitlab_content, timer)
+                if result is None:
                     continue # 应该不会发生
-                elif remote_content is None:
-                    status = "MISSING_REMOTE"
-                elif gitlab_content is None:
-                    status = "MISSING_LOCAL"
-                else:
-                    # 使用 splitlines() 预处理，忽略换行符差异 (\r\n vs \n)
-                    remote_lines = remote_content.splitlines()
-                    gitlab_lines = gitlab_content.splitlines()
-                    
-                    if remote_lines != gitlab_lines:
-                        status = "DIFF"
-                        diff = difflib.unified_diff(
-                            gitlab_lines,
-                            remote_lines,
-                            fromfile=f'GitLab/{filename}',
-                            tofile=f'Server/{filename}',
-                            lineterm=''
-                        )
-                        diff_text = '\n'.join(list(diff))
-                    else:
-                        status = "MATCH"
-                
-                # 保存结果
-                result = DiffResult(
-                    config_map_id=config_map.id,
-                    file_name=filename,
-                    status=status,
-                    diff_content=diff_text
-                )
                 db.session.add(result)
                 results.append(result)
+                status_counts[result.status] += 1
                 
-            db.session.commit()
+            with timer.span('db_commit'):
+                db.session.commit()
             
         except Exception as e:
             if current_app:
                 current_app.logger.info(f"Error comparing config map {config_map.id}: {e}")
             db.session.rollback()
+            self._record_run(timer, _failure_status(e), status_counts, config_map=config_map)
             raise # 抛出异常以便上层知道失败了
         finally:
             ssh.close()
+            self.gitlab_service.timer = NULL_TIMER
+            COMPARES_IN_PROGRESS.labels('config_map').dec()
             
+        self._record_run(timer, 'OK', status_counts, config_map=config_map)
         return results
     
-    def compare_directory_pair(self, pair):
-        left_ssh = SSHService(pair.left_server.ip, pair.left_server.username, password=pair.left_server.password, key_path=pair.left_server.ssh_key_path, port=pair.left_server.port, os_type=pair.left_server.os_type)
-        right_ssh = SSHService(pair.right_server.ip, pair.right_server.username, password=pair.right_server.password, key_path=pair.right_server.ssh_key_path, port=pair.right_server.port, os_type=pair.right_server.os_type)
+    def compare_directory_pair(self, pair, profile=False):
+        """比对目录对，返回各状态的文件数；profile=True 时在 cProfile 下执行并保存统计文件"""
+        if profile:
+            return self._profiled('dir_pair', pair.id, self._compare_directory_pair, pair)
+        return self._compare_directory_pair(pair)
+
+    def _compare_directory_pair(self, pair):
+        timer = PhaseTimer()
+        left_ssh = SSHService.for_server(pair.left_server, timer=timer)
+        right_ssh = SSHService.for_server(pair.right_server, timer=timer)
         
-        results = []
+        COMPARES_IN_PROGRESS.labels('dir_pair').inc()
+        
+        status_counts = Counter()
         try:
             left_files = left_ssh.list_files(pair.left_path, pair.file_pattern)
             right_files = right_ssh.list_files(pair.right_path, pair.file_pattern)
@@ -125,62 +364,159 @@ class DiffService:
             left_names = {os.path.basename(p): p for p in left_files}
             right_names = {os.path.basename(p): p for p in right_files}
             
-            all_names = set(left_names.keys()) | set(right_names.keys())
+            all_names = sorted(set(left_names.keys()) | set(right_names.keys()))
             
             DirectoryDiffResult.query.filter_by(pair_id=pair.id).delete()
             
-            for name in all_names:
-                status = "MATCH"
-                diff_text = ""
-                left_content = None
-                right_content = None
-                
-                if name in left_names:
-                    left_content = left_ssh.read_file(left_names[name])
-                if name in right_names:
-                    right_content = right_ssh.read_file(right_names[name])
-                
-                if left_content is None and right_content is None:
-                    continue
-                elif left_content is None:
-                    status = "MISSING_LEFT"
-                elif right_content is None:
-                    status = "MISSING_RIGHT"
-                else:
-                    left_lines = left_content.splitlines()
-                    right_lines = right_content.splitlines()
-                    if left_lines != right_lines:
-                        status = "DIFF"
-                        diff = difflib.unified_diff(
-                            left_lines,
-                            right_lines,
-                            fromfile=f'Left/{name}',
-                            tofile=f'Right/{name}',
-                            lineterm=''
-                        )
-                        diff_text = '\n'.join(list(diff))
-                    else:
-                        status = "MATCH"
-                
-                result = DirectoryDiffResult(
-                    pair_id=pair.id,
-                    file_name=name,
-                    status=status,
-                    diff_content=diff_text,
-                    left_content=left_content,  # Save original content
-                    right_content=right_content # Save original content
-                )
-                db.session.add(result)
-                results.append(result)
+            # 流水线：两侧按文件名顺序边读边比较，每 COMPARE_CHUNK_SIZE 个结果 flush 后从会话中移除，
+            # 预读也不超过一块，内存占用与目录大小无关；整个目录对仍在同一个事务中提交，失败时回滚保留上一次的结果
+            chunk_size = current_app.config['COMPARE_CHUNK_SIZE']
+            # 两侧各自在同一连接的多个 SFTP 通道上并发预读
+            left_reader = left_ssh.iter_files((left_names[n] for n in all_names if n in left_names), window=chunk_size)
+            right_reader = right_ssh.iter_files((right_names[n] for n in all_names if n in right_names), window=chunk_size)
+            # 出错时先关闭读取器，等待预读结束后再断开连接
+            with closing(left_reader), closing(right_reader):
+                pending = []
+                for name in all_names:
+                    left_content = next(left_reader)[1] if name in left_names else None
+                    right_content = next(right_reader)[1] if name in right_names else None
+                    
+                    result = self._pair_result(pair, name, left_content, right_content, timer)
+                    if result is None:
+                        continue
+                    db.session.add(result)
+                    pending.append(result)
+                    status_counts[result.status] += 1
+                    if len(pending) >= chunk_size:
+                        _flush_chunk(pending, timer)
+                _flush_chunk(pending, timer)
             
-            db.session.commit()
+            with timer.span('db_commit'):
+                db.session.commit()
         except Exception as e:
             if current_app:
                 current_app.logger.info(f"Error comparing directory pair {pair.id}: {e}")
             db.session.rollback()
+            self._record_run(timer, _failure_status(e), status_counts, pair=pair)
             raise
         finally:
             left_ssh.close()
             right_ssh.close()
+            COMPARES_IN_PROGRESS.labels('dir_pair').dec()
         
-        return results
+        self._record_run(timer, 'OK', status_counts, pair=pair)
+        return status_counts
+
+
+class _PairSaver:
+    """异步引擎中目录对的分块入库，各方法都在该目录对占用的入库线程中调用
+
+    与同步引擎一致：开始时删除旧结果，每块结果 flush 后从会话中移除，整个目录对在同一个事务中提交，
+    失败时回滚保留上一次的结果。
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._counts = {}
+
+    def start(self, job):
+        self._counts[job.id] = Counter()
+        DirectoryDiffResult.query.filter_by(pair_id=job.id).delete()
+
+    def chunk(self, job, left, right):
+        pair = db.session.get(DirectoryPair, job.id)
+        status_counts = self._counts[job.id]
+        pending = []
+        for name in sorted(set(left) | set(right)):
+            result = self.service._pair_result(pair, name, left.get(name), right.get(name), job.timer)
+            if result is None:
+                continue
+            db.session.add(result)
+            pending.append(result)
+            status_counts[result.status] += 1
+        _flush_chunk(pending, job.timer)
+
+    def finish(self, job, error):
+        """提交或回滚，记录本次比对，返回各状态文件数 Counter 或异常"""
+        pair = db.session.get(DirectoryPair, job.id)
+        status_counts = self._counts.pop(job.id, Counter())
+        if error is None:
+            try:
+                with job.timer.span('db_commit'):
+                    db.session.commit()
+            except Exception as e:
+                error = e
+        if error is not None:
+            current_app.logger.info(f"Error comparing directory pair {job.id}: {error}")
+            db.session.rollback()
+            self.service._record_run(job.timer, _failure_status(error), status_counts, pair=pair)
+            return error
+        self.service._record_run(job.timer, 'OK', status_counts, pair=pair)
+        return status_counts
+
+
+def _diff_fields(diff_lines):
+    """由 unified diff 行生成结果的差异字段：增删行数、改动块数，以及不超过 DIFF_MAX_STORED_BYTES 的 diff 文本
+
+    超出上限时只保留开头的完整行作为预览，完整 diff 压缩存入快照，diff_hash 指向该快照。
+    """
+    # 前两行为 ---/+++ 文件头，其余以 +/- 开头的为增删行
+    added = sum(1 for line in diff_lines[2:] if line.startswith('+'))
+    removed = sum(1 for line in diff_lines[2:] if line.startswith('-'))
+    hunks = sum(1 for line in diff_lines[2:] if line.startswith('@@'))
+    fields = {'lines_added': added, 'lines_removed': removed, 'hunk_count': hunks,
+              'diff_truncated': False, 'diff_hash': None}
+    diff_text = '\n'.join(diff_lines)
+    limit = current_app.config['DIFF_MAX_STORED_BYTES']
+    if len(diff_text.encode('utf-8')) <= limit:
+        fields['diff_content'] = diff_text
+        return fields
+    
+    preview = []
+    size = 0
+    for line in diff_lines:
+        size += len(line.encode('utf-8')) + 1
+        if size > limit:
+            break
+        preview.append(line)
+    fields.update(diff_content='\n'.join(preview), diff_truncated=True, diff_hash=put_blob(diff_text))
+    return fields
+
+
+def _normalized_equal(target, name, left_content, right_content):
+    """目标（配置项或目录对）设置了归一化规则，且两侧归一化后的内容 hash 相同"""
+    normalizer = for_profile(target.normalization_profile)
+    return normalizer is not None and normalizer.digest(left_content, name) == normalizer.digest(right_content, name)
+
+
+def _sha256(content):
+    """内容的 sha256，不存在时为 None"""
+    return None if content is None else content_hash(content)
+
+
+def _capped(content):
+    """超过 CONTENT_MAX_BYTES 的文件原始内容不保存"""
+    if content is None or len(content.encode('utf-8')) > current_app.config['CONTENT_MAX_BYTES']:
+        return None
+    return content
+
+
+def _flush_chunk(rows, timer):
+    """将一块结果写入数据库（不提交）并从会话中移除，释放其中的文件内容"""
+    if not rows:
+        return
+    with timer.span('db_commit'):
+        db.session.flush()
+    for row in rows:
+        db.session.expunge(row)
+    rows.clear()
+
+
+def _batch_name(targets):
+    """性能分析文件名中的目标标识：单个时为 id，批量时为 batch-数量"""
+    return targets[0].id if len(targets) == 1 else f'batch-{len(targets)}'
+
+
+def _failure_status(error):
+    """比对失败时记录到 CompareRun 的状态：主机不可达（含熔断中）为 UNREACHABLE，其余为 ERROR"""
+    return 'UNREACHABLE' if isinstance(error, HostUnreachableError) else 'ERROR'
@@ -0,0 +1,62 @@
+from sqlalchemy import func
+from app import db
+from app.models import DiffResult, DirectoryDiffResult
+
+# 基于结果表上的统计列汇总漂移情况：每个配置项/目录对一条 GROUP BY 查询，不加载 diff_content。
+# 每次比对都会替换该目标此前的结果，因此表中的行即为最近一次比对的结果。
+
+# 除一致外的状态（差异、任一侧缺失）均计为漂移
+MATCH_STATUS = 'MATCH'
+
+
+def _empty():
+    return {'total': 0, 'drift': 0, 'statuses': {}, 'lines_added': 0, 'lines_removed': 0, 'hunks': 0}
+
+
+def _summarize(model, key, ids):
+    if not ids:
+        return {}
+    rows = db.session.query(
+        key,
+        model.status,
+        func.count(model.id),
+        func.coalesce(func.sum(model.lines_added), 0),
+        func.coalesce(func.sum(model.lines_removed), 0),
+        func.coalesce(func.sum(model.hunk_count), 0),
+    ).filter(key.in_(list(ids))).group_by(key, model.status).all()
+
+    summaries = {}
+    for target_id, status, count, added, removed, hunks in rows:
+        s = summaries.setdefault(target_id, _empty())
+        s['statuses'][status] = count
+        s['total'] += count
+        if status != MATCH_STATUS:
+            s['drift'] += count
+        s['lines_added'] += int(added)
+        s['lines_removed'] += int(removed)
+        s['hunks'] += int(hunks)
+    return summaries
+
+
+def config_map_summaries(config_map_ids):
+    """{config_map_id: 汇总}，汇总包含文件总数、非一致文件数、各状态数量以及增删行数和改动块数"""
+    return _summarize(DiffResult, DiffResult.config_map_id, config_map_ids)
+
+
+def pair_summaries(pair_ids):
+    """{pair_id: 汇总}，字段同 config_map_summaries"""
+    return _summarize(DirectoryDiffResult, DirectoryDiffResult.pair_id, pair_ids)
+
+
+def totals(summaries):
+    """将多个目标的汇总合并为一条，另计 targets（目标数）与 drifted（存在漂移的目标数）"""
+    total = _empty()
+    total.update(targets=len(summaries), drifted=0)
+    for s in summaries.values():
+        for status, count in s['statuses'].items():
+            total['statuses'][status] = total['statuses'].get(status, 0) + count
+        for field in ('total', 'drift', 'lines_added', 'lines_removed', 'hunks'):
+            total[field] += s[field]
+        if s['drift']:
+            total['drifted'] += 1
+    return total
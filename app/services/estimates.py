@@ -0,0 +1,28 @@
+# 按历史耗时估算比对时长：每次成功比对后更新配置项/目录对的 expected_ms（耗时的指数加权平均），
+# 批量比对与工作队列按估计耗时从长到短执行（最长优先），缩短整批任务的总耗时，并据此估算完成时间。
+
+# 新耗时的权重，越大越快跟随最近的变化
+SMOOTHING = 0.3
+# 没有任何历史耗时时使用的估计值（毫秒）
+DEFAULT_EXPECTED_MS = 10000
+
+
+def update_estimate(target, duration_ms):
+    """用本次成功比对的耗时更新 target（ConfigMap 或 DirectoryPair）的 expected_ms，由调用方提交"""
+    if target.expected_ms is None:
+        target.expected_ms = duration_ms
+    else:
+        target.expected_ms = int(SMOOTHING * duration_ms + (1 - SMOOTHING) * target.expected_ms)
+
+
+def expected_durations(targets):
+    """{target.id: 估计耗时毫秒}；没有历史的按已知估计中的最大值计（未知的大任务也能尽早开始）"""
+    known = [t.expected_ms for t in targets if t.expected_ms is not None]
+    fallback = max(known) if known else DEFAULT_EXPECTED_MS
+    return {t.id: t.expected_ms if t.expected_ms is not None else fallback for t in targets}
+
+
+def longest_first(targets):
+    """按估计耗时从长到短排序"""
+    durations = expected_durations(targets)
+    return sorted(targets, key=lambda t: durations[t.id], reverse=True)
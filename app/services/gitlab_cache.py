@@ -0,0 +1,111 @@
+import posixpath
+from flask import current_app
+from app import db
+from app.models import GitlabFileCache, current_time_plus_8
+from app.services.blob_store import put_blob, get_blob
+from app.services.metrics import GITLAB_CACHE
+from app.services.timing import NULL_TIMER
+
+# GitLab 文件缓存预热：定时任务触发前 GITLAB_PREWARM_LEAD 秒，解析分支当前提交，按任务涉及的 gitlab_path
+# 列出目录并只下载 blob id 有变化的文件，存入 GitlabFileCache。比对时分支提交未变的目录直接读取缓存，
+# 不再与 SSH 拉取同时请求 GitLab；提交已变化或没有缓存的目录照常请求 GitLab。
+
+REF = 'main'
+
+
+def directory_key(path):
+    """缓存中的目录写法：去掉首尾的 /"""
+    return (path or '').strip('/')
+
+
+def prewarm_paths(gitlab_service, paths, ref=REF):
+    """预热一组目录，返回 (下载的文件数, 未变化而复用的文件数)；失败的目录跳过，比对时回退为直接请求"""
+    head = gitlab_service.get_branch_head(ref)
+    if head is None:
+        return 0, 0
+    fetched = reused = 0
+    for directory in sorted({directory_key(p) for p in paths}):
+        try:
+            count = _prewarm_directory(gitlab_service, directory, head, ref)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to prewarm GitLab cache for {directory or '/'}: {e}")
+            continue
+        fetched += count[0]
+        reused += count[1]
+    return fetched, reused
+
+
+def _prewarm_directory(gitlab_service, directory, head, ref):
+    # 列目录与下载都固定在 head 提交上，缓存内容与 commit_sha 一致
+    blobs = gitlab_service.list_blobs(path=directory or '.', ref=head)
+    rows = {r.path: r for r in GitlabFileCache.query.filter_by(ref=ref, directory=directory)}
+    now = current_time_plus_8()
+    fetched = 0
+    for path, blob_id in blobs.items():
+        row = rows.pop(path, None)
+        if row is None or row.blob_id != blob_id:
+            content = gitlab_service.get_file_content(path, ref=head)
+            if content is None:
+                raise RuntimeError(f"failed to fetch {path}")
+            # 先保存快照，put_blob 的查询会自动 flush 新行
+            content_hash = put_blob(content)
+            if row is None:
+                row = GitlabFileCache(ref=ref, directory=directory, path=path)
+                db.session.add(row)
+            row.blob_id = blob_id
+            row.content_hash = content_hash
+            row.fetched_at = now
+            fetched += 1
+        row.commit_sha = head
+    # 已从仓库中删除的文件
+    for row in rows.values():
+        db.session.delete(row)
+    return fetched, len(blobs) - fetched
+
+
+def apply_push(paths, before, after, ref=REF):
+    """按一次推送更新缓存，返回删除的缓存行数
+
+    删除变化文件的缓存，其所在目录保持推送前的提交（比对时回退为直接请求，下次预热时补齐）；
+    其余仍为推送前提交的目录没有变化，直接确认为推送后的提交。
+    """
+    directories = {posixpath.dirname(p) for p in paths}
+    removed = GitlabFileCache.query.filter(GitlabFileCache.ref == ref, GitlabFileCache.path.in_(paths)) \
+        .delete(synchronize_session=False)
+    GitlabFileCache.query.filter(
+        GitlabFileCache.ref == ref,
+        GitlabFileCache.commit_sha == before,
+        GitlabFileCache.directory.notin_(directories),
+    ).update({'commit_sha': after}, synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+class CacheReader:
+    """比对时读取预热缓存，分支当前提交在第一次需要时解析，同一批比对只请求一次"""
+
+    def __init__(self, gitlab_service, ref=REF):
+        self.gitlab_service = gitlab_service
+        self.ref = ref
+        self._head = None
+        self._resolved = False
+
+    def head(self):
+        if not self._resolved:
+            self._head = self.gitlab_service.get_branch_head(self.ref)
+            self._resolved = True
+        return self._head
+
+    def directory(self, path, timer=NULL_TIMER):
+        """目录下 {仓库路径: 内容}；没有缓存、缓存不是分支当前提交或快照缺失时返回 None"""
+        with timer.span('gitlab_cache'):
+            rows = GitlabFileCache.query.filter_by(ref=self.ref, directory=directory_key(path)).all()
+            if rows and all(r.commit_sha == self.head() for r in rows):
+                contents = {r.path: get_blob(r.content_hash) for r in rows}
+                if None not in contents.values():
+                    GITLAB_CACHE.labels('hit').inc()
+                    return contents
+        GITLAB_CACHE.labels('miss').inc()
+        return None
@@ -1,6 +1,77 @@
 import gitlab
+import requests
+import threading
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import current_app
+from app.utils import decode_content
+from app.services.timing import NULL_TIMER
+from app.services.metrics import GITLAB_IN_FLIGHT
 import base64
+import posixpath
+
+# 进程级共享的 GitLab 客户端：同一个 (url, token, project_id) 只保留一个会话与 project 对象
+# 所有 GitLabService 实例共用同一个 keep-alive 连接池
+_client_lock = threading.Lock()
+_clients = {}  # (url, token, project_id) -> (gl, project)
+_semaphore = None
+
+
+def _build_session(pool_size, max_retries, backoff_factor):
+    """创建带连接池与重试策略的 requests 会话"""
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        # 429 与网关类错误做指数退避重试，Retry-After 头优先
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after_header=True,
+        # 只对只读请求重试：POST/PUT/DELETE 会修改仓库内容，重放可能重复写入
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        # 重试用尽后返回最后一次响应，由 python-gitlab 抛出 GitlabHttpError
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class _Gitlab(gitlab.Gitlab):
+    """重试只由会话的 urllib3 Retry 负责：关闭 python-gitlab 自带的 429 重试（obey_rate_limit），
+    retry_transient_errors 保持默认关闭，避免两层重试叠加放大请求量"""
+
+    def http_request(self, *args, **kwargs):
+        kwargs['obey_rate_limit'] = False
+        kwargs['retry_transient_errors'] = False
+        return super().http_request(*args, **kwargs)
+
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        with _client_lock:
+            if _semaphore is None:
+                _semaphore = threading.BoundedSemaphore(current_app.config['GITLAB_MAX_CONCURRENCY'])
+    return _semaphore
+
+
+def reset_clients():
+    """关闭并丢弃所有共享客户端（配置变更或测试时使用）"""
+    global _semaphore
+    with _client_lock:
+        for gl, _ in _clients.values():
+            try:
+                gl.session.close()
+            except Exception:
+                pass
+        _clients.clear()
+        _semaphore = None
+
 
 class GitLabService:
     def __init__(self):
@@ -9,33 +80,67 @@ class GitLabService:
         self.project_id = current_app.config['GITLAB_PROJECT_ID']
         self.gl = None
         self.project = None
+        # 由 DiffService 在每次比对时设置，用于记录各阶段耗时
+        self.timer = NULL_TIMER
 
     def connect(self):
         if self.project:
             return
 
+        key = (self.url, self.token, str(self.project_id))
+        with _client_lock:
+            client = _clients.get(key)
+        if client is None:
+            # projects.get 是网络请求（含重试），在锁外执行，GitLab 响应慢时不阻塞其他线程取用已建立的客户端
+            try:
+                config = current_app.config
+                session = _build_session(
+                    config['GITLAB_POOL_SIZE'],
+                    config['GITLAB_MAX_RETRIES'],
+                    config['GITLAB_BACKOFF_FACTOR'],
+                )
+                gl = _Gitlab(
+                    self.url,
+                    private_token=self.token,
+                    timeout=config['GITLAB_TIMEOUT'],
+                    session=session,
+                )
+                project = gl.projects.get(self.project_id)
+            except Exception as e:
+                current_app.logger.error(f"GitLab connection failed: {e}")
+                raise
+            # 多个线程同时首次连接时只保留先登记的客户端
+            with _client_lock:
+                client = _clients.setdefault(key, (gl, project))
+            if client[0] is not gl:
+                session.close()
+        self.gl, self.project = client
+
+    @contextmanager
+    def _limited(self):
+        """限制对 GitLab 的并发请求数，避免并行比对压垮 GitLab"""
+        semaphore = _get_semaphore()
+        semaphore.acquire()
+        GITLAB_IN_FLIGHT.inc()
         try:
-            self.gl = gitlab.Gitlab(self.url, private_token=self.token)
-            # self.gl.auth() # auth() call is optional if private_token is provided, but good for check
-            self.project = self.gl.projects.get(self.project_id)
-        except Exception as e:
-            current_app.logger.error(f"GitLab connection failed: {e}")
-            raise
+            yield
+        finally:
+            GITLAB_IN_FLIGHT.dec()
+            semaphore.release()
 
     def get_file_content(self, file_path, ref='main'):
         """获取文件内容，返回字符串"""
         self.connect()
         
         try:
-            f = self.project.files.get(file_path=file_path, ref=ref)
-            data = f.decode()
+            with self.timer.span('gitlab_fetch') as span:
+                with self._limited():
+                    f = self.project.files.get(file_path=file_path, ref=ref)
+                data = f.decode()
+                span.bytes = len(data)
             if isinstance(data, bytes):
-                for enc in ('utf-8', 'gb18030', 'gbk', 'utf-16-le', 'latin-1'):
-                    try:
-                        return data.decode(enc)
-                    except UnicodeDecodeError:
-                        continue
-                return data.decode('utf-8', errors='replace')
+                with self.timer.span('decode'):
+                    return decode_content(data)
             return data
         except gitlab.exceptions.GitlabGetError:
             # print(f"File not found in GitLab: {file_path}")
@@ -51,32 +156,99 @@ class GitLabService:
         try:
             # 尝试获取文件，如果存在则更新，不存在则创建
             try:
-                f = self.project.files.get(file_path=file_path, ref=ref)
+                with self._limited():
+                    f = self.project.files.get(file_path=file_path, ref=ref)
                 f.content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
-                f.save(branch=ref, commit_message=commit_message, encoding='base64')
+                with self._limited():
+                    f.save(branch=ref, commit_message=commit_message, encoding='base64')
                 return True, "Updated successfully"
             except gitlab.exceptions.GitlabGetError:
                 # 文件不存在，创建
-                self.project.files.create({
+                with self._limited():
+                    self.project.files.create({
+                        'file_path': file_path,
+                        'branch': ref,
+                        'content': content,
+                        'commit_message': commit_message
+                    })
+                return True, "Created successfully"
+                
+        except Exception as e:
+            return False, str(e)
+
+    def commit_files(self, files, commit_message, ref='main'):
+        """在一次提交中更新或创建多个文件，files 为 {repo_path: content}"""
+        if not files:
+            return True, "Nothing to commit"
+
+        # 同一仓库路径的不同写法（如首尾的 /）会在一次提交中互相覆盖，直接拒绝
+        targets = {}
+        for file_path in files:
+            normalized = posixpath.normpath(file_path.strip('/'))
+            if normalized in targets:
+                return False, f"Duplicate target path in one commit: {targets[normalized]} and {file_path}"
+            targets[normalized] = file_path
+
+        self.connect()
+
+        try:
+            # 按目录列一次树，判断每个文件是 create 还是 update；GitLab 对不存在的目录返回 404，
+            # 视为空目录（其中的文件都是 create）。其他错误放弃提交，否则已存在的文件会被当作 create 而导致整个提交失败
+            existing = set()
+            for directory in {posixpath.dirname(p) for p in targets}:
+                try:
+                    existing.update(self.list_blobs(path=directory or '.', ref=ref))
+                except (gitlab.exceptions.GitlabGetError, gitlab.exceptions.GitlabListError) as e:
+                    if e.response_code != 404:
+                        return False, f"Failed to list {directory or '/'} in GitLab, sync aborted: {e}"
+                except Exception as e:
+                    return False, f"Failed to list {directory or '/'} in GitLab, sync aborted: {e}"
+
+            actions = []
+            for file_path, original in targets.items():
+                content = files[original]
+                actions.append({
+                    'action': 'update' if file_path in existing else 'create',
                     'file_path': file_path,
+                    'content': base64.b64encode(content.encode('utf-8')).decode('utf-8'),
+                    'encoding': 'base64',
+                })
+
+            with self._limited():
+                commit = self.project.commits.create({
                     'branch': ref,
-                    'content': content,
-                    'commit_message': commit_message
+                    'commit_message': commit_message,
+                    'actions': actions,
                 })
-                return True, "Created successfully"
-                
+            return True, commit.id
         except Exception as e:
             return False, str(e)
 
     def list_files(self, path='.', ref='main', recursive=False):
         """列出指定目录下的文件"""
-        self.connect()
-        
         try:
-            items = self.project.repository_tree(path=path, ref=ref, recursive=recursive, all=True)
-            # 过滤只返回文件
-            files = [item['path'] for item in items if item['type'] == 'blob']
-            return files
+            return list(self.list_blobs(path=path, ref=ref, recursive=recursive))
         except Exception as e:
             current_app.logger.error(f"Error listing files from GitLab: {e}")
             return []
+
+    def list_blobs(self, path='.', ref='main', recursive=False):
+        """列出指定目录下的文件及其 blob id，返回 {仓库路径: blob_id}；请求失败时抛出异常"""
+        self.connect()
+
+        with self.timer.span('gitlab_list'), self._limited():
+            items = self.project.repository_tree(path=path, ref=ref, recursive=recursive, all=True)
+        # 过滤只返回文件
+        return {item['path']: item['id'] for item in items if item['type'] == 'blob'}
+
+    def get_branch_head(self, ref='main'):
+        """分支当前指向的提交 sha，获取失败时返回 None"""
+        self.connect()
+
+        try:
+            with self._limited():
+                branch = self.project.branches.get(ref)
+            return branch.commit['id']
+        except Exception as e:
+            current_app.logger.error(f"Error getting branch {ref} from GitLab: {e}")
+            return None
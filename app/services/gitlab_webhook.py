@@ -0,0 +1,61 @@
+import posixpath
+from flask import current_app
+from app.models import ConfigMap
+from app.services.gitlab_cache import REF, apply_push, directory_key
+from app.services.work_queue import enqueue_config_maps
+
+# GitLab 推送事件（Push Hook）：按推送中变化的文件找出受影响的配置项（文件所在目录即其 gitlab_path），
+# 只失效这些文件的缓存，并把受影响的配置项加入工作队列重新比对；其他配置项等下一次定时任务。
+
+ZERO_SHA = '0' * 40
+
+
+def changed_paths(payload):
+    """推送中新增、修改与删除的文件路径；事件中附带的提交不全时（GitLab 最多附带 20 个）返回 None"""
+    commits = payload.get('commits') or []
+    if (payload.get('total_commits_count') or 0) > len(commits):
+        return None
+    paths = set()
+    for commit in commits:
+        for key in ('added', 'modified', 'removed'):
+            paths.update(commit.get(key) or [])
+    return paths
+
+
+def config_map_index():
+    """反向索引 {GitLab 目录: [配置项]}"""
+    index = {}
+    for config_map in ConfigMap.query.all():
+        index.setdefault(directory_key(config_map.gitlab_path), []).append(config_map)
+    return index
+
+
+def handle_push(payload):
+    """处理一次推送事件，返回响应内容：status 为 ignored / unchanged / queued"""
+    if payload.get('ref') != f'refs/heads/{REF}':
+        return {'status': 'ignored', 'reason': f"ref {payload.get('ref')} is not {REF}"}
+    before, after = payload.get('before'), payload.get('after')
+    if not after or after == ZERO_SHA:
+        return {'status': 'ignored', 'reason': 'branch deleted'}
+
+    index = config_map_index()
+    paths = changed_paths(payload)
+    if paths is None or not before or before == ZERO_SHA:
+        # 无法得知全部变化的文件：缓存随分支提交变化整体失效，所有配置项都重新比对
+        current_app.logger.warning(f"Push {after[:8]} does not list all changed files; re-comparing all config maps")
+        invalidated = 0
+        affected = [c for config_maps in index.values() for c in config_maps]
+    else:
+        invalidated = apply_push(paths, before, after)
+        affected = {c.id: c for p in paths for c in index.get(posixpath.dirname(p), [])}
+        affected = sorted(affected.values(), key=lambda c: c.id)
+
+    if not affected:
+        current_app.logger.info(f"Push {after[:8]} does not affect any config map")
+        return {'status': 'unchanged', 'config_maps': [], 'invalidated': invalidated}
+    run = enqueue_config_maps(affected, 'webhook', commit_sha=after)
+    current_app.logger.info(f"Push {after[:8]}: invalidated {invalidated} cached files, "
+                            + (f"queued {run.label} for config maps {[c.id for c in affected]}" if run
+                               else f"config maps {[c.id for c in affected]} are already queued"))
+    return {'status': 'queued', 'config_maps': [c.id for c in affected], 'invalidated': invalidated,
+            'run_id': run.id if run else None}
@@ -0,0 +1,141 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import case, or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import SchedulerLock, current_time_plus_8
+from app.services.metrics import SCHEDULER_LEADER
+
+# 调度器主节点选举：每个进程都启动 APScheduler，但只登记一个续租任务；
+# 续租成功（或接管已过期的租约）的进程成为主节点，登记并执行定时任务，其余进程待命。
+# 主节点宕机后租约在 SCHEDULER_LEASE_TTL 秒内过期，下一个续租的进程接管。各节点需时钟同步。
+
+HEARTBEAT_JOB_ID = 'scheduler-leader-heartbeat'
+
+
+class LeaderLease:
+    def __init__(self, name='scheduler'):
+        self.name = name
+        self._pid = None
+        self._holder = None
+        self._lock = threading.Lock()
+        self.expires_at = None  # 本进程持有的租约到期时间，未持有时为 None
+
+    def _check_fork(self):
+        # fork 出的子进程（如 gunicorn --preload）重新生成身份，避免多个进程共用同一租约；
+        # 续租与领取工作项的线程会同时首次读取身份，加锁保证只生成一次
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._holder = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+                self.expires_at = None
+                self._pid = os.getpid()
+
+    @property
+    def holder(self):
+        self._check_fork()
+        return self._holder
+
+    @property
+    def is_leader(self):
+        """本进程是否持有未过期的租约（续租失败时到期后自动失去主节点身份）"""
+        self._check_fork()
+        return self.expires_at is not None and self.expires_at > current_time_plus_8()
+
+    def renew(self, ttl):
+        """获取或续租，返回是否持有租约；由调用方提供应用上下文"""
+        now = current_time_plus_8()
+        expires_at = now + timedelta(seconds=ttl)
+        try:
+            # 自己持有或已过期时才能写入，条件更新保证同一时刻只有一个进程成功
+            updated = SchedulerLock.query.filter(
+                SchedulerLock.name == self.name,
+                or_(SchedulerLock.holder == self.holder, SchedulerLock.expires_at < now),
+            ).update({
+                'acquired_at': case((SchedulerLock.holder == self.holder, SchedulerLock.acquired_at), else_=now),
+                'holder': self.holder,
+                'expires_at': expires_at,
+            }, synchronize_session=False)
+            if not updated and db.session.get(SchedulerLock, self.name) is None:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(SchedulerLock(name=self.name, holder=self.holder, expires_at=expires_at, acquired_at=now))
+                    updated = 1
+                except IntegrityError:
+                    pass  # 其他进程同时创建了锁
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.expires_at = expires_at if updated else None
+        SCHEDULER_LEADER.set(1 if updated else 0)
+        return bool(updated)
+
+    def step_down(self):
+        """放弃本地记录的主节点身份（租约已过期且无法续租）"""
+        self.expires_at = None
+        SCHEDULER_LEADER.set(0)
+
+    def release(self):
+        """主动释放租约（进程退出时），让其他进程立即接管"""
+        if self.expires_at is None:
+            return
+        SchedulerLock.query.filter_by(name=self.name, holder=self.holder).update(
+            {'expires_at': current_time_plus_8()}, synchronize_session=False)
+        db.session.commit()
+        self.step_down()
+
+
+lease = LeaderLease()
+
+
+def heartbeat(app, on_elected, on_demoted):
+    """续租一次：持有租约时调用 on_elected（同步定时任务），否则调用 on_demoted（移除定时任务）"""
+    was_leader = lease.expires_at is not None  # 上次续租成功（租约可能已在本地过期）
+    with app.app_context():
+        try:
+            leader = lease.renew(app.config['SCHEDULER_LEASE_TTL'])
+        except Exception as e:
+            app.logger.error(f"Failed to renew scheduler lease: {e}")
+            if lease.is_leader:
+                return  # 数据库暂时不可用：保持当前身份与已登记的任务，直到本地记录的租约到期
+            lease.step_down()
+            leader = False
+        if leader:
+            if not was_leader:
+                app.logger.info(f"Scheduler lease acquired by {lease.holder}")
+            on_elected()
+        else:
+            if was_leader:
+                app.logger.warning(f"Scheduler lease lost by {lease.holder}")
+            on_demoted()
+
+
+def start_leader_election(app, scheduler, on_elected, on_demoted):
+    """登记续租任务（立即执行一次），并在进程退出时释放租约"""
+    import atexit
+    interval = app.config['SCHEDULER_LEASE_RENEW']
+    scheduler.add_job(
+        id=HEARTBEAT_JOB_ID,
+        func=heartbeat,
+        args=[app, on_elected, on_demoted],
+        trigger='interval',
+        seconds=interval,
+        next_run_time=datetime.now(),
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    def release():
+        try:
+            with app.app_context():
+                lease.release()
+        except Exception:
+            pass  # 退出时数据库可能已不可用，租约到期后自然失效
+
+    atexit.register(release)
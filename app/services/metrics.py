@@ -0,0 +1,78 @@
+from datetime import datetime
+from prometheus_client import Counter, Gauge, Histogram
+
+# 比对吞吐与积压相关的 Prometheus 指标，由 /metrics 暴露
+# 注意：默认注册表按进程隔离，多进程部署时每个进程各自暴露自己的指标
+
+COMPARE_RUNS = Counter('compare_runs_total', '已执行的比对次数', ['kind', 'status'])
+COMPARE_FILES = Counter('compare_files_total', '已比对的文件数（按结果状态）', ['kind', 'status'])
+COMPARE_RUN_SECONDS = Histogram('compare_run_seconds', '单次比对（配置项或目录对）耗时', ['kind'],
+                                buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+COMPARES_IN_PROGRESS = Gauge('compares_in_progress', '正在执行的比对数', ['kind'])
+
+FETCHED_BYTES = Counter('compare_fetched_bytes_total', '比对过程中拉取的字节数', ['source'])
+PHASE_SECONDS = Histogram('compare_phase_seconds', '比对各阶段单次耗时', ['phase'],
+                          buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+GITLAB_IN_FLIGHT = Gauge('gitlab_requests_in_flight', '正在进行的 GitLab 请求数（并发信号量占用）')
+SSH_CONNECTIONS_OPEN = Gauge('ssh_connections_open', '当前打开的 SSH 连接数')
+SSH_CIRCUITS_OPEN = Gauge('ssh_circuits_open', '处于熔断冷却期（判定为不可达）的主机数')
+
+SCHEDULER_LAG_SECONDS = Histogram('scheduler_lag_seconds', '定时任务实际提交时间相对计划时间的延迟',
+                                  buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600))
+SCHEDULER_MISSED = Counter('scheduler_jobs_missed_total', '错过执行时间而被丢弃的定时任务次数')
+SCHEDULER_JOBS = Gauge('scheduler_jobs', '调度器中登记的定时任务数')
+SCHEDULER_LEADER = Gauge('scheduler_leader', '本进程是否持有调度器主节点租约（1 为执行定时任务的进程）')
+WORK_ITEMS = Counter('work_items_total', '本进程执行完的定时任务工作项（done 成功，retry 待重试，failed 重试耗尽）', ['status'])
+GITLAB_CACHE = Counter('gitlab_cache_lookups_total', '比对时按目录查找 GitLab 预热缓存的次数（hit 命中，miss 回退为直接请求）', ['result'])
+
+# 热路径上缓存已绑定标签的子指标，避免每次记录时查找
+_PHASE_OBSERVERS = {}
+_BYTES_SOURCE = {'ssh_read': 'ssh', 'ssh_list': 'ssh', 'gitlab_fetch': 'gitlab', 'gitlab_list': 'gitlab'}
+_BYTES_COUNTERS = {source: FETCHED_BYTES.labels(source).inc for source in ('ssh', 'gitlab')}
+
+
+def observe_phase(phase, seconds, nbytes=0):
+    """记录一次阶段耗时，由 PhaseTimer 在每个 span 结束时调用"""
+    observer = _PHASE_OBSERVERS.get(phase)
+    if observer is None:
+        observer = _PHASE_OBSERVERS[phase] = PHASE_SECONDS.labels(phase).observe
+    observer(seconds)
+    if nbytes:
+        source = _BYTES_SOURCE.get(phase)
+        if source:
+            _BYTES_COUNTERS[source](nbytes)
+
+
+def record_compare(kind, status, seconds, status_counts):
+    """记录一次比对运行的结果，status_counts 为 {文件状态: 数量}"""
+    COMPARE_RUNS.labels(kind, status).inc()
+    COMPARE_RUN_SECONDS.labels(kind).observe(seconds)
+    for file_status, count in status_counts.items():
+        COMPARE_FILES.labels(kind, file_status).inc(count)
+
+
+def _open_circuits():
+    from app.services.circuit_breaker import breaker
+    return len(breaker.open_hosts())
+
+
+SSH_CIRCUITS_OPEN.set_function(_open_circuits)
+
+
+def register_scheduler_metrics(scheduler):
+    """监听 APScheduler 事件，统计调度延迟与错过的任务"""
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED
+
+    def on_event(event):
+        if event.code == EVENT_JOB_MISSED:
+            SCHEDULER_MISSED.inc()
+            return
+        if event.scheduled_run_times:
+            scheduled = event.scheduled_run_times[0]
+            lag = (datetime.now(scheduled.tzinfo) - scheduled).total_seconds()
+            SCHEDULER_LAG_SECONDS.observe(max(lag, 0))
+
+    scheduler.add_listener(on_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+    # 定时任务以任务 id 登记，不计入主节点续租等内部任务
+    SCHEDULER_JOBS.set_function(lambda: sum(1 for job in scheduler.get_jobs() if job.id.isdigit()))
@@ -0,0 +1,101 @@
+import hashlib
+import posixpath
+import re
+
+# 比对前按 NormalizationProfile 归一化文件内容：移除正则匹配的易变部分、折叠空白、忽略空行与整行注释。
+# 两侧归一化后的内容 hash 相同即判定为一致，不再运行 difflib；有差异时展示的仍是原始内容的 diff。
+
+# 按文件扩展名的整行注释符，未列出的扩展名使用 DEFAULT_COMMENT_PREFIXES
+COMMENT_PREFIXES = {
+    '.conf': ('#',),
+    '.cnf': ('#', ';'),
+    '.cfg': ('#', ';'),
+    '.ini': (';', '#'),
+    '.properties': ('#', '!'),
+    '.yaml': ('#',),
+    '.yml': ('#',),
+    '.toml': ('#',),
+    '.env': ('#',),
+    '.sh': ('#',),
+    '.py': ('#',),
+    '.sql': ('--',),
+    '.lua': ('--',),
+    '.xml': (),
+    '.json': (),
+}
+DEFAULT_COMMENT_PREFIXES = ('#',)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def compile_patterns(text):
+    """将每行一个的正则编译为列表，忽略空行；正则有误时抛出 re.error"""
+    return [re.compile(line) for line in (text or '').splitlines() if line.strip()]
+
+
+class Normalizer:
+    def __init__(self, patterns=(), trim_trailing_whitespace=True, collapse_whitespace=False,
+                 ignore_blank_lines=True, strip_comments=False, comment_prefixes=None):
+        self.patterns = list(patterns)
+        self.trim_trailing_whitespace = trim_trailing_whitespace
+        self.collapse_whitespace = collapse_whitespace
+        self.ignore_blank_lines = ignore_blank_lines
+        self.strip_comments = strip_comments
+        self.comment_prefixes = tuple(comment_prefixes) if comment_prefixes else None
+
+    @classmethod
+    def from_profile(cls, profile):
+        return cls(
+            patterns=compile_patterns(profile.ignore_patterns),
+            trim_trailing_whitespace=profile.trim_trailing_whitespace,
+            collapse_whitespace=profile.collapse_whitespace,
+            ignore_blank_lines=profile.ignore_blank_lines,
+            strip_comments=profile.strip_comments,
+            comment_prefixes=(profile.comment_prefixes or '').split(),
+        )
+
+    def _prefixes(self, filename):
+        if self.comment_prefixes is not None:
+            return self.comment_prefixes
+        ext = posixpath.splitext(filename)[1].lower()
+        return COMMENT_PREFIXES.get(ext, DEFAULT_COMMENT_PREFIXES)
+
+    def lines(self, content, filename):
+        """归一化后的行列表"""
+        prefixes = self._prefixes(filename) if self.strip_comments else ()
+        result = []
+        for line in content.splitlines():
+            if prefixes and line.lstrip().startswith(prefixes):
+                continue
+            for pattern in self.patterns:
+                line = pattern.sub('', line)
+            if self.collapse_whitespace:
+                line = _WHITESPACE.sub(' ', line).strip()
+            elif self.trim_trailing_whitespace:
+                line = line.rstrip()
+            if self.ignore_blank_lines and not line.strip():
+                continue
+            result.append(line)
+        return result
+
+    def digest(self, content, filename):
+        """归一化后内容的 sha256"""
+        return hashlib.sha256('\n'.join(self.lines(content, filename)).encode('utf-8')).hexdigest()
+
+
+# (profile.id, profile.updated_at) -> Normalizer，规则修改后 updated_at 变化即重新编译
+_compiled = {}
+
+
+def for_profile(profile):
+    """取规则对应的已编译 Normalizer，未设置规则时返回 None"""
+    if profile is None:
+        return None
+    key = (profile.id, profile.updated_at)
+    normalizer = _compiled.get(key)
+    if normalizer is None:
+        normalizer = Normalizer.from_profile(profile)
+        for stale in [k for k in _compiled if k[0] == profile.id]:
+            _compiled.pop(stale, None)
+        _compiled[key] = normalizer
+    return normalizer
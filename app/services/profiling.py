@@ -0,0 +1,66 @@
+import cProfile
+import io
+import os
+import pstats
+import secrets
+import time
+from flask import current_app
+from app import db
+from app.models import CompareRun
+
+# 单次比对的 cProfile 性能分析，仅在显式开启时使用，关闭时比对路径上没有任何额外开销
+
+
+def profile_path(filename):
+    return os.path.join(current_app.config['PROFILE_DIR'], filename)
+
+
+def new_profile_filename(kind, target_id):
+    """生成统计文件名，如 config_map_12_20240101-020000-1a2b3c4d.prof；随机后缀避免同一秒内的比对互相覆盖"""
+    return f"{kind}_{target_id}_{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}.prof"
+
+
+def run_profiled(filename, func, *args, **kwargs):
+    """在 cProfile 下执行 func，无论成功与否都保存统计文件"""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        try:
+            _save(profiler, filename)
+        except Exception as e:
+            current_app.logger.error(f"Failed to save profile {filename}: {e}")
+
+
+def _save(profiler, filename):
+    profile_dir = current_app.config['PROFILE_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+    profiler.dump_stats(os.path.join(profile_dir, filename))
+
+    # 日志中输出累计耗时最多的函数，便于不下载文件也能快速判断
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(15)
+    current_app.logger.info(f"Saved profile {filename}:\n{out.getvalue()}")
+    _prune(profile_dir, current_app.config['PROFILE_KEEP'])
+
+
+def _prune(profile_dir, keep):
+    """只保留最新的 keep 个统计文件，并清除比对记录中指向已删除文件的文件名"""
+    files = [os.path.join(profile_dir, f) for f in os.listdir(profile_dir) if f.endswith('.prof')]
+    files.sort(key=os.path.getmtime, reverse=True)
+    removed = []
+    for path in files[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        removed.append(os.path.basename(path))
+    if not removed:
+        return
+    try:
+        CompareRun.query.filter(CompareRun.profile_file.in_(removed)) \
+            .update({'profile_file': None}, synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to clear pruned profile files: {e}")
@@ -1,10 +1,22 @@
 import paramiko
 import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from flask import current_app
-from app.utils import decrypt_password
+from app.utils import decrypt_password, decode_content
+from app.services.timing import NULL_TIMER
+from app.services.metrics import SSH_CONNECTIONS_OPEN
+from app.services.circuit_breaker import breaker, HostUnreachableError
+
+# 每个并发通道至少分摊的文件数，文件较少时打开新通道的开销大于并发带来的收益
+_MIN_FILES_PER_CHANNEL = 4
 
 class SSHService:
-    def __init__(self, host, username, password=None, key_path=None, port=22, os_type='Linux'):
+    def __init__(self, host, username, password=None, key_path=None, port=22, os_type='Linux', timer=None, jump=None):
         self.host = host
         self.username = username
         self.password = password
@@ -12,6 +24,24 @@ class SSHService:
         self.key_path = key_path
         self.os_type = os_type
         self.client = None
+        self.sftp = None
+        # read_files 额外打开的 SFTP 通道，连接内复用，close 时关闭
+        self._extra_sftp = []
+        # 本连接的通道配额：同时使用的并发读取/命令通道数不超过 SSH_MAX_SESSIONS，
+        # 避免超过 sshd 按连接计算的 MaxSessions（默认 10）
+        self._slots = None
+        self.timer = timer or NULL_TIMER
+        self._counted = False
+        # 跳板机（SSHService），经其共享连接上的 direct-tcpip 通道连接本机
+        self.jump = jump
+        self._jump_acquired = False
+
+    @classmethod
+    def for_server(cls, server, timer=None):
+        """根据 Server 记录创建连接，配置了跳板机时经跳板机连接"""
+        jump = cls.for_server(server.jump_server) if server.jump_server else None
+        return cls(server.ip, server.username, password=server.password, key_path=server.ssh_key_path,
+                   port=server.port, os_type=server.os_type, timer=timer, jump=jump)
 
     def _get_key_path(self):
         if self.key_path:
@@ -19,14 +49,36 @@ class SSHService:
         return current_app.config.get('SSH_KEY_PATH')
 
     def connect(self):
+        config = current_app.config
+        # 熔断中的主机直接失败，不再等待连接超时
+        breaker.check(self.host, self.port)
+        try:
+            with self.timer.span('ssh_connect'):
+                self._connect()
+        except Exception as e:
+            if not is_unreachable(e):
+                raise
+            if breaker.record_failure(self.host, self.port, e, config['SSH_BREAKER_THRESHOLD'], config['SSH_BREAKER_COOLDOWN']):
+                current_app.logger.warning(f"Circuit opened for {self.host}:{self.port} for {config['SSH_BREAKER_COOLDOWN']}s: {e}")
+            raise HostUnreachableError(self.host, self.port, e) from e
+        breaker.record_success(self.host, self.port)
+        if not self._counted:
+            SSH_CONNECTIONS_OPEN.inc()
+            self._counted = True
+
+    def _connect(self):
         self.client = paramiko.SSHClient()
         self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # 连接、SSH 横幅与认证都设置超时，避免黑洞主机无限期挂住比对线程
+        timeouts = connect_timeouts(current_app.config)
+        if self.jump:
+            timeouts['sock'] = self._open_jump_channel()
         
         try:
             if self.password:
                 # Decrypt password before connecting
                 plain_password = decrypt_password(self.password)
-                self.client.connect(hostname=self.host, port=self.port, username=self.username, password=plain_password)
+                self.client.connect(hostname=self.host, port=self.port, username=self.username, password=plain_password, **timeouts)
                 return
 
             key_file = self._get_key_path()
@@ -43,133 +95,345 @@ class SSHService:
                         k = None
                 
                 if k:
-                    self.client.connect(hostname=self.host, port=self.port, username=self.username, pkey=k)
+                    self.client.connect(hostname=self.host, port=self.port, username=self.username, pkey=k, **timeouts)
                 else:
-                     self.client.connect(hostname=self.host, port=self.port, username=self.username, key_filename=key_file)
+                     self.client.connect(hostname=self.host, port=self.port, username=self.username, key_filename=key_file, **timeouts)
             else:
                 # 尝试默认连接（如使用系统 SSH 配置）
-                self.client.connect(hostname=self.host, port=self.port, username=self.username)
+                self.client.connect(hostname=self.host, port=self.port, username=self.username, **timeouts)
         except Exception as e:
             current_app.logger.error(f"Failed to connect to {self.host}: {e}")
+            if 'sock' in timeouts:
+                timeouts['sock'].close()
+            self._release_jump()
             raise
 
+    def _open_jump_channel(self):
+        """在跳板机的共享连接上打开到本机的 direct-tcpip 通道，跳板机本身不可达时抛出其 HostUnreachableError"""
+        transport = jump_pool.acquire(self.jump)
+        self._jump_acquired = True
+        try:
+            return transport.open_channel('direct-tcpip', (self.host, int(self.port or 22)), ('127.0.0.1', 0),
+                                          timeout=current_app.config['SSH_CONNECT_TIMEOUT'])
+        except Exception as e:
+            current_app.logger.error(f"Failed to open channel to {self.host} via {self.jump.host}: {e}")
+            self._release_jump()
+            raise
+
+    def _release_jump(self):
+        if self._jump_acquired:
+            self._jump_acquired = False
+            jump_pool.release(self.jump)
+
     def list_files(self, remote_path, pattern='*'):
         if not self.client:
             self.connect()
         
-        # 规范化路径，移除末尾的 /
-        remote_path = remote_path.rstrip('/\\')
-        
-        # 处理多个 pattern，用 ; 分隔
-        patterns = [p.strip() for p in pattern.split(';') if p.strip()]
-        if not patterns:
-            patterns = ['*']
-            
-        if self.os_type == 'Windows':
-            # Windows 处理逻辑
-            # dir /s /b "path\pattern1" "path\pattern2" | findstr /v /a:d "^$"
-            # dir 的 /a-d 参数其实是过滤掉目录，但 dir "path\pattern" 时 /a-d 并不总是生效，尤其是配合 /s 时行为可能不一致
-            # 但最重要的是，Windows cmd 的参数解析问题。
-            
-            # Windows 路径通常使用反斜杠
-            remote_path_win = remote_path.replace('/', '\\')
-            
-            # 使用简单的 dir 命令，多次执行然后合并结果
-            # dir /s /b /a-d "root\pattern"
-            
-            files = []
-            for p in patterns:
-                # 拼接路径和通配符
-                # 注意：Windows 命令行中，如果路径包含双重引号会导致解析错误
-                # 比如 "D:\path\"pattern"" 是非法的
-                # 我们应该只在整个路径外层加一次引号，且只有当路径包含空格时才必须加，但通常加了比较安全
-                # 这里的 full_pattern 已经是拼接好的路径，例如 D:\path\pattern
-                
-                # 如果 remote_path_win 已经带了引号，先去掉
-                remote_path_clean = remote_path_win.strip('"')
-                p_clean = p.strip('"')
-                
-                full_pattern = f'{remote_path_clean}\\{p_clean}'
-                # 统一将双反斜杠替换为单反斜杠（Windows API 和 cmd 有时对连续的 \\ 处理不一致）
-                # 虽然 Python 字符串中 \\ 表示一个反斜杠，但这里我们希望最终传给 cmd 的是一个干净的路径
-                # 比如 D:\path\\file.txt -> D:\path\file.txt
-                full_pattern = full_pattern.replace('\\\\', '\\')
-                
-                # 注意：Windows dir 命令对 /a-d 的支持
-                # cmd = f'dir /s /b /a-d "{full_pattern}"'
-                
-                # 改用 cmd /c 来执行，确保环境一致
-                # cmd /c "dir /s /b /a-d "path""
-                cmd = f'cmd /c "dir /s /b /a-d "{full_pattern}""'
-                
-                try:
-                    stdin, stdout, stderr = self.client.exec_command(cmd)
-                    
-                    # Windows 命令行输出可能是 GBK 编码
-                    try:
-                        output = stdout.read().decode('gbk')
-                    except:
-                        output = stdout.read().decode('utf-8', errors='replace')
-                        
-                    # dir 找不到文件时会输出到 stderr，但这不算严重错误
-                    # error = stderr.read().decode('gbk', errors='replace')
-                    
-                    for line in output.splitlines():
-                        if line.strip():
-                            files.append(line.strip())
-                except Exception as e:
-                    current_app.logger.error(f"Error executing dir command for {full_pattern}: {e}")
+        with self.timer.span('ssh_list') as span:
+            files = self._list_files(remote_path, pattern)
+            span.bytes = sum(len(f) for f in files)
+        return files
 
+    def _list_files(self, remote_path, pattern):
+        commands = build_list_commands(remote_path, pattern, self.os_type)
+        timeout = current_app.config['SSH_COMMAND_TIMEOUT']
+        files = []
+        if self.os_type == 'Windows':
+            # 每个 pattern 一条 dir 命令，在同一连接的多个 exec 通道上并发执行
+            outputs = self._fan_out([cmd for _, cmd in commands], lambda cmd: self._run_dir(cmd, timeout))
+            for (target, _), output in zip(commands, outputs):
+                if isinstance(output, Exception):
+                    current_app.logger.error(f"Error executing dir command for {target}: {output}")
+                    continue
+                for line in output.splitlines():
+                    if line.strip():
+                        files.append(line.strip())
             # 去重
-            files = list(set(files))
-            return files
-            
-        else:
-            # Linux 处理逻辑 (保持原有)
-            # 构建 find 命令，使用 -o (OR) 连接多个 -name 条件
-            # find path -maxdepth 1 \( -name 'p1' -o -name 'p2' \) -type f
-            name_conditions = []
-            for p in patterns:
-                name_conditions.append(f"-name '{p}'")
-            
-            condition_str = " -o ".join(name_conditions)
-            if len(patterns) > 1:
-                condition_str = f"\\( {condition_str} \\)"
-                
-            cmd = f"find {remote_path} -maxdepth 1 {condition_str} -type f"
-            stdin, stdout, stderr = self.client.exec_command(cmd)
+            return list(set(files))
+        
+        for _, cmd in commands:
+            stdin, stdout, stderr = self.client.exec_command(cmd, timeout=timeout)
             
             error = stderr.read().decode('utf-8')
             if error:
                 current_app.logger.error(f"Error listing files: {error}")
                 
-            files = []
             for line in stdout:
                 files.append(line.strip())
-                
-            return files
+        return files
 
-    def read_file(self, file_path):
+    def _run_dir(self, cmd, timeout):
+        stdin, stdout, stderr = self.client.exec_command(cmd, timeout=timeout)
+        # Windows 命令行输出可能是 GBK 编码
+        # dir 找不到文件时会输出到 stderr，但这不算严重错误
+        data = stdout.read()
+        try:
+            return data.decode('gbk')
+        except UnicodeDecodeError:
+            return data.decode('utf-8', errors='replace')
+
+    def _fan_out(self, items, func, parallel=None):
+        """在同一连接上用至多 parallel 个通道并发执行 func(item)，返回与 items 对应的结果或异常
+
+        并发数同时受本连接的配额 SSH_MAX_SESSIONS 限制，不会新建 TCP 连接。
+        """
+        parallel = min(parallel or len(items), len(items))
+        if parallel <= 1:
+            return [_call(func, item) for item in items]
+        slots = self._get_slots()
+        acquired = _acquire_up_to(slots, parallel)
+        try:
+            if acquired == 1:
+                return [_call(func, item) for item in items]
+            with ThreadPoolExecutor(max_workers=acquired) as pool:
+                return list(pool.map(lambda item: _call(func, item), items))
+        finally:
+            for _ in range(acquired):
+                slots.release()
+
+    def _get_slots(self):
+        if self._slots is None:
+            self._slots = threading.BoundedSemaphore(max(current_app.config['SSH_MAX_SESSIONS'], 1))
+        return self._slots
+
+    def _get_sftp(self):
+        """同一连接上复用一个 SFTP 会话，避免每读一个文件都重新打开通道"""
         if not self.client:
             self.connect()
-            
-        sftp = self.client.open_sftp()
+        if self.sftp is None:
+            self.sftp = self.client.open_sftp()
+            self.sftp.get_channel().settimeout(current_app.config['SSH_COMMAND_TIMEOUT'])
+        return self.sftp
+
+    def read_file(self, file_path):
+        return self._read(self._get_sftp(), file_path, current_app.logger)
+
+    def read_files(self, file_paths):
+        """并发读取多个文件，返回 {路径: 内容或 None}"""
+        return dict(self.iter_files(file_paths))
+
+    def iter_files(self, file_paths, window=None):
+        """按给定顺序逐个生成 (路径, 内容或 None)，后台并发预读，最多领先 window 个文件
+
+        在同一连接上打开多个 SFTP 通道（不新建 TCP 连接）分摊读取，通道在连接内复用，
+        同时使用的通道数受本连接的配额 SSH_MAX_SESSIONS 限制。调用方中途放弃时应关闭生成器以释放通道配额。
+        """
+        file_paths = list(dict.fromkeys(file_paths))
+        if len(file_paths) <= 1:
+            for path in file_paths:
+                yield path, self.read_file(path)
+            return
+        
+        window = min(window or len(file_paths), len(file_paths))
+        sftp = self._get_sftp()
+        logger = current_app.logger
+        timeout = current_app.config['SSH_COMMAND_TIMEOUT']
+        idle = queue.SimpleQueue()
+        for channel in [sftp] + self._extra_sftp:
+            idle.put(channel)
+        
+        def read(path):
+            # 每个工作线程独占一个 SFTP 通道：优先取空闲通道，不够时在同一连接上新开，
+            # 同时使用的通道数不超过并发数
+            try:
+                channel = idle.get_nowait()
+            except queue.Empty:
+                channel = self.client.open_sftp()
+                channel.get_channel().settimeout(timeout)
+                self._extra_sftp.append(channel)
+            try:
+                return self._read(channel, path, logger)
+            finally:
+                idle.put(channel)
+        
+        slots = self._get_slots()
+        acquired = _acquire_up_to(slots, -(-window // _MIN_FILES_PER_CHANNEL))
         try:
-            with sftp.open(file_path, 'r') as f:
-                # 尝试读取并解码，处理可能的编码问题
-                content = f.read()
-                for enc in ('utf-8', 'gb18030', 'gbk', 'utf-16-le', 'latin-1'):
-                    try:
-                        return content.decode(enc)
-                    except UnicodeDecodeError:
-                        continue
-                return content.decode('utf-8', errors='replace')
+            with ThreadPoolExecutor(max_workers=acquired) as pool:
+                remaining = iter(file_paths)
+                pending = deque((path, pool.submit(_call, read, path)) for path in islice(remaining, window))
+                try:
+                    while pending:
+                        path, future = pending.popleft()
+                        content = future.result()
+                        for next_path in islice(remaining, 1):
+                            pending.append((next_path, pool.submit(_call, read, next_path)))
+                        # 打开通道失败等异常按读取失败处理，与 read_file 一致
+                        if isinstance(content, Exception):
+                            logger.error(f"Error reading file {path}: {content}")
+                            content = None
+                        yield path, content
+                finally:
+                    # 中途关闭时取消尚未开始的预读
+                    for _, future in pending:
+                        future.cancel()
+        finally:
+            for _ in range(acquired):
+                slots.release()
+
+    def _read(self, sftp, file_path, logger):
+        try:
+            with self.timer.span('ssh_read') as span:
+                with sftp.open(file_path, 'r') as f:
+                    content = f.read()
+                span.bytes = len(content)
         except Exception as e:
-            current_app.logger.error(f"Error reading file {file_path}: {e}")
+            logger.error(f"Error reading file {file_path}: {e}")
             return None
-        finally:
-            sftp.close()
+        
+        # 尝试解码，处理可能的编码问题
+        with self.timer.span('decode'):
+            return decode_content(content)
 
     def close(self):
+        for channel in self._extra_sftp:
+            try:
+                channel.close()
+            except Exception:
+                pass
+        self._extra_sftp = []
+        if self.sftp:
+            try:
+                self.sftp.close()
+            except Exception:
+                pass
+            self.sftp = None
         if self.client:
             self.client.close()
+        self._release_jump()
+        if self._counted:
+            SSH_CONNECTIONS_OPEN.dec()
+            self._counted = False
+
+
+class _JumpPool:
+    """进程级共享的跳板机连接：同一跳板机只认证一次，各目标机经其上的 direct-tcpip 通道连接。
+
+    没有使用者的连接空闲超过 SSH_JUMP_IDLE_TIMEOUT 秒后，在下一次获取或释放时关闭。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # (host, port, username) -> {'lock', 'ssh', 'users', 'idle_since'}
+
+    @staticmethod
+    def _key(jump):
+        return (jump.host, int(jump.port or 22), jump.username)
+
+    def acquire(self, jump):
+        """返回跳板机的已认证 Transport，必要时用 jump 建立连接；每次 acquire 需对应一次 release"""
+        self._expire(current_app.config['SSH_JUMP_IDLE_TIMEOUT'])
+        with self._lock:
+            entry = self._entries.setdefault(self._key(jump), {'lock': threading.Lock(), 'ssh': None, 'users': 0, 'idle_since': None})
+            # 先登记使用者，避免连接期间被当作空闲连接关闭
+            entry['users'] += 1
+            entry['idle_since'] = None
+        try:
+            # 每个跳板机单独加锁，并发的目标机只会触发一次认证
+            with entry['lock']:
+                transport = entry['ssh'].client.get_transport() if entry['ssh'] else None
+                if transport is None or not transport.is_active():
+                    if entry['ssh']:
+                        entry['ssh'].close()
+                        entry['ssh'] = None
+                    jump.connect()
+                    entry['ssh'] = jump
+                    transport = jump.client.get_transport()
+                return transport
+        except Exception:
+            self.release(jump)
+            raise
+
+    def release(self, jump):
+        with self._lock:
+            entry = self._entries.get(self._key(jump))
+            if entry and entry['users'] > 0:
+                entry['users'] -= 1
+                if entry['users'] == 0:
+                    entry['idle_since'] = time.monotonic()
+        self._expire(current_app.config['SSH_JUMP_IDLE_TIMEOUT'])
+
+    def _expire(self, idle_timeout):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                idle_since = entry['idle_since']
+                if entry['users'] == 0 and idle_since is not None and now - idle_since >= idle_timeout:
+                    expired.append(self._entries.pop(key))
+        for entry in expired:
+            with entry['lock']:
+                if entry['ssh']:
+                    entry['ssh'].close()
+                    entry['ssh'] = None
+
+jump_pool = _JumpPool()
+
+
+def build_list_commands(remote_path, pattern, os_type):
+    """生成列目录命令 [(目标, 命令)]，同步与异步比对引擎共用"""
+    # 规范化路径，移除末尾的 /
+    remote_path = remote_path.rstrip('/\\')
+    
+    # 处理多个 pattern，用 ; 分隔
+    patterns = [p.strip() for p in pattern.split(';') if p.strip()]
+    if not patterns:
+        patterns = ['*']
+        
+    if os_type == 'Windows':
+        # Windows 处理逻辑
+        # dir 的 /a-d 参数其实是过滤掉目录，但 dir "path\pattern" 时 /a-d 并不总是生效，尤其是配合 /s 时行为可能不一致
+        # 使用简单的 dir 命令，每个 pattern 执行一次然后合并结果
+        
+        # Windows 路径通常使用反斜杠；如果已经带了引号，先去掉
+        # 注意：Windows 命令行中，如果路径包含双重引号会导致解析错误，只在整个路径外层加一次引号
+        remote_path_clean = remote_path.replace('/', '\\').strip('"')
+        commands = []
+        for p in patterns:
+            p_clean = p.strip('"')
+            full_pattern = f'{remote_path_clean}\\{p_clean}'
+            # 统一将双反斜杠替换为单反斜杠（Windows API 和 cmd 有时对连续的 \\ 处理不一致）
+            full_pattern = full_pattern.replace('\\\\', '\\')
+            # 改用 cmd /c 来执行，确保环境一致
+            commands.append((full_pattern, f'cmd /c "dir /s /b /a-d "{full_pattern}""'))
+        return commands
+    
+    # Linux 处理逻辑
+    # 构建 find 命令，使用 -o (OR) 连接多个 -name 条件
+    # find path -maxdepth 1 \( -name 'p1' -o -name 'p2' \) -type f
+    condition_str = " -o ".join(f"-name '{p}'" for p in patterns)
+    if len(patterns) > 1:
+        condition_str = f"\\( {condition_str} \\)"
+    return [(remote_path, f"find {remote_path} -maxdepth 1 {condition_str} -type f")]
+
+
+def connect_timeouts(config):
+    """paramiko SSHClient.connect 使用的超时参数（秒）"""
+    return {
+        'timeout': config['SSH_CONNECT_TIMEOUT'],
+        'banner_timeout': config['SSH_BANNER_TIMEOUT'],
+        'auth_timeout': config['SSH_AUTH_TIMEOUT'],
+    }
+
+
+def is_unreachable(error):
+    """连接失败是否属于网络层面（超时、拒绝、握手失败），认证失败不计入熔断"""
+    if isinstance(error, paramiko.AuthenticationException):
+        return False
+    return isinstance(error, (OSError, paramiko.SSHException, EOFError))
+
+
+def _acquire_up_to(slots, n):
+    """至少获取 1 个、至多 n 个通道配额，只有第一个会阻塞等待"""
+    slots.acquire()
+    count = 1
+    while count < n and slots.acquire(blocking=False):
+        count += 1
+    return count
+
+
+def _call(func, item):
+    try:
+        return func(item)
+    except Exception as e:
+        return e
@@ -0,0 +1,80 @@
+import posixpath
+from itertools import groupby
+from flask import current_app
+from app.services.ssh_service import SSHService
+from app.services.gitlab_service import GitLabService
+from app.services.blob_store import get_blob
+
+
+class SyncService:
+    """将服务器上的配置文件同步回 GitLab：按服务器分组读取，一次提交推送全部文件"""
+
+    def __init__(self):
+        self.gitlab_service = GitLabService()
+
+    def sync_results(self, results):
+        """同步一组 DiffResult，返回 (成功文件数, [(file_name, 错误信息)])"""
+        files = {}
+        owners = {}  # 仓库路径 -> 同步到该路径的文件名，多个结果指向同一路径时都不提交
+        sources = []
+        failures = []
+
+        def add(target, content, result, server):
+            files[target] = content
+            owners.setdefault(target, []).append(result.file_name)
+            if server.name not in sources:
+                sources.append(server.name)
+
+        # 优先使用比对时保存的快照，保证提交的正是用户审阅过的内容
+        live = []
+        for result in results:
+            content = get_blob(result.remote_hash)
+            if content is None:
+                live.append(result)
+                continue
+            add(posixpath.join(result.config_map.gitlab_path, result.file_name), content, result, result.config_map.server)
+
+        # 快照缺失的文件回退为实时读取：按服务器分组，每台服务器只建立一次 SSH 连接并复用同一个 SFTP 会话
+        ordered = sorted(live, key=lambda r: r.config_map.server_id)
+        for _, group in groupby(ordered, key=lambda r: r.config_map.server_id):
+            group = list(group)
+            server = group[0].config_map.server
+            ssh = SSHService.for_server(server)
+            handled = set()
+            try:
+                contents = ssh.read_files(posixpath.join(r.config_map.remote_path, r.file_name) for r in group)
+                for result in group:
+                    config = result.config_map
+                    content = contents.get(posixpath.join(config.remote_path, result.file_name))
+                    handled.add(result.id)
+                    if content is None:
+                        failures.append((result.file_name, 'Failed to read from server'))
+                        continue
+                    # 假设 gitlab_path 是目录，拼接文件名得到仓库中的目标路径
+                    target_gitlab_path = posixpath.join(config.gitlab_path, result.file_name)
+                    add(target_gitlab_path, content, result, server)
+            except Exception as e:
+                current_app.logger.error(f"Error reading files from {server.name} for sync: {e}")
+                # 连接失败等异常：本组中尚未成功读取的文件都记为失败
+                failures.extend((r.file_name, str(e)) for r in group if r.id not in handled)
+            finally:
+                ssh.close()
+
+        # 不同服务器的文件同步到同一仓库路径时无法确定以哪个为准，全部记为失败
+        for target, names in owners.items():
+            if len(names) > 1:
+                del files[target]
+                failures.extend((name, f'Multiple files target {target}') for name in names)
+
+        if not files:
+            return 0, failures
+
+        commit_message = f"Sync {len(files)} files from {', '.join(sources)}"
+        ok, msg = self.gitlab_service.commit_files(files, commit_message)
+        if not ok:
+            current_app.logger.error(f"Failed to commit synced files to GitLab: {msg}")
+            failures.extend((posixpath.basename(p), msg) for p in files)
+            return 0, failures
+
+        current_app.logger.info(f"Synced {len(files)} files to GitLab in commit {msg}")
+        return len(files), failures
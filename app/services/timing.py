@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from app.services.metrics import observe_phase
+
+# 比对过程中记录的阶段名称
+PHASES = ('ssh_connect', 'ssh_list', 'ssh_read', 'gitlab_list', 'gitlab_fetch', 'decode', 'diff', 'db_commit')
+
+
+class _Span:
+    def __init__(self):
+        self.bytes = 0
+
+
+class PhaseTimer:
+    """记录一次比对运行中各阶段的累计耗时、次数与字节数"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, phase):
+        """计时上下文，调用方可通过 span.bytes 记录本阶段传输的字节数"""
+        s = _Span()
+        start = time.perf_counter()
+        try:
+            yield s
+        finally:
+            self.record(phase, time.perf_counter() - start, s.bytes)
+
+    def record(self, phase, seconds, nbytes=0):
+        with self._lock:
+            stat = self.phases.setdefault(phase, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+            stat['count'] += 1
+            stat['seconds'] += seconds
+            stat['bytes'] += nbytes
+        observe_phase(phase, seconds, nbytes)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def slowest(self, n=3):
+        """按累计耗时倒序返回前 n 个阶段 [(phase, stat)]"""
+        return sorted(self.phases.items(), key=lambda kv: kv[1]['seconds'], reverse=True)[:n]
+
+    def to_json(self):
+        return json.dumps({k: {'count': v['count'], 'seconds': round(v['seconds'], 6), 'bytes': v['bytes']}
+                           for k, v in self.phases.items()})
+
+    def summary(self, n=3):
+        """生成日志中使用的简短描述，如 ssh_read=1.20s/35KB"""
+        return ', '.join(f"{k}={v['seconds']:.2f}s/{v['bytes'] // 1024}KB" for k, v in self.slowest(n))
+
+
+def slowest_phases(raw, n=3):
+    """从 phase_stats JSON 中取累计耗时最多的 n 个阶段 [(phase, stat)]"""
+    stats = parse_phase_stats(raw)
+    return sorted(stats.items(), key=lambda kv: kv[1].get('seconds', 0), reverse=True)[:n]
+
+
+def summarize_runs(runs, n=5):
+    """汇总多次 CompareRun：返回最慢的 n 次运行与累计耗时最多的 n 个阶段"""
+    runs = [r for r in runs if r is not None]
+    phases = {}
+    for run in runs:
+        for phase, stat in parse_phase_stats(run.phase_stats).items():
+            total = phases.setdefault(phase, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+            total['count'] += stat.get('count', 0)
+            total['seconds'] += stat.get('seconds', 0.0)
+            total['bytes'] += stat.get('bytes', 0)
+    return {
+        'slowest_runs': sorted(runs, key=lambda r: r.duration_ms, reverse=True)[:n],
+        'slowest_phases': sorted(phases.items(), key=lambda kv: kv[1]['seconds'], reverse=True)[:n],
+    }
+
+
+class _NullTimer:
+    """未启用计时时使用的空实现，避免在热路径上判断 None"""
+
+    @contextmanager
+    def span(self, phase):
+        yield _Span()
+
+    def record(self, phase, seconds, nbytes=0):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def parse_phase_stats(raw):
+    """将 CompareRun.phase_stats 的 JSON 文本解析为字典"""
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {}
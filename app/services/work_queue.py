@@ -0,0 +1,431 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import TaskRun, WorkItem, CompareRun, ConfigMap, DirectoryPair, Server, SchedulerLock, current_time_plus_8
+from app.services.leader import lease
+from app.services.estimates import expected_durations
+from app.services.metrics import WORK_ITEMS
+
+# 定时任务的分片执行：主节点到点后只把任务按配置项/目录对拆成工作项写入 work_items 表，
+# 所有 worker/all 进程定期从表中领取工作项执行，任务的比对由多个进程/节点分担。
+# 领取的工作项带租约，执行期间由续租任务定期延长，worker 宕机后租约过期即可被其他 worker 重新领取；失败的工作项延迟重试，
+# 超过最大次数记为 FAILED。一次执行的全部工作项结束后才标记 TaskRun 完成并更新任务的 last_run_at。
+# 领取时限制全局与每个业务系统同时执行的工作项数，避免大量任务同时压向同一批服务器与 GitLab。
+# 工作项按历史估计耗时从长到短领取（见 estimates）。
+
+QUEUE_JOB_ID = 'work-queue-poll'
+LEASE_JOB_ID = 'work-queue-lease'
+CLAIM_LOCK = 'work-queue'  # scheduler_locks 中串行化领取的锁行
+ACTIVE_STATUSES = ('PENDING', 'RUNNING')
+
+# 本进程正在执行的工作项 id，由续租任务定期延长其租约
+_held = set()
+_held_lock = threading.Lock()
+
+
+def enqueue_task(task):
+    """为任务创建一次执行，按配置项与目录对写入工作项；上一次执行尚未结束时不重复入队，返回 TaskRun 或 None"""
+    if TaskRun.query.filter_by(task_id=task.id, status='RUNNING').first():
+        return None
+    return _create_run(TaskRun(task_id=task.id), task.config_maps, task.directory_pairs)
+
+
+def enqueue_config_maps(config_maps, trigger, commit_sha=None):
+    """不属于定时任务的一次执行（如 GitLab 推送），已有待领取工作项的配置项不重复入队，返回 TaskRun 或 None"""
+    ids = [c.id for c in config_maps]
+    pending = {config_map_id for (config_map_id,) in db.session.query(WorkItem.config_map_id)
+               .filter(WorkItem.config_map_id.in_(ids), WorkItem.status == 'PENDING')}
+    config_maps = [c for c in config_maps if c.id not in pending]
+    if not config_maps:
+        return None
+    return _create_run(TaskRun(trigger=trigger, commit_sha=commit_sha), config_maps, [])
+
+
+def _create_run(run, config_maps, pairs):
+    map_durations = expected_durations(config_maps)
+    pair_durations = expected_durations(pairs)
+    run.item_count = len(map_durations) + len(pair_durations)
+    run.expected_ms = sum(map_durations.values()) + sum(pair_durations.values())
+    db.session.add(run)
+    db.session.flush()
+    for config_map_id, expected_ms in map_durations.items():
+        db.session.add(WorkItem(run_id=run.id, config_map_id=config_map_id, expected_ms=expected_ms))
+    for pair_id, expected_ms in pair_durations.items():
+        db.session.add(WorkItem(run_id=run.id, pair_id=pair_id, expected_ms=expected_ms))
+    db.session.commit()
+    if not run.item_count:
+        finalize_run(run.id)
+    return run
+
+
+def _claimable(now):
+    # 待执行且已到重试时间，或领取者的租约已过期
+    return or_(
+        and_(WorkItem.status == 'PENDING', WorkItem.available_at <= now),
+        and_(WorkItem.status == 'RUNNING', WorkItem.lease_expires_at < now),
+    )
+
+
+def _supports_skip_locked():
+    dialect = db.engine.dialect
+    version = dialect.server_version_info or ()
+    if dialect.name == 'postgresql':
+        return True
+    if dialect.name == 'mysql':
+        return version >= ((10, 6) if getattr(dialect, 'is_mariadb', False) else (8, 0, 1))
+    return False
+
+
+def _fail_expired(now):
+    """租约过期且已达到最大尝试次数的工作项（worker 反复在执行中退出）记为 FAILED，返回涉及的执行 id"""
+    max_attempts = current_app.config['WORK_ITEM_MAX_ATTEMPTS']
+    condition = and_(WorkItem.status == 'RUNNING', WorkItem.lease_expires_at < now,
+                     WorkItem.attempts >= max_attempts)
+    run_ids = {row.run_id for row in db.session.query(WorkItem.run_id).filter(condition).distinct()}
+    if run_ids:
+        updated = WorkItem.query.filter(condition).update({
+            'status': 'FAILED',
+            'finished_at': now,
+            'lease_holder': None,
+            'lease_expires_at': None,
+            'last_error': f'Lease expired after {max_attempts} attempts',
+        }, synchronize_session=False)
+        WORK_ITEMS.labels('failed').inc(updated)
+    db.session.commit()
+    return run_ids
+
+
+def _lock_claims(now):
+    """串行化各 worker 的领取：更新（不存在时创建）队列锁行，持有行锁/写锁直到本次领取提交，
+    保证并发上限按已提交的领取数计算"""
+    values = {'holder': lease.holder, 'expires_at': now}
+    if SchedulerLock.query.filter_by(name=CLAIM_LOCK).update(values, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(SchedulerLock(name=CLAIM_LOCK, acquired_at=now, **values))
+    except IntegrityError:
+        SchedulerLock.query.filter_by(name=CLAIM_LOCK).update(values, synchronize_session=False)
+
+
+def _with_system(query):
+    """连接工作项所在的服务器（目录对取左侧服务器），用于按业务系统统计与过滤"""
+    return query.outerjoin(ConfigMap, WorkItem.config_map_id == ConfigMap.id) \
+        .outerjoin(DirectoryPair, WorkItem.pair_id == DirectoryPair.id) \
+        .join(Server, Server.id == func.coalesce(ConfigMap.server_id, DirectoryPair.left_server_id))
+
+
+def _running_counts(now):
+    """正在执行（租约未过期）的工作项数：({business_system_id: 数量}, {run_id: 数量})"""
+    rows = _with_system(db.session.query(Server.business_system_id, WorkItem.run_id, func.count(WorkItem.id))) \
+        .filter(WorkItem.status == 'RUNNING', WorkItem.lease_expires_at >= now) \
+        .group_by(Server.business_system_id, WorkItem.run_id).all()
+    by_system, by_run = {}, {}
+    for system_id, run_id, count in rows:
+        by_system[system_id] = by_system.get(system_id, 0) + count
+        by_run[run_id] = by_run.get(run_id, 0) + count
+    return by_system, by_run
+
+
+def _candidates(now, limit, full_systems, full_runs):
+    """可领取的工作项 (id, business_system_id, run_id)，跳过已达上限的业务系统与执行，估计耗时长的在前"""
+    query = _with_system(db.session.query(WorkItem.id, Server.business_system_id, WorkItem.run_id)) \
+        .filter(_claimable(now))
+    if None in full_systems:
+        query = query.filter(Server.business_system_id.isnot(None))
+    full_systems = [system_id for system_id in full_systems if system_id is not None]
+    if full_systems:
+        query = query.filter(or_(Server.business_system_id.is_(None), ~Server.business_system_id.in_(full_systems)))
+    if full_runs:
+        query = query.filter(~WorkItem.run_id.in_(full_runs))
+    # 估计耗时长的优先领取（最长优先），各 worker 空闲时取剩余中最长的，整体完成时间最短
+    query = query.order_by(WorkItem.expected_ms.desc(), WorkItem.id).limit(limit)
+    if _supports_skip_locked():
+        # SELECT ... FOR UPDATE SKIP LOCKED：跳过其他 worker 正在更新的行
+        query = query.with_for_update(skip_locked=True, of=WorkItem)
+    return query.all()
+
+
+def claim_items(limit):
+    """领取最多 limit 个工作项，返回领取到的工作项 id 列表
+
+    正在执行的工作项总数不超过 WORK_QUEUE_MAX_RUNNING，同一业务系统不超过 WORK_QUEUE_MAX_PER_SYSTEM（0 为不限），
+    超出的工作项留在队列中等待后续领取。有多个执行同时排队时，每个执行优先分得 max_running / 执行数 个名额，
+    频繁触发的小任务与耗时长的夜间任务互不挤占；其他执行没有可领取的工作项时，空闲名额仍可由任一执行使用。
+    """
+    now = current_time_plus_8()
+    for run_id in _fail_expired(now):
+        finalize_run(run_id)
+
+    max_running = current_app.config['WORK_QUEUE_MAX_RUNNING']
+    max_per_system = current_app.config['WORK_QUEUE_MAX_PER_SYSTEM']
+    by_system, by_run, share = {}, {}, None
+    if max_running or max_per_system:
+        _lock_claims(now)
+        by_system, by_run = _running_counts(now)
+    if max_running:
+        limit = min(limit, max_running - sum(by_system.values()))
+        if limit <= 0:
+            db.session.commit()
+            return []
+        active_runs = db.session.query(func.count(func.distinct(WorkItem.run_id))) \
+            .filter(WorkItem.status.in_(ACTIVE_STATUSES)).scalar()
+        share = max(1, -(-max_running // max(active_runs, 1)))
+
+    candidates = []
+
+    def pick(rows, fair):
+        for item_id, system_id, run_id in rows:
+            if len(candidates) >= limit:
+                return
+            if item_id in candidates:
+                continue
+            if max_per_system and by_system.get(system_id, 0) >= max_per_system:
+                continue
+            if fair and by_run.get(run_id, 0) >= share:
+                continue
+            by_system[system_id] = by_system.get(system_id, 0) + 1
+            by_run[run_id] = by_run.get(run_id, 0) + 1
+            candidates.append(item_id)
+
+    # 多取一些候选，本批次内某个业务系统或执行达到上限后由其他工作项补足
+    fetch = limit * 5 if (max_per_system or share) else limit
+    full_systems = [system_id for system_id, count in by_system.items() if max_per_system and count >= max_per_system]
+    if share:
+        pick(_candidates(now, fetch, full_systems, [run_id for run_id, count in by_run.items() if count >= share]), fair=True)
+    if len(candidates) < limit:
+        full_systems = [system_id for system_id, count in by_system.items() if max_per_system and count >= max_per_system]
+        pick(_candidates(now, fetch + len(candidates), full_systems, []), fair=False)
+
+    # 条件更新保证同一工作项只被一个 worker 领取（SQLite 等不支持行锁的数据库也依赖于此）
+    claimed = []
+    expires_at = now + timedelta(seconds=current_app.config['WORK_ITEM_LEASE'])
+    for item_id in candidates:
+        updated = WorkItem.query.filter(WorkItem.id == item_id, _claimable(now)).update({
+            'status': 'RUNNING',
+            'lease_holder': lease.holder,
+            'lease_expires_at': expires_at,
+            'attempts': WorkItem.attempts + 1,
+            'started_at': now,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(item_id)
+    if claimed:
+        # 记录执行的开始时间（第一个工作项被领取时）
+        run_ids = db.session.query(WorkItem.run_id).filter(WorkItem.id.in_(claimed)).distinct()
+        TaskRun.query.filter(TaskRun.id.in_(run_ids), TaskRun.started_at.is_(None)).update(
+            {'started_at': now}, synchronize_session=False)
+    db.session.commit()
+    return claimed
+
+
+def _finish_item(item, error):
+    """记录工作项结果：成功记为 DONE，失败时未达最大次数则延迟重试，否则记为 FAILED"""
+    now = current_time_plus_8()
+    values = {'lease_holder': None, 'lease_expires_at': None}
+    if item.started_at:
+        values['duration_ms'] = int((now - item.started_at).total_seconds() * 1000)
+    if error is None:
+        values.update(status='DONE', finished_at=now, last_error=None)
+        outcome = 'done'
+    elif item.attempts < current_app.config['WORK_ITEM_MAX_ATTEMPTS']:
+        delay = current_app.config['WORK_ITEM_RETRY_DELAY'] * item.attempts
+        values.update(status='PENDING', available_at=now + timedelta(seconds=delay), last_error=str(error)[:512])
+        outcome = 'retry'
+    else:
+        values.update(status='FAILED', finished_at=now, last_error=str(error)[:512])
+        outcome = 'failed'
+    # 租约已过期并被其他 worker 领走时，结果以新的领取者为准
+    updated = WorkItem.query.filter_by(id=item.id, status='RUNNING', lease_holder=lease.holder).update(
+        values, synchronize_session=False)
+    db.session.commit()
+    if updated:
+        WORK_ITEMS.labels(outcome).inc()
+    return bool(updated)
+
+
+def _describe(item):
+    return f"config {item.config_map_id}" if item.config_map_id is not None else f"pair {item.pair_id}"
+
+
+def process_items(item_ids):
+    """执行已领取的工作项：同一执行的配置项、目录对分别交给 DiffService 批量比对"""
+    from app.services.diff_service import DiffService
+
+    items = WorkItem.query.filter(WorkItem.id.in_(item_ids)).all()
+    groups = {}
+    for item in items:
+        groups.setdefault((item.run_id, item.config_map_id is None), []).append(item)
+
+    diff_service = DiffService()
+    for (run_id, is_pair), group in groups.items():
+        run = db.session.get(TaskRun, run_id)
+        if run is None:
+            continue  # 任务已被删除
+        compare = diff_service.compare_directory_pairs if is_pair else diff_service.compare_config_maps
+        targets = [item.target for item in group if item.target is not None]
+        try:
+            outcomes = compare(targets, profile=bool(run.task and run.task.profile))
+        except Exception as e:
+            db.session.rollback()
+            outcomes = {target.id: e for target in targets}
+        for item in group:
+            target_id = item.pair_id if is_pair else item.config_map_id
+            outcome = outcomes.get(target_id, LookupError(f"{_describe(item)} no longer exists"))
+            error = outcome if isinstance(outcome, Exception) else None
+            if error is not None:
+                current_app.logger.error(f"Error comparing {_describe(item)} in {run.label} "
+                                         f"(attempt {item.attempts}): {error}")
+            _finish_item(item, error)
+    for run_id in {run_id for run_id, _ in groups}:
+        finalize_run(run_id)
+
+
+def finalize_run(run_id):
+    """执行的全部工作项结束后标记完成并更新任务的 last_run_at，返回是否由本次调用完成"""
+    remaining = WorkItem.query.filter(WorkItem.run_id == run_id, WorkItem.status.in_(ACTIVE_STATUSES)).count()
+    if remaining:
+        db.session.commit()
+        return False
+    counts = dict(db.session.query(WorkItem.status, func.count(WorkItem.id))
+                  .filter(WorkItem.run_id == run_id).group_by(WorkItem.status).all())
+    failed = counts.get('FAILED', 0)
+    retries = db.session.query(func.coalesce(func.sum(WorkItem.attempts - 1), 0)) \
+        .filter(WorkItem.run_id == run_id, WorkItem.attempts > 1).scalar()
+    now = current_time_plus_8()
+    # 多个 worker 同时完成最后的工作项时，只有一个能把执行从 RUNNING 改为完成
+    updated = TaskRun.query.filter_by(id=run_id, status='RUNNING').update({
+        'status': 'FAILED' if failed else 'DONE',
+        'finished_at': now,
+        'done_count': counts.get('DONE', 0),
+        'failed_count': failed,
+        'retry_count': int(retries),
+    }, synchronize_session=False)
+    if not updated:
+        db.session.commit()
+        return False
+    run = db.session.get(TaskRun, run_id)
+    run.duration_ms = int((now - run.created_at).total_seconds() * 1000)
+    if run.task is not None:
+        run.task.last_run_at = now
+    db.session.commit()
+    _log_run_summary(run, failed)
+
+    # 清理不再被引用的内容快照
+    from app.services.blob_store import prune_blobs
+    try:
+        prune_blobs()
+    except Exception as e:
+        current_app.logger.error(f"Error pruning content blobs after {run.label}: {e}")
+    return True
+
+
+def _log_run_summary(run, failed):
+    # 输出本次执行中最慢的配置项/目录对与阶段，便于定位耗时原因
+    items = run.items.all()
+    config_map_ids = [item.config_map_id for item in items if item.config_map_id is not None]
+    pair_ids = [item.pair_id for item in items if item.pair_id is not None]
+    message = (f"{run.label.capitalize()} finished in {(run.finished_at - run.created_at).total_seconds():.1f}s "
+               f"({run.item_count} items, {failed} failed)")
+    if items:
+        from app.services.timing import summarize_runs
+        runs = CompareRun.query.filter(or_(CompareRun.config_map_id.in_(config_map_ids), CompareRun.pair_id.in_(pair_ids)),
+                                       CompareRun.started_at >= run.created_at).all()
+        summary = summarize_runs(runs)
+        slowest = ', '.join(f"{'config' if r.config_map_id is not None else 'pair'} "
+                            f"{r.config_map_id if r.config_map_id is not None else r.pair_id}={r.duration_ms}ms"
+                            for r in summary['slowest_runs'])
+        slowest_phases = ', '.join(f"{k}={v['seconds']:.2f}s" for k, v in summary['slowest_phases'])
+        message += f"; slowest targets: {slowest}; slowest phases: {slowest_phases}"
+    current_app.logger.info(message)
+
+
+def estimate_completion(run):
+    """按剩余工作项的估计耗时与当前参与执行的 worker 数估算执行的完成时间，已结束时返回 None"""
+    if run.status != 'RUNNING':
+        return None
+    now = current_time_plus_8()
+    remaining = []
+    for item in run.items.filter(WorkItem.status.in_(ACTIVE_STATUSES)):
+        elapsed = (now - item.started_at).total_seconds() * 1000 if item.status == 'RUNNING' and item.started_at else 0
+        remaining.append(max(item.expected_ms - elapsed, 0))
+    if not remaining:
+        return now
+    # 并行度：当前持有未过期租约的 worker 数，受全局并发上限约束
+    workers = db.session.query(func.count(func.distinct(WorkItem.lease_holder))) \
+        .filter(WorkItem.status == 'RUNNING', WorkItem.lease_expires_at >= now).scalar() or 1
+    max_running = current_app.config['WORK_QUEUE_MAX_RUNNING']
+    if max_running:
+        workers = min(workers, max_running)
+    seconds = max(sum(remaining) / workers, max(remaining)) / 1000
+    return now + timedelta(seconds=seconds)
+
+
+def poll(app):
+    """领取并执行工作项，直到队列中没有可领取的工作项"""
+    with app.app_context():
+        # 同步引擎逐个比对，每次只领取一个，空闲的 worker 总能取到剩余中估计耗时最长的工作项
+        batch = app.config['WORK_QUEUE_BATCH'] if app.config.get('COMPARE_ENGINE') == 'async' else 1
+        while True:
+            try:
+                item_ids = claim_items(batch)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Failed to claim work items: {e}")
+                return
+            if not item_ids:
+                return
+            with _held_lock:
+                _held.update(item_ids)
+            try:
+                process_items(item_ids)
+            finally:
+                with _held_lock:
+                    _held.difference_update(item_ids)
+
+
+def renew_leases(app):
+    """延长本进程正在执行的工作项的租约，比对耗时超过 WORK_ITEM_LEASE 时也不会被其他 worker 重新领取"""
+    with _held_lock:
+        item_ids = list(_held)
+    if not item_ids:
+        return
+    with app.app_context():
+        expires_at = current_time_plus_8() + timedelta(seconds=app.config['WORK_ITEM_LEASE'])
+        try:
+            WorkItem.query.filter(WorkItem.id.in_(item_ids), WorkItem.status == 'RUNNING',
+                                  WorkItem.lease_holder == lease.holder).update(
+                {'lease_expires_at': expires_at}, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Failed to renew work item leases: {e}")
+
+
+def start_work_queue(app, scheduler):
+    """登记领取工作项的轮询任务与续租任务，worker 与 all 模式的每个进程都参与执行"""
+    scheduler.add_job(
+        id=QUEUE_JOB_ID,
+        func=poll,
+        args=[app],
+        trigger='interval',
+        seconds=app.config['WORK_QUEUE_POLL'],
+        next_run_time=datetime.now(),
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    # 每 1/3 租约时长续租一次，续租失败一两次租约仍不会过期
+    scheduler.add_job(
+        id=LEASE_JOB_ID,
+        func=renew_leases,
+        args=[app],
+        trigger='interval',
+        seconds=max(app.config['WORK_ITEM_LEASE'] // 3, 1),
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
@@ -1,10 +1,11 @@
-import openpyxl
 from app import db
-from app.models import Server
-from cryptography.fernet import Fernet
+from app.models import Server, NormalizationProfile
+from functools import lru_cache
 import os
+import io
+import gzip
 import base64
-from flask import current_app
+from flask import current_app, send_file
 
 # 获取或生成密钥
 # 在生产环境中，这个密钥应该安全存储（如环境变量），而不是硬编码或每次生成
@@ -12,6 +13,7 @@ from flask import current_app
 KEY_FILE = 'secret.key'
 
 def get_key():
+    from cryptography.fernet import Fernet
     if os.path.exists(KEY_FILE):
         with open(KEY_FILE, 'rb') as f:
             return f.read()
@@ -21,14 +23,18 @@ def get_key():
             f.write(key)
         return key
 
-CIPHER_SUITE = Fernet(get_key())
+@lru_cache(maxsize=None)
+def get_cipher():
+    """首次加解密时才读取/生成密钥，避免导入 app 时加载 cryptography 并读写 secret.key"""
+    from cryptography.fernet import Fernet
+    return Fernet(get_key())
 
 def encrypt_password(password):
     if not password:
         return None
     if isinstance(password, str):
         password = password.encode('utf-8')
-    return CIPHER_SUITE.encrypt(password).decode('utf-8')
+    return get_cipher().encrypt(password).decode('utf-8')
 
 def decrypt_password(encrypted_password):
     if not encrypted_password:
@@ -36,12 +42,34 @@ def decrypt_password(encrypted_password):
     if isinstance(encrypted_password, str):
         encrypted_password = encrypted_password.encode('utf-8')
     try:
-        return CIPHER_SUITE.decrypt(encrypted_password).decode('utf-8')
+        return get_cipher().decrypt(encrypted_password).decode('utf-8')
     except Exception:
         # 解密失败可能是因为密钥变了或者数据不是加密格式
         return encrypted_password.decode('utf-8') if isinstance(encrypted_password, bytes) else encrypted_password
 
+def decode_content(data):
+    """按常见编码依次尝试解码文件内容，全部失败时替换非法字符"""
+    for enc in ('utf-8', 'gb18030', 'gbk', 'utf-16-le', 'latin-1'):
+        try:
+            return data.decode(enc)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+def send_gzip(text, filename):
+    """以 gzip 压缩附件的形式下载文本，文件名自动加 .gz 后缀"""
+    data = gzip.compress(text.encode('utf-8'))
+    return send_file(io.BytesIO(data), mimetype='application/gzip', as_attachment=True, download_name=f'{filename}.gz')
+
+def normalization_profile_id(value):
+    """表单中选择的归一化规则 id，留空或规则不存在时返回 None"""
+    if not value or not value.isdigit():
+        return None
+    profile = db.session.get(NormalizationProfile, int(value))
+    return profile.id if profile else None
+
 def import_servers_from_excel(file_path):
+    import openpyxl
     try:
         wb = openpyxl.load_workbook(file_path)
         sheet = wb.active
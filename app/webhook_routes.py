@@ -0,0 +1,25 @@
+import hmac
+from flask import Blueprint, request, abort, jsonify, current_app
+
+bp = Blueprint('webhook', __name__)
+
+@bp.route('/webhooks/gitlab', methods=['POST'])
+def gitlab_push():
+    # GitLab 推送事件，不走登录；以 X-Gitlab-Token 校验，未配置 GITLAB_WEBHOOK_TOKEN 时不启用
+    token = current_app.config.get('GITLAB_WEBHOOK_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('X-Gitlab-Token', '').encode(), token.encode()):
+        abort(401)
+    if request.headers.get('X-Gitlab-Event') != 'Push Hook':
+        return jsonify(status='ignored', reason='not a push event')
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        abort(400)
+    # 只处理配置仓库（GITLAB_PROJECT_ID 可为数字 id 或 group/project 路径）
+    project = str(current_app.config.get('GITLAB_PROJECT_ID'))
+    if project not in (str(payload.get('project_id')), (payload.get('project') or {}).get('path_with_namespace')):
+        return jsonify(status='ignored', reason='other project')
+
+    from app.services.gitlab_webhook import handle_push
+    return jsonify(handle_push(payload))
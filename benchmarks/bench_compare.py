@@ -0,0 +1,416 @@
+"""比对吞吐基准测试
+
+在本地启动 SSH/SFTP 与 GitLab 替身（独立子进程），生成合成文件树，
+依次驱动 DiffService.compare_config_map、compare_directory_pair、批量接口 compare_config_maps /
+compare_directory_pairs 和 /sync，
+记录墙钟时间、各阶段延迟、传输字节数与峰值 RSS，并把结果保存为 JSON 以便不同版本之间对比。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.bench_compare --files 50,200 --servers 1,4 --sizes 4096 --drift 0.1,0.5
+    python -m benchmarks.bench_compare --baseline bench_old.json --output bench_new.json
+    python -m benchmarks.bench_compare --servers 20 --engine sync,async
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REMOTE_DIR = '/etc/bench'
+MIRROR_DIR = '/etc/bench_mirror'
+USERNAME = 'bench'
+PASSWORD = 'bench'
+
+
+def _synthetic_file(rng, size):
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        line = f'key_{i} = {rng.getrandbits(48):012x}\n'
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return lines
+
+
+def _drift(rng, lines):
+    """修改约 5% 的行，至少一行"""
+    lines = list(lines)
+    for _ in range(max(1, len(lines) // 20)):
+        j = rng.randrange(len(lines))
+        lines[j] = f'key_{j} = drifted_{rng.getrandbits(32):08x}\n'
+    return lines
+
+
+def build_trees(case):
+    """按参数生成各服务器文件树与 GitLab 仓库树，同一参数总是生成相同内容"""
+    rng = random.Random(case['seed'])
+    ssh_trees = []
+    gitlab_files = {}
+    for s in range(case['servers']):
+        tree = {}
+        for i in range(case['files']):
+            name = f'app{i:05d}.conf'
+            lines = _synthetic_file(rng, case['size'])
+            tree[f'{REMOTE_DIR}/{name}'] = ''.join(lines).encode('utf-8')
+            mirror = _drift(rng, lines) if rng.random() < case['drift'] else lines
+            tree[f'{MIRROR_DIR}/{name}'] = ''.join(mirror).encode('utf-8')
+            git = _drift(rng, lines) if rng.random() < case['drift'] else lines
+            gitlab_files[f'bench/s{s}/{name}'] = ''.join(git).encode('utf-8')
+        ssh_trees.append(tree)
+    return ssh_trees, gitlab_files
+
+
+def serve_stand_ins(conn, case):
+    """子进程入口：启动替身，通过管道回报端口并响应 stats/reset/stop 命令"""
+    sys.path.insert(0, ROOT)
+    import logging
+    import paramiko
+    # 客户端断开时 paramiko 服务端会打印连接重置日志，基准测试中无需关心
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    from benchmarks.fake_sshd import FakeSSHServer
+    from benchmarks.fake_gitlab import FakeGitLab
+
+    ssh_trees, gitlab_files = build_trees(case)
+    host_key = paramiko.RSAKey.generate(2048)
+    ssh_servers = [FakeSSHServer(tree, USERNAME, PASSWORD, host_key=host_key, latency=case['ssh_latency']) for tree in ssh_trees]
+    gitlab = FakeGitLab(gitlab_files, latency=case['gitlab_latency'])
+    # 跳板机替身：没有文件，只负责把连接转发到各目标机替身
+    jump = FakeSSHServer({}, USERNAME, PASSWORD, host_key=host_key) if case.get('jump') else None
+    for server in ssh_servers:
+        server.start()
+    if jump:
+        jump.start()
+    gitlab.start()
+    conn.send({'ssh_ports': [s.port for s in ssh_servers], 'jump_port': jump.port if jump else None, 'gitlab_url': gitlab.url})
+
+    while True:
+        command = conn.recv()
+        if command == 'stats':
+            conn.send({'ssh': [s.stats.snapshot() for s in ssh_servers], 'gitlab': gitlab.stats.snapshot(),
+                       'jump': jump.stats.snapshot() if jump else None})
+        elif command == 'reset':
+            for s in ssh_servers + ([jump] if jump else []):
+                s.stats.reset()
+            gitlab.stats.reset()
+            conn.send(True)
+        else:
+            break
+
+    for server in ssh_servers + ([jump] if jump else []):
+        server.stop()
+    gitlab.stop()
+    conn.send(True)
+
+
+class StandIns:
+    """在独立进程中运行替身，避免与被测代码争抢 GIL 或计入其 RSS"""
+
+    def __init__(self, case):
+        ctx = multiprocessing.get_context('spawn')
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=serve_stand_ins, args=(child, case), daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        info = self.conn.recv()
+        self.ssh_ports = info['ssh_ports']
+        self.jump_port = info['jump_port']
+        self.gitlab_url = info['gitlab_url']
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.conn.send('stop')
+            self.conn.recv()
+        except (EOFError, OSError):
+            pass
+        self.process.join(5)
+
+    def reset(self):
+        self.conn.send('reset')
+        self.conn.recv()
+
+    def stats(self):
+        self.conn.send('stats')
+        return self.conn.recv()
+
+
+def _summary(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'total_s': round(sum(ordered), 6),
+        'p50_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def _server_side(stats):
+    """合并所有替身的计数与延迟"""
+    counters = {}
+    latencies = {}
+    for snap in stats['ssh'] + [stats['gitlab']]:
+        for k, v in snap['counters'].items():
+            counters[k] = counters.get(k, 0) + v
+        for k, v in snap['latencies'].items():
+            latencies.setdefault(k, []).extend(v)
+    # 跳板机的计数单独加 jump_ 前缀，例如 jump_ssh_connections 即跳板机握手次数
+    if stats.get('jump'):
+        for k, v in stats['jump']['counters'].items():
+            counters[f'jump_{k}'] = v
+    return {'counters': counters, 'latency': {k: _summary(v) for k, v in sorted(latencies.items())}}
+
+
+def _current_rss_kb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return None
+
+
+def run_case(case):
+    """在独立进程中执行一组参数，返回结果字典（进程隔离保证峰值 RSS 只属于本组）"""
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix='compare-bench-')
+    # utils 会在当前目录生成 secret.key，切到临时目录避免污染仓库
+    os.chdir(workdir)
+
+    with StandIns(case) as stand_ins:
+        import logging
+        from config import Config
+        from app import create_app, db
+        from app.models import User, Server, ConfigMap, DirectoryPair, DiffResult, CompareRun
+        from app.services.timing import parse_phase_stats
+        from app.utils import encrypt_password
+        from app.services.diff_service import DiffService
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+            GITLAB_URL = stand_ins.gitlab_url
+            GITLAB_TOKEN = 'bench'
+            GITLAB_PROJECT_ID = '1'
+            COMPARE_ENGINE = case.get('engine', 'sync')
+            TESTING = True
+
+        # 只驱动比对服务：不启动调度器、主节点选举与工作队列，避免后台任务查询基准数据库并干扰测量
+        app = create_app(BenchConfig, mode='web')
+        app.logger.setLevel(logging.WARNING)
+
+        scenarios = {}
+        with app.app_context():
+            db.create_all()
+            admin = User(username='bench-admin', is_admin=True)
+            admin.set_password(PASSWORD)
+            db.session.add(admin)
+            db.session.flush()
+
+            config_maps = []
+            pairs = []
+            jump = None
+            if stand_ins.jump_port:
+                jump = Server(name='bench-jump', ip='127.0.0.1', port=stand_ins.jump_port, username=USERNAME, password=encrypt_password(PASSWORD))
+                db.session.add(jump)
+                db.session.flush()
+            for s, port in enumerate(stand_ins.ssh_ports):
+                server = Server(name=f'bench-{s}', ip='127.0.0.1', port=port, username=USERNAME, password=encrypt_password(PASSWORD),
+                                jump_server_id=jump.id if jump else None)
+                db.session.add(server)
+                db.session.flush()
+                config_maps.append(ConfigMap(server_id=server.id, remote_path=REMOTE_DIR, gitlab_path=f'bench/s{s}', file_pattern='*.conf'))
+                pairs.append(DirectoryPair(name=f'bench-{s}', left_server_id=server.id, left_path=REMOTE_DIR,
+                                           right_server_id=server.id, right_path=MIRROR_DIR, file_pattern='*.conf', user_id=admin.id))
+            db.session.add_all(config_maps + pairs)
+            db.session.commit()
+            admin_id = admin.id
+            config_map_ids = [c.id for c in config_maps]
+            pair_ids = [p.id for p in pairs]
+
+            def app_phases(after_id):
+                """汇总本场景内 DiffService 记录的各阶段耗时"""
+                phases = {}
+                for run in CompareRun.query.filter(CompareRun.id > after_id).all():
+                    for phase, stat in parse_phase_stats(run.phase_stats).items():
+                        total = phases.setdefault(phase, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+                        for k in total:
+                            total[k] += stat.get(k, 0)
+                return phases
+
+            def measure(name, calls):
+                stand_ins.reset()
+                last_run_id = db.session.query(db.func.max(CompareRun.id)).scalar() or 0
+                durations = []
+                start = time.perf_counter()
+                for call in calls:
+                    t = time.perf_counter()
+                    call()
+                    durations.append(time.perf_counter() - t)
+                wall = time.perf_counter() - start
+                scenarios[name] = {
+                    'wall_s': round(wall, 6),
+                    'per_call': _summary(durations),
+                    'server_side': _server_side(stand_ins.stats()),
+                    'phases': app_phases(last_run_id),
+                    'rss_kb': _current_rss_kb(),
+                }
+
+            service = DiffService()
+            measure('compare_config_map', [
+                (lambda cid=cid: service.compare_config_map(db.session.get(ConfigMap, cid))) for cid in config_map_ids
+            ])
+            measure('compare_directory_pair', [
+                (lambda pid=pid: service.compare_directory_pair(db.session.get(DirectoryPair, pid))) for pid in pair_ids
+            ])
+            # 批量接口：异步引擎下所有目标并发拉取
+            measure('compare_config_maps', [
+                lambda: service.compare_config_maps(ConfigMap.query.filter(ConfigMap.id.in_(config_map_ids)).all())
+            ])
+            measure('compare_directory_pairs', [
+                lambda: service.compare_directory_pairs(DirectoryPair.query.filter(DirectoryPair.id.in_(pair_ids)).all())
+            ])
+
+            sync_ids = [str(r.id) for r in DiffResult.query.filter(DiffResult.status.in_(['DIFF', 'MISSING_LOCAL'])).all()]
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+            sess['_fresh'] = True
+
+        def sync():
+            if sync_ids:
+                client.post('/sync', data={'result_ids': sync_ids}, headers={'Referer': '/configs'})
+
+        with app.app_context():
+            measure('sync', [sync])
+        scenarios['sync']['files'] = len(sync_ids)
+
+    return {
+        'params': case,
+        'scenarios': scenarios,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _case_entry(conn, case):
+    try:
+        conn.send(('ok', run_case(case)))
+    except Exception as e:
+        import traceback
+        conn.send(('error', f'{e}\n{traceback.format_exc()}'))
+
+
+def _run_isolated(case):
+    """每组参数一个新进程，峰值 RSS 与调度器等全局状态互不影响"""
+    ctx = multiprocessing.get_context('spawn')
+    conn, child = ctx.Pipe()
+    process = ctx.Process(target=_case_entry, args=(child, case))
+    process.start()
+    status, payload = conn.recv()
+    process.join()
+    if status != 'ok':
+        raise RuntimeError(f'Benchmark case {case} failed: {payload}')
+    return payload
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _params_key(params):
+    # 早期结果没有 engine、ssh_latency、jump 字段，按同步引擎、无延迟、直连处理
+    return json.dumps({'engine': 'sync', 'ssh_latency': 0.0, 'jump': False, **params}, sort_keys=True)
+
+
+def _print_report(results, baseline=None):
+    previous = {}
+    if baseline:
+        for r in baseline.get('cases', []):
+            previous[_params_key(r['params'])] = r
+
+    for r in results:
+        p = r['params']
+        print(f"files={p['files']} servers={p['servers']} size={p['size']} drift={p['drift']} engine={p['engine']}"
+              f"{' jump' if p.get('jump') else ''}  peak_rss={r['peak_rss_kb']} KB")
+        old = previous.get(_params_key(p))
+        for name, sc in r['scenarios'].items():
+            counters = sc['server_side']['counters']
+            moved = counters.get('ssh_bytes_sent', 0) + counters.get('gitlab_bytes_sent', 0) + counters.get('gitlab_bytes_received', 0)
+            line = f"  {name:<24} wall={sc['wall_s']:.3f}s  p95={sc['per_call'].get('p95_ms', 0):.1f}ms  bytes={moved}"
+            if p.get('jump'):
+                line += f"  jump_handshakes={counters.get('jump_ssh_connections', 0)}"
+            if old and name in old['scenarios']:
+                before = old['scenarios'][name]['wall_s']
+                if before:
+                    line += f"  ({(sc['wall_s'] - before) / before * 100:+.1f}% vs baseline)"
+            print(line)
+
+
+def _parse_list(value, cast):
+    return [cast(v) for v in value.split(',') if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='配置比对吞吐基准测试')
+    parser.add_argument('--files', default='50', help='每台服务器的文件数，逗号分隔多个取值')
+    parser.add_argument('--servers', default='2', help='服务器数量，逗号分隔多个取值')
+    parser.add_argument('--sizes', default='4096', help='单个文件字节数，逗号分隔多个取值')
+    parser.add_argument('--drift', default='0.2', help='存在差异的文件比例，逗号分隔多个取值')
+    parser.add_argument('--gitlab-latency-ms', type=float, default=0.0, help='GitLab 替身每个请求附加的延迟')
+    parser.add_argument('--ssh-latency-ms', type=float, default=0.0, help='SSH 替身每次打开文件附加的延迟')
+    parser.add_argument('--jump', action='store_true', help='所有服务器经一个跳板机替身连接')
+    parser.add_argument('--engine', default='sync', help='比对引擎 sync/async，逗号分隔多个取值')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_output.json', help='结果 JSON 保存路径')
+    parser.add_argument('--baseline', help='上一版本的结果 JSON，用于输出对比')
+    args = parser.parse_args(argv)
+
+    cases = []
+    for files, servers, size, drift, engine in itertools.product(
+            _parse_list(args.files, int), _parse_list(args.servers, int),
+            _parse_list(args.sizes, int), _parse_list(args.drift, float), _parse_list(args.engine, str)):
+        cases.append({'files': files, 'servers': servers, 'size': size, 'drift': drift, 'engine': engine,
+                      'gitlab_latency': args.gitlab_latency_ms / 1000.0,
+                      'ssh_latency': args.ssh_latency_ms / 1000.0, 'jump': args.jump, 'seed': args.seed})
+
+    results = [_run_isolated(case) for case in cases]
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'cases': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    _print_report(results, baseline)
+    print(f'Results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
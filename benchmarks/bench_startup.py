@@ -0,0 +1,134 @@
+"""应用启动基准测试
+
+每次在新的 Python 子进程中测量：import app 耗时、create_app 耗时、第一个请求（登录页）的延迟，
+以及第一个请求后已加载的重量级依赖，结果保存为 JSON 以便不同版本之间对比。
+使用临时 SQLite 数据库与临时工作目录，不读写仓库中的 secret.key。
+
+用法（在仓库根目录执行）：
+    python -m benchmarks.bench_startup --repeat 5 --mode web,all
+    python -m benchmarks.bench_startup --baseline startup_old.json --output startup_new.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_compare import ROOT, _git_revision, _parse_list
+
+# 启动时不应加载、只在首次使用时才导入的依赖
+HEAVY_MODULES = ('paramiko', 'gitlab', 'openpyxl', 'PIL', 'cryptography', 'asyncssh', 'aiohttp')
+
+# 在子进程中执行，结果以一行 JSON 输出
+_PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app(mode=sys.argv[1])
+created = time.perf_counter()
+client = application.test_client()
+response = client.get('/auth/login')
+first = time.perf_counter()
+response = client.get('/auth/login')
+second = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (first - created) * 1000,
+    'second_request_ms': (second - first) * 1000,
+    'status': response.status_code,
+    'heavy_loaded': sorted(m for m in sys.argv[2].split(',') if m in sys.modules),
+}))
+'''
+
+
+def _probe(mode, workdir):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'startup.db'),
+        'SECRET_KEY': 'bench',
+        'PYTHONPATH': ROOT,
+    })
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', _PROBE, mode, ','.join(HEAVY_MODULES)],
+                          cwd=workdir, env=env, capture_output=True, text=True)
+    wall = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f'Startup probe failed ({mode}):\n{proc.stderr}')
+    sample = json.loads(proc.stdout.strip().splitlines()[-1])
+    sample['process_ms'] = wall
+    return sample
+
+
+def _summary(samples, field):
+    values = [s[field] for s in samples]
+    return {'median_ms': statistics.median(values), 'min_ms': min(values), 'max_ms': max(values)}
+
+
+def run_mode(mode, repeat):
+    with tempfile.TemporaryDirectory() as workdir:
+        # 第一次运行会生成字节码缓存与 secret.key 等文件，不计入结果
+        _probe(mode, workdir)
+        samples = [_probe(mode, workdir) for _ in range(repeat)]
+    return {
+        'mode': mode,
+        'repeat': repeat,
+        'import': _summary(samples, 'import_ms'),
+        'create_app': _summary(samples, 'create_app_ms'),
+        'first_request': _summary(samples, 'first_request_ms'),
+        'second_request': _summary(samples, 'second_request_ms'),
+        'process': _summary(samples, 'process_ms'),
+        'heavy_loaded': samples[-1]['heavy_loaded'],
+    }
+
+
+def _print_report(results, baseline=None):
+    previous = {r['mode']: r for r in (baseline or {}).get('modes', [])}
+    for r in results:
+        print(f"mode={r['mode']}  heavy modules after first request: {', '.join(r['heavy_loaded']) or '-'}")
+        old = previous.get(r['mode'])
+        for name in ('import', 'create_app', 'first_request', 'second_request', 'process'):
+            median = r[name]['median_ms']
+            line = f"  {name:<16} median={median:8.1f}ms  min={r[name]['min_ms']:8.1f}ms"
+            if old and name in old and old[name]['median_ms']:
+                before = old[name]['median_ms']
+                line += f"  ({(median - before) / before * 100:+.1f}% vs baseline)"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='应用启动基准测试')
+    parser.add_argument('--mode', default='web,all', help='create_app 的 mode，逗号分隔多个取值')
+    parser.add_argument('--repeat', type=int, default=5, help='每种 mode 的测量次数（取中位数）')
+    parser.add_argument('--output', default='startup_output.json', help='结果 JSON 保存路径')
+    parser.add_argument('--baseline', help='上一版本的结果 JSON，用于输出对比')
+    args = parser.parse_args(argv)
+
+    results = [run_mode(mode, args.repeat) for mode in _parse_list(args.mode, str)]
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'modes': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    _print_report(results, baseline)
+    print(f'Results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""本地 GitLab REST 替身，只实现 GitLabService 用到的 v4 接口
+
+数据保存在内存中的 {仓库路径: bytes}，提交接口会直接修改这棵树。
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from benchmarks.fake_sshd import Stats
+
+
+def git_blob_id(data):
+    """与 git 一致的 blob sha1"""
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头与正文分两次写出，关闭 Nagle 避免与延迟 ACK 叠加出 40ms 级别的假延迟
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, kind):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        stats = self.server.stand_in.stats
+        stats.add('gitlab_requests')
+        stats.add('gitlab_bytes_sent', len(data))
+        stats.observe(f'gitlab_{kind}', time.perf_counter() - self._started)
+
+    def _route(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        prefix = f'/api/v4/projects/{self.server.stand_in.project_id}'
+        if not url.path.startswith(prefix):
+            return None, None, query
+        rest = url.path[len(prefix):]
+        return url, rest, query
+
+    def do_GET(self):
+        self._started = time.perf_counter()
+        stand_in = self.server.stand_in
+        if stand_in.latency:
+            time.sleep(stand_in.latency)
+        url, rest, query = self._route()
+        if rest is None:
+            return self._send(404, {'message': '404 Project Not Found'}, 'other')
+
+        if rest == '':
+            return self._send(200, {'id': int(stand_in.project_id), 'path_with_namespace': 'bench/configs', 'default_branch': 'main'}, 'project')
+
+        if rest == '/repository/tree':
+            path = query.get('path', '').strip('/')
+            if path == '.':
+                path = ''
+            recursive = query.get('recursive', 'false').lower() == 'true'
+            items = []
+            with stand_in.lock:
+                # 与 GitLab 一致：不存在的目录返回 404，而不是空列表
+                if path and not any(p.startswith(path + '/') for p in stand_in.files):
+                    return self._send(404, {'message': '404 Tree Not Found'}, 'tree')
+                for p, data in sorted(stand_in.files.items()):
+                    parent = p.rsplit('/', 1)[0] if '/' in p else ''
+                    if parent == path or (recursive and (not path or p.startswith(path + '/'))):
+                        items.append({'id': git_blob_id(data), 'name': p.rsplit('/', 1)[-1], 'type': 'blob', 'path': p, 'mode': '100644'})
+            return self._send(200, items, 'tree')
+
+        if rest.startswith('/repository/files/'):
+            file_path = unquote(rest[len('/repository/files/'):])
+            with stand_in.lock:
+                data = stand_in.files.get(file_path)
+                head = stand_in.head
+            if data is None:
+                return self._send(404, {'message': '404 File Not Found'}, 'file')
+            return self._send(200, {
+                'file_name': file_path.rsplit('/', 1)[-1],
+                'file_path': file_path,
+                'size': len(data),
+                'encoding': 'base64',
+                'content': base64.b64encode(data).decode('ascii'),
+                'content_sha256': hashlib.sha256(data).hexdigest(),
+                'ref': query.get('ref', 'main'),
+                'blob_id': git_blob_id(data),
+                'commit_id': head,
+                'last_commit_id': head,
+            }, 'file')
+
+        if rest.startswith('/repository/branches/'):
+            return self._send(200, {'name': unquote(rest[len('/repository/branches/'):]), 'commit': {'id': stand_in.head}}, 'branch')
+
+        return self._send(404, {'message': '404 Not Found'}, 'other')
+
+    def do_POST(self):
+        self._started = time.perf_counter()
+        stand_in = self.server.stand_in
+        if stand_in.latency:
+            time.sleep(stand_in.latency)
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        stand_in.stats.add('gitlab_bytes_received', length)
+        url, rest, query = self._route()
+        if rest != '/repository/commits':
+            return self._send(404, {'message': '404 Not Found'}, 'other')
+
+        with stand_in.lock:
+            for action in payload.get('actions', []):
+                path = action['file_path']
+                exists = path in stand_in.files
+                if action['action'] == 'create' and exists:
+                    return self._send(400, {'message': f'A file with this name already exists: {path}'}, 'commit')
+                if action['action'] == 'update' and not exists:
+                    return self._send(400, {'message': f'A file with this name doesn\'t exist: {path}'}, 'commit')
+            for action in payload.get('actions', []):
+                content = action.get('content', '')
+                if action.get('encoding') == 'base64':
+                    data = base64.b64decode(content)
+                else:
+                    data = content.encode('utf-8')
+                stand_in.files[action['file_path']] = data
+            stand_in.commits += 1
+            stand_in.head = hashlib.sha1(f'commit-{stand_in.commits}'.encode()).hexdigest()
+            head = stand_in.head
+        stand_in.stats.add('gitlab_commits')
+        stand_in.stats.add('gitlab_commit_actions', len(payload.get('actions', [])))
+        return self._send(201, {'id': head, 'short_id': head[:8], 'title': payload.get('commit_message', '')}, 'commit')
+
+
+class FakeGitLab:
+    """在本地端口上监听的 GitLab 替身，files 为 {仓库路径: bytes}"""
+
+    def __init__(self, files, project_id=1, latency=0.0, host='127.0.0.1', port=0):
+        self.files = files
+        self.project_id = str(project_id)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.stats = Stats()
+        self.commits = 0
+        self.head = hashlib.sha1(b'commit-0').hexdigest()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stand_in = self
+        self.host, self.port = self.httpd.server_address[:2]
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
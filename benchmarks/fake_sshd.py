@@ -0,0 +1,264 @@
+"""基于 paramiko 的本地 SSH/SFTP 替身，只在内存中提供一棵只读文件树
+
+支持 SSHService 用到的能力：密码认证、SFTP 读文件、`find <dir> -maxdepth 1 ... -type f` 列目录，
+以及作为跳板机时的 direct-tcpip 转发。
+"""
+import fnmatch
+import posixpath
+import shlex
+import socket
+import threading
+import time
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface, SFTP_OK, SFTP_NO_SUCH_FILE
+
+
+class Stats:
+    """线程安全的计数器：请求次数、发送字节数与各阶段耗时"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.latencies = {}
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.latencies = {}
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {'counters': dict(self.counters), 'latencies': {k: list(v) for k, v in self.latencies.items()}}
+
+
+class _Handle(SFTPHandle):
+    def __init__(self, data, stats):
+        super().__init__()
+        self.data = data
+        self.stats = stats
+        self.opened = time.perf_counter()
+
+    def close(self):
+        self.stats.observe('sftp_file', time.perf_counter() - self.opened)
+        super().close()
+
+    def read(self, offset, length):
+        chunk = self.data[offset:offset + length]
+        self.stats.add('ssh_bytes_sent', len(chunk))
+        return chunk
+
+    def stat(self):
+        attr = SFTPAttributes()
+        attr.st_size = len(self.data)
+        attr.st_mode = 0o100644
+        return attr
+
+
+class _SFTPInterface(SFTPServerInterface):
+    def __init__(self, server, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.files = server.files
+        self.stats = server.stats
+        self.latency = server.latency
+
+    def open(self, path, flags, attr):
+        data = self.files.get(path)
+        if data is None:
+            return SFTP_NO_SUCH_FILE
+        self.stats.add('sftp_open')
+        # 模拟网络往返；paramiko 在每个 SFTP 通道上串行处理请求，多个通道之间互不阻塞
+        if self.latency:
+            time.sleep(self.latency)
+        return _Handle(data, self.stats)
+
+    def stat(self, path):
+        data = self.files.get(path)
+        if data is None:
+            return SFTP_NO_SUCH_FILE
+        attr = SFTPAttributes()
+        attr.st_size = len(data)
+        attr.st_mode = 0o100644
+        return attr
+
+    lstat = stat
+
+    def canonicalize(self, path):
+        return posixpath.normpath(posixpath.join('/', path))
+
+    def list_folder(self, path):
+        path = path.rstrip('/')
+        out = []
+        for name, data in self.files.items():
+            if posixpath.dirname(name) == path:
+                attr = SFTPAttributes()
+                attr.filename = posixpath.basename(name)
+                attr.st_size = len(data)
+                attr.st_mode = 0o100644
+                out.append(attr)
+        return out
+
+    def session_ended(self):
+        return SFTP_OK
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, stand_in):
+        self.stand_in = stand_in
+        self.files = stand_in.files
+        self.stats = stand_in.stats
+        self.latency = stand_in.latency
+        # 已同意的 direct-tcpip 通道：chanid -> (目标主机, 端口)
+        self.forwards = {}
+
+    def check_auth_password(self, username, password):
+        if username == self.stand_in.username and password == self.stand_in.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        self.forwards[chanid] = destination
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._run_command, args=(channel, command.decode('utf-8')), daemon=True).start()
+        return True
+
+    def _run_command(self, channel, command):
+        start = time.perf_counter()
+        try:
+            out = self._find(command)
+            data = out.encode('utf-8')
+            self.stats.add('ssh_bytes_sent', len(data))
+            channel.sendall(data)
+            channel.send_exit_status(0)
+        except Exception as e:
+            channel.sendall_stderr(f'{e}\n'.encode('utf-8'))
+            channel.send_exit_status(1)
+        finally:
+            self.stats.add('ssh_exec')
+            self.stats.observe('ssh_exec', time.perf_counter() - start)
+            # 先发送 EOF，稍等片刻再关闭通道，避免在 exec 请求应答之前关闭；
+            # 与真实 sshd 一样由服务端关闭，asyncssh 等客户端会等待服务端关闭通道
+            channel.shutdown_write()
+            channel.settimeout(0.05)
+            try:
+                while channel.recv(1024):
+                    pass
+            except Exception:
+                pass
+            channel.close()
+
+    def _find(self, command):
+        # 只解析 SSHService.list_files 生成的 find 命令
+        args = shlex.split(command)
+        if not args or args[0] != 'find':
+            raise ValueError(f'unsupported command: {command}')
+        root = args[1].rstrip('/')
+        patterns = [args[i + 1] for i, a in enumerate(args) if a == '-name']
+        names = [p for p in self.files if posixpath.dirname(p) == root]
+        matched = [p for p in names if any(fnmatch.fnmatch(posixpath.basename(p), pat) for pat in patterns or ['*'])]
+        return ''.join(f'{p}\n' for p in sorted(matched))
+
+
+class FakeSSHServer:
+    """在本地端口上监听的 SSH 替身，files 为 {绝对路径: bytes}，latency 为每次打开文件附加的延迟（秒）"""
+
+    def __init__(self, files, username='bench', password='bench', host_key=None, host='127.0.0.1', port=0, latency=0.0):
+        self.files = files
+        self.latency = latency
+        self.username = username
+        self.password = password
+        self.host_key = host_key or paramiko.RSAKey.generate(2048)
+        self.stats = Stats()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(128)
+        self.host, self.port = self.sock.getsockname()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                break
+            self.stats.add('ssh_connections')
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        transport.set_subsystem_handler('sftp', SFTPServer, _SFTPInterface)
+        try:
+            interface = _ServerInterface(self)
+            transport.start_server(server=interface)
+            # 持续接收通道直到客户端断开；必须持有通道引用，否则被回收时会自动关闭
+            channels = []
+            while transport.is_active() and not self._stopped.is_set():
+                channel = transport.accept(1)
+                if channel is not None:
+                    channels.append(channel)
+                    destination = interface.forwards.pop(channel.get_id(), None)
+                    if destination is not None:
+                        threading.Thread(target=self._forward, args=(channel, destination), daemon=True).start()
+                channels = [c for c in channels if not c.closed]
+        except Exception:
+            pass
+        finally:
+            transport.close()
+
+    def _forward(self, channel, destination):
+        """把 direct-tcpip 通道与到目标主机的 TCP 连接双向对接"""
+        self.stats.add('ssh_forwards')
+        try:
+            upstream = socket.create_connection(destination, timeout=10)
+        except OSError:
+            channel.close()
+            return
+        upstream.settimeout(None)
+
+        def pump(read, write, done):
+            try:
+                while True:
+                    data = read(65536)
+                    if not data:
+                        break
+                    write(data)
+            except Exception:
+                pass
+            finally:
+                done()
+
+        threading.Thread(target=pump, args=(upstream.recv, channel.sendall, channel.close), daemon=True).start()
+        pump(channel.recv, upstream.sendall, upstream.close)
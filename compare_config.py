@@ -1,4 +1,4 @@
-from app import create_app, db
+from app import create_app, db, start_scheduler
 from app.utils import import_servers_from_excel
 import os
 
@@ -13,4 +13,6 @@ if __name__ == '__main__':
         if os.path.exists(excel_path):
             import_servers_from_excel(excel_path)
             
+    # 建表之后再启动调度器（web 模式下不启动）
+    start_scheduler(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
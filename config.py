@@ -15,8 +15,76 @@ class Config:
     GITLAB_URL = os.environ.get('GITLAB_URL') or config.get('gitlab', 'url')
     GITLAB_TOKEN = os.environ.get('GITLAB_TOKEN') or config.get('gitlab', 'token')
     GITLAB_PROJECT_ID = os.environ.get('GITLAB_PROJECT_ID') or config.get('gitlab', 'project_id')
+    # 共享客户端的连接池大小、重试次数、退避系数（秒）、请求超时（秒）与最大并发请求数
+    GITLAB_POOL_SIZE = int(os.environ.get('GITLAB_POOL_SIZE') or config.get('gitlab', 'pool_size', fallback='20'))
+    GITLAB_MAX_RETRIES = int(os.environ.get('GITLAB_MAX_RETRIES') or config.get('gitlab', 'max_retries', fallback='5'))
+    GITLAB_BACKOFF_FACTOR = float(os.environ.get('GITLAB_BACKOFF_FACTOR') or config.get('gitlab', 'backoff_factor', fallback='0.5'))
+    GITLAB_TIMEOUT = float(os.environ.get('GITLAB_TIMEOUT') or config.get('gitlab', 'timeout', fallback='30'))
+    GITLAB_MAX_CONCURRENCY = int(os.environ.get('GITLAB_MAX_CONCURRENCY') or config.get('gitlab', 'max_concurrency', fallback='8'))
+    # 定时任务触发前多少秒预热其配置项的 GitLab 缓存（解析分支提交并下载有变化的文件），0 为不预热
+    GITLAB_PREWARM_LEAD = int(os.environ.get('GITLAB_PREWARM_LEAD') or config.get('gitlab', 'prewarm_lead', fallback='300'))
+    # GitLab 推送 Webhook（/webhooks/gitlab）的 Secret token，与请求头 X-Gitlab-Token 比对，为空时不启用
+    GITLAB_WEBHOOK_TOKEN = os.environ.get('GITLAB_WEBHOOK_TOKEN') or config.get('gitlab', 'webhook_token', fallback='')
     
     # SSH 默认配置
     SSH_KEY_PATH = os.environ.get('SSH_KEY_PATH') or config.get('ssh', 'key_path', fallback='id_rsa')
+    # 连接、SSH 横幅、认证与单条命令/文件读取的超时（秒）
+    SSH_CONNECT_TIMEOUT = float(os.environ.get('SSH_CONNECT_TIMEOUT') or config.get('ssh', 'connect_timeout', fallback='10'))
+    SSH_BANNER_TIMEOUT = float(os.environ.get('SSH_BANNER_TIMEOUT') or config.get('ssh', 'banner_timeout', fallback='15'))
+    SSH_AUTH_TIMEOUT = float(os.environ.get('SSH_AUTH_TIMEOUT') or config.get('ssh', 'auth_timeout', fallback='15'))
+    SSH_COMMAND_TIMEOUT = float(os.environ.get('SSH_COMMAND_TIMEOUT') or config.get('ssh', 'command_timeout', fallback='60'))
+    # 主机连续连接失败多少次后熔断，以及熔断冷却时间（秒），冷却期内该主机的比对直接判定为不可达，冷却期后只放行一个试探连接
+    SSH_BREAKER_THRESHOLD = int(os.environ.get('SSH_BREAKER_THRESHOLD') or config.get('ssh', 'breaker_threshold', fallback='3'))
+    SSH_BREAKER_COOLDOWN = float(os.environ.get('SSH_BREAKER_COOLDOWN') or config.get('ssh', 'breaker_cooldown', fallback='300'))
+    # 同一连接上同时打开的会话通道数（并发 SFTP 读取 / 目录命令），需小于服务器 sshd 的 MaxSessions（默认 10）
+    SSH_MAX_SESSIONS = int(os.environ.get('SSH_MAX_SESSIONS') or config.get('ssh', 'max_sessions', fallback='8'))
+    # 跳板机共享连接在没有使用者后保持的时间（秒），期间经同一跳板机的连接无需重新认证跳板机
+    SSH_JUMP_IDLE_TIMEOUT = float(os.environ.get('SSH_JUMP_IDLE_TIMEOUT') or config.get('ssh', 'jump_idle_timeout', fallback='300'))
+    
+    # 比对引擎：sync（paramiko + python-gitlab）或 async（asyncssh + aiohttp，需额外安装）
+    COMPARE_ENGINE = os.environ.get('COMPARE_ENGINE') or config.get('compare', 'engine', fallback='sync')
+    # 异步引擎同时进行的比对任务数，以及每台服务器同时读取的文件数
+    ASYNC_MAX_JOBS = int(os.environ.get('ASYNC_MAX_JOBS') or config.get('compare', 'async_max_jobs', fallback='200'))
+    ASYNC_READS_PER_HOST = int(os.environ.get('ASYNC_READS_PER_HOST') or config.get('compare', 'async_reads_per_host', fallback='16'))
+    # 异步引擎的入库线程数（各用一个数据库连接），入库不阻塞事件循环；SQLite 固定为 1
+    ASYNC_DB_WRITERS = int(os.environ.get('ASYNC_DB_WRITERS') or config.get('compare', 'async_db_writers', fallback='4'))
+    # 目录比对每次读取、比较并写入数据库的文件数（同步与异步引擎），决定单个目录对比对时的内存上限
+    COMPARE_CHUNK_SIZE = int(os.environ.get('COMPARE_CHUNK_SIZE') or config.get('compare', 'chunk_size', fallback='200'))
+    # 每个结果保存的 diff 字节上限（MySQL TEXT 最大 65535 字节），超出时只保留开头部分，完整 diff 压缩存入快照供下载
+    DIFF_MAX_STORED_BYTES = int(os.environ.get('DIFF_MAX_STORED_BYTES') or config.get('compare', 'diff_max_bytes', fallback='60000'))
+    # 目录比对保存的单个文件原始内容字节上限，超出时不保存
+    CONTENT_MAX_BYTES = int(os.environ.get('CONTENT_MAX_BYTES') or config.get('compare', 'content_max_bytes', fallback='1048576'))
+    
+    # 进程角色：web 只提供页面，worker 只执行定时任务（见 worker.py），all 两者兼有（单进程部署）
+    APP_MODE = os.environ.get('APP_MODE') or config.get('app', 'mode', fallback='all')
+    # 定时任务主节点租约的有效期与续租间隔（秒）：主节点宕机后最多 lease_ttl 秒由其他进程接管
+    SCHEDULER_LEASE_TTL = int(os.environ.get('SCHEDULER_LEASE_TTL') or config.get('scheduler', 'lease_ttl', fallback='60'))
+    SCHEDULER_LEASE_RENEW = int(os.environ.get('SCHEDULER_LEASE_RENEW') or config.get('scheduler', 'lease_renew', fallback='15'))
+    # 定时任务工作队列：worker 领取工作项的轮询间隔（秒）与每次领取数，工作项租约（秒，执行期间每 1/3 租约时长续租一次），
+    # 失败后的最大尝试次数与重试间隔（秒，按已尝试次数递增）
+    WORK_QUEUE_POLL = int(os.environ.get('WORK_QUEUE_POLL') or config.get('scheduler', 'queue_poll', fallback='5'))
+    WORK_QUEUE_BATCH = int(os.environ.get('WORK_QUEUE_BATCH') or config.get('scheduler', 'queue_batch', fallback='4'))
+    WORK_ITEM_LEASE = int(os.environ.get('WORK_ITEM_LEASE') or config.get('scheduler', 'item_lease', fallback='900'))
+    WORK_ITEM_MAX_ATTEMPTS = int(os.environ.get('WORK_ITEM_MAX_ATTEMPTS') or config.get('scheduler', 'item_max_attempts', fallback='3'))
+    WORK_ITEM_RETRY_DELAY = int(os.environ.get('WORK_ITEM_RETRY_DELAY') or config.get('scheduler', 'item_retry_delay', fallback='60'))
+    # 所有 worker 合计同时执行的工作项上限，以及同一业务系统的上限（0 为不限），超出的工作项在队列中等待
+    WORK_QUEUE_MAX_RUNNING = int(os.environ.get('WORK_QUEUE_MAX_RUNNING') or config.get('scheduler', 'max_running', fallback='16'))
+    WORK_QUEUE_MAX_PER_SYSTEM = int(os.environ.get('WORK_QUEUE_MAX_PER_SYSTEM') or config.get('scheduler', 'max_per_system', fallback='4'))
+    # 定时任务的触发时间在设定时间之后的 jitter_window 秒内按任务固定错开（0 为不错开）
+    SCHEDULER_JITTER_WINDOW = int(os.environ.get('SCHEDULER_JITTER_WINDOW') or config.get('scheduler', 'jitter_window', fallback='600'))
+    # 错过触发时间（调度延迟、宕机或主节点切换）后仍补执行的宽限期（秒，0 为不限）
+    SCHEDULER_MISFIRE_GRACE = int(os.environ.get('SCHEDULER_MISFIRE_GRACE') or config.get('scheduler', 'misfire_grace', fallback='21600'))
     
     SECRET_KEY = os.environ.get('SECRET_KEY') or config.get('flask', 'secret_key')
+    
+    # /metrics 访问令牌；为空时只允许已登录的管理员访问
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or config.get('metrics', 'token', fallback='')
+    # 未配置令牌时显式对所有来源开放 /metrics（仅在网络已隔离时使用）
+    METRICS_PUBLIC = (os.environ.get('METRICS_PUBLIC') or config.get('metrics', 'public', fallback='false')).lower() == 'true'
+    # 未配置令牌时允许来自本机（127.0.0.1/::1）的抓取；应用前有本机反向代理时不要开启，否则外部请求也视为本机
+    METRICS_ALLOW_LOCAL = (os.environ.get('METRICS_ALLOW_LOCAL') or config.get('metrics', 'allow_local', fallback='false')).lower() == 'true'
+
+    # 单次比对性能分析文件（cProfile）的保存目录与保留数量
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or \
+        config.get('profile', 'dir', fallback=os.path.join(os.path.dirname(__file__), 'profiles'))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP') or config.get('profile', 'keep', fallback='50'))
@@ -5,7 +5,7 @@ import os
 from app import create_app, db
 from app.models import User
 
-app = create_app()
+app = create_app(mode='web')  # 只操作数据库，不启动调度器
 
 with app.app_context():
     if not User.query.filter_by(username='admin').first():
@@ -0,0 +1,23 @@
+import signal
+import threading
+from app import create_app, db, scheduler, start_scheduler
+
+# 独立的 worker 进程：只运行调度器并参与主节点选举，执行定时比对任务，不提供页面。
+# 页面进程设置 APP_MODE=web 后不再启动调度器，两类进程可分别扩容。
+
+app = create_app(mode='worker')
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()  # 确保数据库表存在
+    # 建表之后再启动调度器，续租与领取工作项的任务会立即查询这些表
+    start_scheduler(app)
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+
+    app.logger.info("Compare worker started, waiting for scheduled tasks")
+    stop.wait()
+    app.logger.info("Compare worker stopping, waiting for running tasks to finish")
+    scheduler.shutdown(wait=True)